@@ -0,0 +1,139 @@
+# Microbenchmark for natbot's DOMSnapshot parsing on synthetic snapshots.
+# Checks that the vectorised parser matches the reference loop, then times both.
+#
+#   python bench_natbot_snapshot.py --nodes 20000 5000
+
+import argparse
+import copy
+import random
+import time
+
+from natbot_snapshot import parse_snapshot, parse_snapshot_reference
+
+TAGS = ["DIV", "SPAN", "P", "A", "BUTTON", "INPUT", "IMG", "#text", "#text", "#text", "SCRIPT", "SVG", "LI", "UL"]
+LEAF_TAGS = {"#text", "INPUT", "IMG"}
+ATTRIBUTES = ["type", "placeholder", "aria-label", "title", "alt", "class", "href", "id"]
+TEXTS = ["|", "•", "Home", "Search", "Sign in", "Next page", "Lorem ipsum dolor sit amet", "Products", "About us"]
+
+
+def synthetic_snapshot(node_count, seed=0, viewport=(1280, 720)):
+	"""Builds a captureSnapshot-shaped dict with a random pre-order tree of `node_count` nodes."""
+	rng = random.Random(seed)
+	strings = []
+	string_ids = {}
+
+	def sid(value):
+		if value not in string_ids:
+			string_ids[value] = len(strings)
+			strings.append(value)
+		return string_ids[value]
+
+	node_name = [sid("#document"), sid("HTML"), sid("BODY")]
+	parent_index = [-1, 0, 1]
+	node_value = [-1, -1, -1]
+	attributes = [[], [], []]
+	depth = [0, 1, 2]
+	open_nodes = [2]
+
+	while len(node_name) < node_count:
+		parent = rng.choice(open_nodes[-8:])
+		tag = rng.choice(TAGS)
+		index = len(node_name)
+		node_name.append(sid(tag))
+		parent_index.append(parent)
+		depth.append(depth[parent] + 1)
+		node_value.append(sid(rng.choice(TEXTS)) if tag == "#text" else -1)
+
+		pairs = []
+		if tag != "#text":
+			for key in rng.sample(ATTRIBUTES, rng.randint(0, 3)):
+				value = "submit" if key == "type" and tag == "INPUT" and rng.random() < 0.3 else rng.choice(TEXTS)
+				pairs += [sid(key), sid(value)]
+		attributes.append(pairs)
+
+		if tag not in LEAF_TAGS and depth[index] < 40:
+			open_nodes.append(index)
+		if len(open_nodes) > 64:
+			open_nodes.pop(0)
+
+	# Pre-order is required by captureSnapshot; sort children after parents by re-numbering
+	order = sorted(range(node_count), key=lambda i: _path(i, parent_index))
+	renumber = {old: new for new, old in enumerate(order)}
+	node_name = [node_name[i] for i in order]
+	node_value = [node_value[i] for i in order]
+	attributes = [attributes[i] for i in order]
+	parent_index = [renumber[parent_index[i]] if parent_index[i] >= 0 else -1 for i in order]
+
+	layout_nodes = [i for i in range(node_count) if rng.random() < 0.8]
+	page_height = viewport[1] * 6
+	bounds = []
+	for _ in layout_nodes:
+		x = rng.uniform(0, viewport[0])
+		y = rng.uniform(0, page_height)
+		bounds.append([x, y, rng.uniform(0, 400), rng.uniform(0, 80)])
+
+	input_nodes = [i for i in range(node_count) if strings[node_name[i]] == "INPUT"]
+
+	return {
+		"strings": strings,
+		"documents": [{
+			"nodes": {
+				"backendNodeId": list(range(1000, 1000 + node_count)),
+				"attributes": attributes,
+				"nodeValue": node_value,
+				"parentIndex": parent_index,
+				"nodeType": [1] * node_count,
+				"nodeName": node_name,
+				"isClickable": {"index": [i for i in range(node_count) if rng.random() < 0.1]},
+				"textValue": {"index": [], "value": []},
+				"inputValue": {"index": input_nodes, "value": [sid(rng.choice(TEXTS)) for _ in input_nodes]},
+				"inputChecked": {"index": []},
+			},
+			"layout": {"nodeIndex": layout_nodes, "bounds": bounds},
+		}],
+	}
+
+
+def _path(index, parent_index):
+	path = []
+	while index >= 0:
+		path.append(index)
+		index = parent_index[index]
+	return path[::-1]
+
+
+def run(node_count, repeats, viewport=(1280, 720)):
+	tree = synthetic_snapshot(node_count, viewport=viewport)
+	window = {"left": 0, "top": viewport[1], "right": viewport[0], "bottom": viewport[1] * 2}
+
+	reference_buffer = {}
+	fast_buffer = {}
+	reference = parse_snapshot_reference(copy.deepcopy(tree), window, 1, reference_buffer)
+	fast = parse_snapshot(copy.deepcopy(tree), window, 1, fast_buffer)
+	assert fast == reference, "text lines differ"
+	assert fast_buffer == reference_buffer, "page_element_buffer differs"
+
+	timings = {}
+	for name, parse in (("reference", parse_snapshot_reference), ("numpy", parse_snapshot)):
+		best = float("inf")
+		for _ in range(repeats):
+			start = time.perf_counter()
+			parse(tree, window, 1, {})
+			best = min(best, time.perf_counter() - start)
+		timings[name] = best
+
+	print(
+		"{:>7} nodes, {:>5} elements: reference {:8.3f}s  numpy {:8.3f}s  speedup {:6.1f}x".format(
+			node_count, len(fast), timings["reference"], timings["numpy"], timings["reference"] / timings["numpy"]
+		)
+	)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Benchmark natbot DOMSnapshot parsing")
+	parser.add_argument("--nodes", type=int, nargs="+", default=[1000, 5000, 20000])
+	parser.add_argument("--repeats", type=int, default=3)
+	args = parser.parse_args()
+
+	for node_count in args.nodes:
+		run(node_count, args.repeats)
@@ -1,13 +1,15 @@
 # https://github.com/nat/natbot/blob/main/natbot.py
 
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import sync_playwright, Error as PlaywrightError
 import time
+import re
 from sys import argv, exit, platform
 import openai
 import os
 import dotenv
 
 from prompt_template import get_prompt_template
+from natbot_snapshot import parse_snapshot, pack_elements
 
 dotenv.load_dotenv("agents/.env")
 
@@ -22,7 +24,24 @@ if len(argv) >= 2:
 
 prompt_template = get_prompt_template()
 
-black_listed_elements = set(["html", "head", "title", "meta", "iframe", "body", "script", "style", "path", "svg", "br", "::marker",])
+# A complete command. TYPE and TYPESUBMIT end at their closing quote; the others need the line to
+# end, so that "CLICK 1" is not taken while "CLICK 12" is still streaming.
+command_re = re.compile(r'^\s*(TYPESUBMIT \d+ "[^"\n]*"|TYPE \d+ "[^"\n]*"|(?:CLICK \d+|SCROLL UP|SCROLL DOWN)(?=[ \t]*\n))', re.MULTILINE)
+
+# Lets the crawler know (once per snapshot) that the DOM changed, so the cached snapshot is dropped.
+# Also timestamps the last mutation for wait_for_settle.
+snapshot_watch_js = """
+(() => {
+	window.__natbotSnapshotFresh = false;
+	window.__natbotLastMutation = performance.now();
+	new MutationObserver(() => {
+		window.__natbotLastMutation = performance.now();
+		if (!window.__natbotSnapshotFresh) return;
+		window.__natbotSnapshotFresh = false;
+		window.__natbotSnapshotStale();
+	}).observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+})();
+"""
 
 class Crawler:
 	def __init__(self):
@@ -37,20 +56,92 @@ class Crawler:
 		self.page = self.browser.new_page()
 		# self.page.set_viewport_size({"width": 1280, "height": 1080})
 
+		# One DOMSnapshot covers the whole document; scrolling just moves a window over it
+		self.snapshot = None
+		self.scroll_pos = (0, 0)
+		self.page_scroll_pos = (0, 0)
+		self.snapshot_url = None  # Kept when a DOM mutation drops the snapshot, so the virtual scroll survives it
+		self.page.add_init_script(snapshot_watch_js)
+		self.page.expose_function("__natbotSnapshotStale", self.invalidate_snapshot)
+		self.page.on("framenavigated", lambda frame: frame == self.page.main_frame and self.invalidate_snapshot())
+
+		# In-flight requests, for wait_for_settle
+		self.pending_requests = set()
+		self.last_network_activity = time.time()
+		self.settle_log = []
+		self.page.on("request", self._on_request)
+		self.page.on("requestfinished", self._on_request_done)
+		self.page.on("requestfailed", self._on_request_done)
+
+	def invalidate_snapshot(self):
+		self.snapshot = None
+
+	def _on_request(self, request):
+		if request.resource_type not in ("websocket", "eventsource"):
+			self.pending_requests.add(request)
+			self.last_network_activity = time.time()
+
+	def _on_request_done(self, request):
+		self.pending_requests.discard(request)
+		self.last_network_activity = time.time()
+
+	def wait_for_settle(self, quiet_ms=300, network_idle_ms=250, timeout_ms=5000):
+		"""
+		Waits until the page is quiet: DOMContentLoaded reached, no request in flight for
+		network_idle_ms and no DOM mutation for quiet_ms, capped at timeout_ms.
+		Returns the seconds it took.
+		"""
+		start = time.time()
+		deadline = start + timeout_ms / 1000
+		timed_out = False
+		while True:
+			remaining_ms = (deadline - time.time()) * 1000
+			if remaining_ms <= 0:
+				timed_out = True
+				break
+			try:
+				self.page.wait_for_load_state("domcontentloaded", timeout=remaining_ms)
+				self.page.wait_for_function(
+					"(q) => window.__natbotLastMutation === undefined || performance.now() - window.__natbotLastMutation >= q",
+					arg=quiet_ms, polling=50, timeout=max(1, (deadline - time.time()) * 1000),
+				)
+			except PlaywrightError:
+				continue  # timed out, or a navigation replaced the document mid-check
+			idle_ms = (time.time() - self.last_network_activity) * 1000
+			if not self.pending_requests and idle_ms >= network_idle_ms:
+				break
+			self.page.wait_for_timeout(50)
+
+		seconds = time.time() - start
+		self.settle_log.append(seconds)
+		print("Settled in {:0.2f} seconds{}".format(seconds, " (timed out)" if timed_out else ""))
+		return seconds
+
 	def go_to_page(self, url):
+		self.invalidate_snapshot()
+		self.snapshot_url = None  # Even a reload of the same URL starts at the top
 		self.page.goto(url=url if "://" in url else "http://" + url)
 		self.client = self.page.context.new_cdp_session(self.page)
 		self.page_element_buffer = {}
 
+	def sync_scroll(self):
+		"""Scrolls the real page to the virtual scroll position before acting on coordinates."""
+		if self.scroll_pos != self.page_scroll_pos:
+			self.page.evaluate("([x, y]) => window.scrollTo(x, y)", list(self.scroll_pos))
+			self.page_scroll_pos = self.scroll_pos
+
 	def scroll(self, direction):
+		# Scrolling moves the window over the snapshot. A DOM mutation drops the snapshot; take the
+		# next one now, or a real scroll would be undone by sync_scroll on the next crawl
+		if self.snapshot is None:
+			self.take_snapshot()
+		step = self.snapshot["inner_height"]
+		max_top = max(0, self.snapshot["document_height"] - self.snapshot["inner_height"])
+		left, top = self.scroll_pos
 		if direction == "up":
-			self.page.evaluate(
-				"(document.scrollingElement || document.body).scrollTop = (document.scrollingElement || document.body).scrollTop - window.innerHeight;"
-			)
+			self.scroll_pos = (left, max(0, top - step))
 		elif direction == "down":
-			self.page.evaluate(
-				"(document.scrollingElement || document.body).scrollTop = (document.scrollingElement || document.body).scrollTop + window.innerHeight;"
-			)
+			self.scroll_pos = (left, min(max_top, top + step))
 
 	def click(self, id):
 		# Inject javascript into the page which removes the target= attribute from all links
@@ -64,19 +155,56 @@ class Crawler:
 
 		element = self.page_element_buffer.get(int(id))
 		if element:
-			x = element.get("center_x")
-			y = element.get("center_y")
+			# buffer coordinates are document coordinates; the mouse works in the viewport
+			self.sync_scroll()
+			left, top = self.page_scroll_pos
+			x = element.get("center_x") - left
+			y = element.get("center_y") - top
 			
 			self.page.mouse.click(x, y)
+			self.invalidate_snapshot()
 		else:
 			print("Could not find element")
 
 	def type(self, id, text):
 		self.click(id)
 		self.page.keyboard.type(text)
+		self.invalidate_snapshot()
 
 	def enter(self):
+		self.sync_scroll()
 		self.page.keyboard.press("Enter")
+		self.invalidate_snapshot()
+
+	def take_snapshot(self):
+		metrics = self.page.evaluate("""() => {
+			window.__natbotSnapshotFresh = true;
+			return {
+				device_pixel_ratio: window.devicePixelRatio,
+				left: window.pageXOffset,
+				top: window.pageYOffset,
+				width: window.screen.width,
+				height: window.screen.height,
+				inner_height: window.innerHeight,
+				document_height: (document.scrollingElement || document.body).scrollHeight,
+			};
+		}""")
+		device_pixel_ratio = metrics["device_pixel_ratio"]
+		if platform == "darwin" and device_pixel_ratio == 1:  # lies
+			device_pixel_ratio = 2
+
+		tree = self.client.send(
+			"DOMSnapshot.captureSnapshot",
+			{"computedStyles": [], "includeDOMRects": True, "includePaintOrder": True},
+		)
+		self.snapshot = dict(metrics, tree=tree, device_pixel_ratio=device_pixel_ratio)
+		self.page_scroll_pos = (metrics["left"], metrics["top"])
+		if self.page.url != self.snapshot_url:
+			self.scroll_pos = self.page_scroll_pos  # A new document starts where the page is
+		else:
+			left, top = self.scroll_pos  # The document may have shrunk since
+			self.scroll_pos = (left, min(top, max(0, metrics["document_height"] - metrics["inner_height"])))
+		self.snapshot_url = self.page.url
 
 	def crawl(self):
 		page = self.page
@@ -85,20 +213,17 @@ class Crawler:
 
 		page_state_as_text = []
 
-		device_pixel_ratio = page.evaluate("window.devicePixelRatio")
-		if platform == "darwin" and device_pixel_ratio == 1:  # lies
-			device_pixel_ratio = 2
+		if self.snapshot is None:
+			self.take_snapshot()
+		snapshot = self.snapshot
+		left, top = self.scroll_pos
 
-		win_scroll_x 		= page.evaluate("window.scrollX")
-		win_scroll_y 		= page.evaluate("window.scrollY")
-		win_upper_bound 	= page.evaluate("window.pageYOffset")
-		win_left_bound 		= page.evaluate("window.pageXOffset") 
-		win_width 			= page.evaluate("window.screen.width")
-		win_height 			= page.evaluate("window.screen.height")
-		win_right_bound 	= win_left_bound + win_width
-		win_lower_bound 	= win_upper_bound + win_height
-		document_offset_height = page.evaluate("document.body.offsetHeight")
-		document_scroll_height = page.evaluate("document.body.scrollHeight")
+		window = {
+			"left": left,
+			"top": top,
+			"right": left + snapshot["width"],
+			"bottom": top + snapshot["height"],
+		}
 
 #		percentage_progress_start = (win_upper_bound / document_scroll_height) * 100
 #		percentage_progress_end = (
@@ -117,293 +242,9 @@ class Crawler:
 			}
 		)
 
-		tree = self.client.send(
-			"DOMSnapshot.captureSnapshot",
-			{"computedStyles": [], "includeDOMRects": True, "includePaintOrder": True},
+		elements_of_interest = parse_snapshot(
+			snapshot["tree"], window, snapshot["device_pixel_ratio"], page_element_buffer
 		)
-		strings	 	= tree["strings"]
-		document 	= tree["documents"][0]
-		nodes 		= document["nodes"]
-		backend_node_id = nodes["backendNodeId"]
-		attributes 	= nodes["attributes"]
-		node_value 	= nodes["nodeValue"]
-		parent 		= nodes["parentIndex"]
-		node_types 	= nodes["nodeType"]
-		node_names 	= nodes["nodeName"]
-		is_clickable = set(nodes["isClickable"]["index"])
-
-		text_value 			= nodes["textValue"]
-		text_value_index 	= text_value["index"]
-		text_value_values 	= text_value["value"]
-
-		input_value 		= nodes["inputValue"]
-		input_value_index 	= input_value["index"]
-		input_value_values 	= input_value["value"]
-
-		input_checked 		= nodes["inputChecked"]
-		layout 				= document["layout"]
-		layout_node_index 	= layout["nodeIndex"]
-		bounds 				= layout["bounds"]
-
-		cursor = 0
-		html_elements_text = []
-
-		child_nodes = {}
-		elements_in_view_port = []
-
-		anchor_ancestry = {"-1": (False, None)}
-		button_ancestry = {"-1": (False, None)}
-
-		def convert_name(node_name, has_click_handler):
-			if node_name == "a":
-				return "link"
-			if node_name == "input":
-				return "input"
-			if node_name == "img":
-				return "img"
-			if (
-				node_name == "button" or has_click_handler
-			):  # found pages that needed this quirk
-				return "button"
-			else:
-				return "text"
-
-		def find_attributes(attributes, keys):
-			values = {}
-
-			for [key_index, value_index] in zip(*(iter(attributes),) * 2):
-				if value_index < 0:
-					continue
-				key = strings[key_index]
-				value = strings[value_index]
-
-				if key in keys:
-					values[key] = value
-					keys.remove(key)
-
-					if not keys:
-						return values
-
-			return values
-
-		def add_to_hash_tree(hash_tree, tag, node_id, node_name, parent_id):
-			"""
-			Recursively builds a hash tree, mapping node_ids to (is_anchor_descendant, anchor_id) pairs.
-			anchor_id is the node_id of the closest ancestor that is an anchor.
-			anchor_id is None if the node has no anchor ancestors.
-			"""
-			parent_id_str = str(parent_id)
-			if not parent_id_str in hash_tree:
-				parent_name = strings[node_names[parent_id]].lower()
-				grand_parent_id = parent[parent_id]
-
-				add_to_hash_tree(
-					hash_tree, tag, parent_id, parent_name, grand_parent_id
-				)
-
-			is_parent_desc_anchor, anchor_id = hash_tree[parent_id_str]
-
-			# even if the anchor is nested in another anchor, we set the "root" for all descendants to be ::Self
-			if node_name == tag:
-				value = (True, node_id)
-			elif (
-				is_parent_desc_anchor
-			):  # reuse the parent's anchor_id (which could be much higher in the tree)
-				value = (True, anchor_id)
-			else:
-				value = (
-					False,
-					None,
-				)  # not a descendant of an anchor, most likely it will become text, an interactive element or discarded
-
-			hash_tree[str(node_id)] = value
-
-			return value
-
-		for index, node_name_index in enumerate(node_names):
-			node_parent = parent[index]
-			node_name = strings[node_name_index].lower()
-
-			is_ancestor_of_anchor, anchor_id = add_to_hash_tree(
-				anchor_ancestry, "a", index, node_name, node_parent
-			)
-
-			is_ancestor_of_button, button_id = add_to_hash_tree(
-				button_ancestry, "button", index, node_name, node_parent
-			)
-
-			try:
-				cursor = layout_node_index.index(
-					index
-				)  # todo replace this with proper cursoring, ignoring the fact this is O(n^2) for the moment
-			except:
-				continue
-
-			if node_name in black_listed_elements:
-				continue
-
-			[x, y, width, height] = bounds[cursor]
-			x /= device_pixel_ratio
-			y /= device_pixel_ratio
-			width /= device_pixel_ratio
-			height /= device_pixel_ratio
-
-			elem_left_bound = x
-			elem_top_bound = y
-			elem_right_bound = x + width
-			elem_lower_bound = y + height
-
-			partially_is_in_viewport = (
-				elem_left_bound < win_right_bound
-				and elem_right_bound >= win_left_bound
-				and elem_top_bound < win_lower_bound
-				and elem_lower_bound >= win_upper_bound
-			)
-
-			if not partially_is_in_viewport:
-				continue
-
-			meta_data = []
-
-			# inefficient to grab the same set of keys for kinds of objects but its fine for now
-			element_attributes = find_attributes(
-				attributes[index], ["type", "placeholder", "aria-label", "title", "alt"]
-			)
-
-			ancestor_exception = is_ancestor_of_anchor or is_ancestor_of_button
-			ancestor_node_key = (
-				None
-				if not ancestor_exception
-				else str(anchor_id)
-				if is_ancestor_of_anchor
-				else str(button_id)
-			)
-			ancestor_node = (
-				None
-				if not ancestor_exception
-				else child_nodes.setdefault(str(ancestor_node_key), [])
-			)
-
-			if node_name == "#text" and ancestor_exception:
-				text = strings[node_value[index]]
-				if text == "|" or text == "•":
-					continue
-				ancestor_node.append({
-					"type": "type", "value": text
-				})
-			else:
-				if (
-					node_name == "input" and element_attributes.get("type") == "submit"
-				) or node_name == "button":
-					node_name = "button"
-					element_attributes.pop(
-						"type", None
-					)  # prevent [button ... (button)..]
-				
-				for key in element_attributes:
-					if ancestor_exception:
-						ancestor_node.append({
-							"type": "attribute",
-							"key":  key,
-							"value": element_attributes[key]
-						})
-					else:
-						meta_data.append(element_attributes[key])
-
-			element_node_value = None
-
-			if node_value[index] >= 0:
-				element_node_value = strings[node_value[index]]
-				if element_node_value == "|": #commonly used as a seperator, does not add much context - lets save ourselves some token space
-					continue
-			elif (
-				node_name == "input"
-				and index in input_value_index
-				and element_node_value is None
-			):
-				node_input_text_index = input_value_index.index(index)
-				text_index = input_value_values[node_input_text_index]
-				if node_input_text_index >= 0 and text_index >= 0:
-					element_node_value = strings[text_index]
-
-			# remove redudant elements
-			if ancestor_exception and (node_name != "a" and node_name != "button"):
-				continue
-
-			elements_in_view_port.append(
-				{
-					"node_index": str(index),
-					"backend_node_id": backend_node_id[index],
-					"node_name": node_name,
-					"node_value": element_node_value,
-					"node_meta": meta_data,
-					"is_clickable": index in is_clickable,
-					"origin_x": int(x),
-					"origin_y": int(y),
-					"center_x": int(x + (width / 2)),
-					"center_y": int(y + (height / 2)),
-				}
-			)
-
-		# lets filter further to remove anything that does not hold any text nor has click handlers + merge text from leaf#text nodes with the parent
-		elements_of_interest= []
-		id_counter 			= 0
-
-		for element in elements_in_view_port:
-			node_index = element.get("node_index")
-			node_name = element.get("node_name")
-			node_value = element.get("node_value")
-			is_clickable = element.get("is_clickable")
-			origin_x = element.get("origin_x")
-			origin_y = element.get("origin_y")
-			center_x = element.get("center_x")
-			center_y = element.get("center_y")
-			meta_data = element.get("node_meta")
-
-			inner_text = f"{node_value} " if node_value else ""
-			meta = ""
-			
-			if node_index in child_nodes:
-				for child in child_nodes.get(node_index):
-					entry_type = child.get('type')
-					entry_value= child.get('value')
-
-					if entry_type == "attribute":
-						entry_key = child.get('key')
-						meta_data.append(f'{entry_key}="{entry_value}"')
-					else:
-						inner_text += f"{entry_value} "
-
-			if meta_data:
-				meta_string = " ".join(meta_data)
-				meta = f" {meta_string}"
-
-			if inner_text != "":
-				inner_text = f"{inner_text.strip()}"
-
-			converted_node_name = convert_name(node_name, is_clickable)
-
-			# not very elegant, more like a placeholder
-			if (
-				(converted_node_name != "button" or meta == "")
-				and converted_node_name != "link"
-				and converted_node_name != "input"
-				and converted_node_name != "img"
-				and converted_node_name != "textarea"
-			) and inner_text.strip() == "":
-				continue
-
-			page_element_buffer[id_counter] = element
-
-			if inner_text != "": 
-				elements_of_interest.append(
-					f"""<{converted_node_name} id={id_counter}{meta}>{inner_text}</{converted_node_name}>"""
-				)
-			else:
-				elements_of_interest.append(
-					f"""<{converted_node_name} id={id_counter}{meta}/>"""
-				)
-			id_counter += 1
 
 		print("Parsing time: {:0.2f} seconds".format(time.time() - start))
 		return elements_of_interest
@@ -427,7 +268,7 @@ if __name__ == "__main__":
 		prompt = prompt.replace("$objective", objective)
 		prompt = prompt.replace("$url", url[:100])
 		prompt = prompt.replace("$previous_command", previous_command)
-		prompt = prompt.replace("$browser_content", browser_content[:4500])
+		prompt = prompt.replace("$browser_content", browser_content)
 		# response = client.responses.create(model="text-davinci-002", input=prompt, temperature=0.5, best_of=10, n=3, max_tokens=50)
 		response = client.chat.completions.create(
       		# model="gpt-3.5-turbo", 
@@ -438,8 +279,23 @@ if __name__ == "__main__":
          	# temperature=0.5, 
           	# best_of=10, 
            	# n=3
+			stream=True,
         )
-		return response.choices[0].message.content
+		# run_cmd only uses the first command, so stop the generation as soon as one is complete
+		text = ""
+		tokens = 0
+		start = time.time()
+		for chunk in response:
+			if chunk.choices and chunk.choices[0].delta.content:
+				text += chunk.choices[0].delta.content
+				tokens += 1
+			match = command_re.search(text)
+			if match:
+				response.close()
+				if not quiet:
+					print("Command complete after {} tokens in {:.2f}s; rest of the generation cancelled".format(tokens, time.time() - start))
+				return match.group(1)
+		return text
 
 	def run_cmd(cmd):
 		cmd = cmd.split("\n")[0]
@@ -464,7 +320,7 @@ if __name__ == "__main__":
 				text += '\n'
 			_crawler.type(id, text)
 
-		time.sleep(2)
+		_crawler.wait_for_settle()
 
 	objective = "Make a reservation for 2 at 7pm at bistro vida in menlo park"
 	print("\nWelcome to natbot! What is your objective?")
@@ -477,7 +333,11 @@ if __name__ == "__main__":
 	_crawler.go_to_page("google.com")
 	try:
 		while True:
-			browser_content = "\n".join(_crawler.crawl())
+			# About the old 4500-character cap, but whole elements only
+			elements, emitted_tokens, dropped_tokens = pack_elements(_crawler.crawl(), token_budget=1100)
+			browser_content = "\n".join(elements)
+			if dropped_tokens:
+				print("Page content: {} tokens sent, {} dropped".format(emitted_tokens, dropped_tokens))
 			prev_cmd = gpt_cmd
 			gpt_cmd = get_gpt_command(objective, _crawler.page.url, prev_cmd, browser_content)
 			gpt_cmd = gpt_cmd.strip()
@@ -498,19 +358,17 @@ if __name__ == "__main__":
 				_crawler.go_to_page(url)
 			elif command == "u":
 				_crawler.scroll("up")
-				time.sleep(1)
 			elif command == "d":
 				_crawler.scroll("down")
-				time.sleep(1)
 			elif command == "c":
 				id = input("id:")
 				_crawler.click(id)
-				time.sleep(1)
+				_crawler.wait_for_settle()
 			elif command == "t":
 				id = input("id:")
 				text = input("text:")
 				_crawler.type(id, text)
-				time.sleep(1)
+				_crawler.wait_for_settle()
 			elif command == "o":
 				objective = input("Objective:")
 			else:
@@ -0,0 +1,513 @@
+# DOMSnapshot parsing for natbot's Crawler.
+#
+# `parse_snapshot` is the vectorised version used by `Crawler.crawl`. `parse_snapshot_reference`
+# is the original per-node loop, kept to check that both produce the same output
+# (see bench_natbot_snapshot.py). `pack_elements` fits the parsed elements into a token budget.
+
+import re
+
+import numpy as np
+
+black_listed_elements = set(["html", "head", "title", "meta", "iframe", "body", "script", "style", "path", "svg", "br", "::marker",])
+
+attribute_keys = ["type", "placeholder", "aria-label", "title", "alt"]
+
+
+def convert_name(node_name, has_click_handler):
+	if node_name == "a":
+		return "link"
+	if node_name == "input":
+		return "input"
+	if node_name == "img":
+		return "img"
+	if (
+		node_name == "button" or has_click_handler
+	):  # found pages that needed this quirk
+		return "button"
+	else:
+		return "text"
+
+
+def _nearest_tagged(is_tagged, parent):
+	"""
+	For every node, the index of the closest node at or above it whose tag matches, or -1.
+	Resolved by pointer jumping over `parentIndex`, so it takes O(log depth) vectorised passes.
+	"""
+	target = np.where(is_tagged, np.arange(len(parent)), parent)
+	resolved = is_tagged | (target < 0)
+	while not resolved.all():
+		pending = np.flatnonzero(~resolved)
+		hop = target[pending]
+		target[pending] = target[hop]
+		resolved[pending] = resolved[hop]
+	return target
+
+
+def parse_snapshot(tree, window, device_pixel_ratio, page_element_buffer):
+	"""
+	Same output as `parse_snapshot_reference`, but the per-node work that does not depend on
+	the page text (ancestry, layout lookup, blacklist and viewport tests) is done on NumPy arrays,
+	so only the nodes that are actually in the viewport are visited in Python.
+	"""
+	strings	 	= tree["strings"]
+	document 	= tree["documents"][0]
+	nodes 		= document["nodes"]
+	backend_node_id = nodes["backendNodeId"]
+	attributes 	= nodes["attributes"]
+	node_value 	= nodes["nodeValue"]
+	node_names 	= nodes["nodeName"]
+	is_clickable = set(nodes["isClickable"]["index"])
+
+	input_value 		= nodes["inputValue"]
+	layout 				= document["layout"]
+
+	node_count = len(node_names)
+	if node_count == 0:
+		return []
+
+	# Node names are resolved once per distinct string id instead of once per node
+	name_ids, name_of_node = np.unique(np.asarray(node_names, dtype=np.int64), return_inverse=True)
+	names = [strings[name_id].lower() for name_id in name_ids.tolist()]
+	is_anchor = np.array([name == "a" for name in names])[name_of_node]
+	is_button = np.array([name == "button" for name in names])[name_of_node]
+	is_black_listed = np.array([name in black_listed_elements for name in names])[name_of_node]
+
+	parent = np.asarray(nodes["parentIndex"], dtype=np.int64)
+	anchor_of = _nearest_tagged(is_anchor, parent).tolist()
+	button_of = _nearest_tagged(is_button, parent).tolist()
+
+	# Inverse of layout.nodeIndex: first layout row of every node, -1 when it has no layout
+	layout_node_index = np.asarray(layout["nodeIndex"], dtype=np.int64)
+	layout_row = np.full(node_count, -1, dtype=np.int64)
+	laid_out_nodes, first_row = np.unique(layout_node_index, return_index=True)
+	valid = (laid_out_nodes >= 0) & (laid_out_nodes < node_count)
+	layout_row[laid_out_nodes[valid]] = first_row[valid]
+
+	bounds = np.asarray(layout["bounds"], dtype=np.float64).reshape(-1, 4) / device_pixel_ratio
+
+	has_layout = layout_row >= 0
+	node_bounds = bounds[np.where(has_layout, layout_row, 0)] if len(bounds) else np.zeros((node_count, 4))
+	left = node_bounds[:, 0]
+	top = node_bounds[:, 1]
+	right = left + node_bounds[:, 2]
+	bottom = top + node_bounds[:, 3]
+	in_viewport = (
+		(left < window["right"])
+		& (right >= window["left"])
+		& (top < window["bottom"])
+		& (bottom >= window["top"])
+	)
+	candidates = np.flatnonzero(has_layout & ~is_black_listed & in_viewport).tolist()
+	candidate_bounds = node_bounds[candidates].tolist()
+	candidate_names = [names[i] for i in name_of_node[candidates].tolist()]
+
+	# Precomputed string-id lookups for the attribute keys and input values we care about
+	attribute_key_of = {i: key for i, key in enumerate(strings) if key in attribute_keys}
+	input_value_of = {}
+	for node_index, text_index in zip(input_value["index"], input_value["value"]):
+		input_value_of.setdefault(node_index, text_index)
+
+	def find_attributes(pairs):
+		values = {}
+		for i in range(0, len(pairs) - 1, 2):
+			value_index = pairs[i + 1]
+			if value_index < 0:
+				continue
+			key = attribute_key_of.get(pairs[i])
+			if key is not None and key not in values:
+				values[key] = strings[value_index]
+				if len(values) == len(attribute_keys):
+					break
+		return values
+
+	child_nodes = {}
+	elements_in_view_port = []
+
+	for index, node_name, (x, y, width, height) in zip(candidates, candidate_names, candidate_bounds):
+		meta_data = []
+		element_attributes = find_attributes(attributes[index])
+
+		anchor_id = anchor_of[index]
+		button_id = button_of[index]
+		ancestor_exception = anchor_id >= 0 or button_id >= 0
+		ancestor_node = (
+			None
+			if not ancestor_exception
+			else child_nodes.setdefault(str(anchor_id if anchor_id >= 0 else button_id), [])
+		)
+
+		if node_name == "#text" and ancestor_exception:
+			text = strings[node_value[index]]
+			if text == "|" or text == "•":
+				continue
+			ancestor_node.append({
+				"type": "type", "value": text
+			})
+		else:
+			if (
+				node_name == "input" and element_attributes.get("type") == "submit"
+			) or node_name == "button":
+				node_name = "button"
+				element_attributes.pop("type", None)
+
+			for key in element_attributes:
+				if ancestor_exception:
+					ancestor_node.append({
+						"type": "attribute",
+						"key":  key,
+						"value": element_attributes[key]
+					})
+				else:
+					meta_data.append(element_attributes[key])
+
+		element_node_value = None
+
+		if node_value[index] >= 0:
+			element_node_value = strings[node_value[index]]
+			if element_node_value == "|":
+				continue
+		elif node_name == "input" and index in input_value_of:
+			text_index = input_value_of[index]
+			if text_index >= 0:
+				element_node_value = strings[text_index]
+
+		if ancestor_exception and (node_name != "a" and node_name != "button"):
+			continue
+
+		elements_in_view_port.append(
+			{
+				"node_index": str(index),
+				"backend_node_id": backend_node_id[index],
+				"node_name": node_name,
+				"node_value": element_node_value,
+				"node_meta": meta_data,
+				"is_clickable": index in is_clickable,
+				"origin_x": int(x),
+				"origin_y": int(y),
+				"center_x": int(x + (width / 2)),
+				"center_y": int(y + (height / 2)),
+			}
+		)
+
+	return _elements_of_interest(elements_in_view_port, child_nodes, page_element_buffer)
+
+
+def parse_snapshot_reference(tree, window, device_pixel_ratio, page_element_buffer):
+	"""
+	Turns a `DOMSnapshot.captureSnapshot` result into natbot's `<link id=..>` lines, filling
+	`page_element_buffer` with the elements they refer to. `window` holds the viewport bounds
+	in document coordinates: left, top, right and bottom.
+	"""
+	win_left_bound 	= window["left"]
+	win_upper_bound = window["top"]
+	win_right_bound = window["right"]
+	win_lower_bound = window["bottom"]
+
+	strings	 	= tree["strings"]
+	document 	= tree["documents"][0]
+	nodes 		= document["nodes"]
+	backend_node_id = nodes["backendNodeId"]
+	attributes 	= nodes["attributes"]
+	node_value 	= nodes["nodeValue"]
+	parent 		= nodes["parentIndex"]
+	node_types 	= nodes["nodeType"]
+	node_names 	= nodes["nodeName"]
+	is_clickable = set(nodes["isClickable"]["index"])
+
+	text_value 			= nodes["textValue"]
+	text_value_index 	= text_value["index"]
+	text_value_values 	= text_value["value"]
+
+	input_value 		= nodes["inputValue"]
+	input_value_index 	= input_value["index"]
+	input_value_values 	= input_value["value"]
+
+	input_checked 		= nodes["inputChecked"]
+	layout 				= document["layout"]
+	layout_node_index 	= layout["nodeIndex"]
+	bounds 				= layout["bounds"]
+
+	cursor = 0
+	html_elements_text = []
+
+	child_nodes = {}
+	elements_in_view_port = []
+
+	anchor_ancestry = {"-1": (False, None)}
+	button_ancestry = {"-1": (False, None)}
+
+	def find_attributes(attributes, keys):
+		values = {}
+
+		for [key_index, value_index] in zip(*(iter(attributes),) * 2):
+			if value_index < 0:
+				continue
+			key = strings[key_index]
+			value = strings[value_index]
+
+			if key in keys:
+				values[key] = value
+				keys.remove(key)
+
+				if not keys:
+					return values
+
+		return values
+
+	def add_to_hash_tree(hash_tree, tag, node_id, node_name, parent_id):
+		"""
+		Recursively builds a hash tree, mapping node_ids to (is_anchor_descendant, anchor_id) pairs.
+		anchor_id is the node_id of the closest ancestor that is an anchor.
+		anchor_id is None if the node has no anchor ancestors.
+		"""
+		parent_id_str = str(parent_id)
+		if not parent_id_str in hash_tree:
+			parent_name = strings[node_names[parent_id]].lower()
+			grand_parent_id = parent[parent_id]
+
+			add_to_hash_tree(
+				hash_tree, tag, parent_id, parent_name, grand_parent_id
+			)
+
+		is_parent_desc_anchor, anchor_id = hash_tree[parent_id_str]
+
+		# even if the anchor is nested in another anchor, we set the "root" for all descendants to be ::Self
+		if node_name == tag:
+			value = (True, node_id)
+		elif (
+			is_parent_desc_anchor
+		):  # reuse the parent's anchor_id (which could be much higher in the tree)
+			value = (True, anchor_id)
+		else:
+			value = (
+				False,
+				None,
+			)  # not a descendant of an anchor, most likely it will become text, an interactive element or discarded
+
+		hash_tree[str(node_id)] = value
+
+		return value
+
+	for index, node_name_index in enumerate(node_names):
+		node_parent = parent[index]
+		node_name = strings[node_name_index].lower()
+
+		is_ancestor_of_anchor, anchor_id = add_to_hash_tree(
+			anchor_ancestry, "a", index, node_name, node_parent
+		)
+
+		is_ancestor_of_button, button_id = add_to_hash_tree(
+			button_ancestry, "button", index, node_name, node_parent
+		)
+
+		try:
+			cursor = layout_node_index.index(
+				index
+			)  # todo replace this with proper cursoring, ignoring the fact this is O(n^2) for the moment
+		except:
+			continue
+
+		if node_name in black_listed_elements:
+			continue
+
+		[x, y, width, height] = bounds[cursor]
+		x /= device_pixel_ratio
+		y /= device_pixel_ratio
+		width /= device_pixel_ratio
+		height /= device_pixel_ratio
+
+		elem_left_bound = x
+		elem_top_bound = y
+		elem_right_bound = x + width
+		elem_lower_bound = y + height
+
+		partially_is_in_viewport = (
+			elem_left_bound < win_right_bound
+			and elem_right_bound >= win_left_bound
+			and elem_top_bound < win_lower_bound
+			and elem_lower_bound >= win_upper_bound
+		)
+
+		if not partially_is_in_viewport:
+			continue
+
+		meta_data = []
+
+		# inefficient to grab the same set of keys for kinds of objects but its fine for now
+		element_attributes = find_attributes(
+			attributes[index], ["type", "placeholder", "aria-label", "title", "alt"]
+		)
+
+		ancestor_exception = is_ancestor_of_anchor or is_ancestor_of_button
+		ancestor_node_key = (
+			None
+			if not ancestor_exception
+			else str(anchor_id)
+			if is_ancestor_of_anchor
+			else str(button_id)
+		)
+		ancestor_node = (
+			None
+			if not ancestor_exception
+			else child_nodes.setdefault(str(ancestor_node_key), [])
+		)
+
+		if node_name == "#text" and ancestor_exception:
+			text = strings[node_value[index]]
+			if text == "|" or text == "•":
+				continue
+			ancestor_node.append({
+				"type": "type", "value": text
+			})
+		else:
+			if (
+				node_name == "input" and element_attributes.get("type") == "submit"
+			) or node_name == "button":
+				node_name = "button"
+				element_attributes.pop(
+					"type", None
+				)  # prevent [button ... (button)..]
+			
+			for key in element_attributes:
+				if ancestor_exception:
+					ancestor_node.append({
+						"type": "attribute",
+						"key":  key,
+						"value": element_attributes[key]
+					})
+				else:
+					meta_data.append(element_attributes[key])
+
+		element_node_value = None
+
+		if node_value[index] >= 0:
+			element_node_value = strings[node_value[index]]
+			if element_node_value == "|": #commonly used as a seperator, does not add much context - lets save ourselves some token space
+				continue
+		elif (
+			node_name == "input"
+			and index in input_value_index
+			and element_node_value is None
+		):
+			node_input_text_index = input_value_index.index(index)
+			text_index = input_value_values[node_input_text_index]
+			if node_input_text_index >= 0 and text_index >= 0:
+				element_node_value = strings[text_index]
+
+		# remove redudant elements
+		if ancestor_exception and (node_name != "a" and node_name != "button"):
+			continue
+
+		elements_in_view_port.append(
+			{
+				"node_index": str(index),
+				"backend_node_id": backend_node_id[index],
+				"node_name": node_name,
+				"node_value": element_node_value,
+				"node_meta": meta_data,
+				"is_clickable": index in is_clickable,
+				"origin_x": int(x),
+				"origin_y": int(y),
+				"center_x": int(x + (width / 2)),
+				"center_y": int(y + (height / 2)),
+			}
+		)
+
+	return _elements_of_interest(elements_in_view_port, child_nodes, page_element_buffer)
+
+
+def _elements_of_interest(elements_in_view_port, child_nodes, page_element_buffer):
+	# lets filter further to remove anything that does not hold any text nor has click handlers + merge text from leaf#text nodes with the parent
+	elements_of_interest= []
+	id_counter 			= 0
+
+	for element in elements_in_view_port:
+		node_index = element.get("node_index")
+		node_name = element.get("node_name")
+		node_value = element.get("node_value")
+		is_clickable = element.get("is_clickable")
+		origin_x = element.get("origin_x")
+		origin_y = element.get("origin_y")
+		center_x = element.get("center_x")
+		center_y = element.get("center_y")
+		meta_data = element.get("node_meta")
+
+		inner_text = f"{node_value} " if node_value else ""
+		meta = ""
+		
+		if node_index in child_nodes:
+			for child in child_nodes.get(node_index):
+				entry_type = child.get('type')
+				entry_value= child.get('value')
+
+				if entry_type == "attribute":
+					entry_key = child.get('key')
+					meta_data.append(f'{entry_key}="{entry_value}"')
+				else:
+					inner_text += f"{entry_value} "
+
+		if meta_data:
+			meta_string = " ".join(meta_data)
+			meta = f" {meta_string}"
+
+		if inner_text != "":
+			inner_text = f"{inner_text.strip()}"
+
+		converted_node_name = convert_name(node_name, is_clickable)
+
+		# not very elegant, more like a placeholder
+		if (
+			(converted_node_name != "button" or meta == "")
+			and converted_node_name != "link"
+			and converted_node_name != "input"
+			and converted_node_name != "img"
+			and converted_node_name != "textarea"
+		) and inner_text.strip() == "":
+			continue
+
+		page_element_buffer[id_counter] = element
+
+		if inner_text != "": 
+			elements_of_interest.append(
+				f"""<{converted_node_name} id={id_counter}{meta}>{inner_text}</{converted_node_name}>"""
+			)
+		else:
+			elements_of_interest.append(
+				f"""<{converted_node_name} id={id_counter}{meta}/>"""
+			)
+		id_counter += 1
+
+
+	return elements_of_interest
+
+
+# Rough token estimate (short letter runs, digit groups, single symbols). A copy of next/serializer.py's
+# _TOKEN_RE, which extras/ cannot import: keep the two in sync.
+_token_re = re.compile(r"[A-Za-z]{1,6}|\d{1,3}|[^\sA-Za-z\d]")
+_priority_tags = {"input": 2, "textarea": 2, "button": 1}
+
+
+def count_tokens(text):
+	return len(_token_re.findall(text))
+
+
+def pack_elements(elements_of_interest, token_budget):
+	"""
+	Keeps whole elements (never cutting one in half) within `token_budget` estimated tokens.
+	Inputs and buttons are packed first, then everything else in page order; the kept elements
+	are returned in page order with (tokens emitted, tokens dropped).
+	"""
+	def priority(index):
+		tag = elements_of_interest[index][1:].split(" ", 1)[0].split(">", 1)[0].rstrip("/")
+		return -_priority_tags.get(tag, 0)
+
+	kept = set()
+	emitted, dropped = 0, 0
+	for index in sorted(range(len(elements_of_interest)), key=priority):
+		cost = count_tokens(elements_of_interest[index]) + 1
+		if emitted + cost > token_budget:
+			dropped += cost
+			continue
+		emitted += cost
+		kept.add(index)
+	return [element for index, element in enumerate(elements_of_interest) if index in kept], emitted, dropped
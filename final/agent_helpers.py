@@ -0,0 +1,127 @@
+# Helpers shared by the ResearchAgent drafts (test.py, test2.py, test3.py). The crawler, ranker and
+# LLM client are duck-typed: each helper uses an optional capability when it is there.
+from typing import List, Dict, Any, Optional
+import inspect
+import json
+import time
+import re
+
+# Rough token estimate: short letter runs, digit groups, symbols. A copy of next/serializer.py's
+# _TOKEN_RE, which final/ cannot import: keep the two in sync.
+_TOKEN_RE = re.compile(r"[A-Za-z]{1,6}|\d{1,3}|[^\sA-Za-z\d]")
+
+
+def wait_for_page(crawler, fallback_seconds: float) -> float:
+    """Waits until the page settles if the crawler supports it, otherwise sleeps. Returns seconds waited."""
+    if hasattr(crawler, "wait_for_settle"):
+        return crawler.wait_for_settle()
+    time.sleep(fallback_seconds)
+    return fallback_seconds
+
+
+def stream_page_text(crawler, max_blocks: int = 20, max_chars: int = 4000) -> List[str]:
+    """First text blocks of the page, if the crawler can stream them; empty otherwise."""
+    if not hasattr(crawler, "iter_text_blocks"):
+        return []
+    blocks, chars = [], 0
+    for block in crawler.iter_text_blocks():
+        if len(block.strip()) <= 3:
+            continue
+        blocks.append(block)
+        chars += len(block)
+        if len(blocks) >= max_blocks or chars >= max_chars:
+            break  # Closes the stream; the rest of the page is never read
+    return blocks
+
+
+def fit_to_budget(lines: List[str], token_budget: int = 1000) -> List[str]:
+    """Whole lines, in order, up to `token_budget` estimated tokens (instead of a fixed line count)."""
+    kept, used = [], 0
+    for line in lines:
+        cost = len(_TOKEN_RE.findall(line)) + 1
+        if used + cost > token_budget:
+            break
+        kept.append(line)
+        used += cost
+    return kept
+
+
+def elements_for_prompt(ranker, elements: List[str], task: str, top_k: int) -> List[str]:
+    """The ranker's top-K elements for the prompt (all of them without a ranker); `elements` stays the full set for ID lookups."""
+    if ranker is None:
+        return elements
+    return ranker(task, elements, top_k)
+
+
+def action_schema(action_names: List[str], action_field: str = "action", extra_properties: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    The reply to an action prompt, as JSON Schema: `action_field` (one of `action_names`), target,
+    value and reasoning, plus any `extra_properties`. Clients whose chat() accepts Ollama's `format`
+    get it passed along, which constrains the model to exactly this shape.
+    """
+    properties = {
+        action_field: {"type": "string", "enum": [name.upper() for name in action_names]},
+        "target": {"type": ["string", "null"]},
+        "value": {"type": ["string", "null"]},
+        "reasoning": {"type": "string"},
+    }
+    properties.update(extra_properties or {})
+    return {"type": "object", "properties": properties, "required": [action_field, "target", "value", "reasoning"]}
+
+
+def validate_action(data: Any, schema: Dict[str, Any], action_field: str = "action") -> Optional[str]:
+    """Why `data` does not match an `action_schema`, or None if it does. Object properties must hold strings or nulls."""
+    if not isinstance(data, dict):
+        return "not a JSON object"
+    for name, spec in schema["properties"].items():
+        if name not in data:
+            if name in schema["required"]:
+                return f"missing '{name}'"
+            continue
+        if data[name] is None and "null" in spec["type"]:
+            continue
+        if "object" in spec["type"]:
+            if not isinstance(data[name], dict):
+                return f"'{name}' must be an object"
+            if any(value is not None and not isinstance(value, str) for value in data[name].values()):
+                return f"'{name}' values must be strings"
+            continue
+        if not isinstance(data[name], str):
+            return f"'{name}' must be a string"
+    if data[action_field].upper() not in schema["properties"][action_field]["enum"]:
+        return f"unknown action '{data[action_field]}'"
+    return None
+
+
+def accepts_format(chat) -> bool:
+    """Whether a client's chat() takes Ollama's `format` argument (by name, or through **kwargs)."""
+    try:
+        parameters = inspect.signature(chat).parameters.values()
+    except (TypeError, ValueError):
+        return False
+    return any(p.name == "format" or p.kind == p.VAR_KEYWORD for p in parameters)
+
+
+def chat_action(llm_client, prompt: str, schema: Dict[str, Any], structured: bool) -> str:
+    """Sends an action prompt, constrained to `schema` when the client supports it (see `accepts_format`)."""
+    if structured:
+        return llm_client.chat(prompt, format=schema)
+    return llm_client.chat(prompt)
+
+
+def parse_json_reply(response: str) -> Any:
+    """The JSON value between the first '{' and the last '}' of a reply, or None if there is none."""
+    start_idx = response.find('{')
+    end_idx = response.rfind('}') + 1
+    if start_idx == -1 or end_idx == 0:
+        return None
+    try:
+        return json.loads(response[start_idx:end_idx])
+    except json.JSONDecodeError:
+        return None
+
+
+def parse_report(parse_stats: Dict[str, int]) -> Dict[str, Any]:
+    """`parse_stats` ({"responses", "failed"}) with the share of replies that could not be used."""
+    responses = parse_stats["responses"]
+    return dict(parse_stats, failure_rate=parse_stats["failed"] / responses if responses else 0.0)
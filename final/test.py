@@ -7,6 +7,10 @@ from enum import Enum
 from llm.base_llm import OllamaClient
 from browser.playwright_browser import Crawler
 
+from termcolor import colored
+from agent_helpers import (wait_for_page, fit_to_budget, elements_for_prompt,
+                           action_schema, validate_action, accepts_format, chat_action, parse_json_reply, parse_report)
+
 class ActionType(Enum):
     NAVIGATE = "navigate"
     CLICK = "click"
@@ -23,6 +27,10 @@ class Action:
     value: Optional[str] = None
     reasoning: Optional[str] = None
 
+# The reply to an action prompt (see agent_helpers.action_schema), with the findings so far
+ACTION_SCHEMA = action_schema([action_type.value for action_type in ActionType], action_field="action_type",
+                              extra_properties={"findings": {"type": ["string", "null"]}})
+
 @dataclass
 class StepResult:
     step_number: int
@@ -31,15 +39,21 @@ class StepResult:
     ai_analysis: str
     success: bool
     error: Optional[str] = None
+    settle_seconds: float = 0.0
 
 class ResearchAgent:
-    def __init__(self, crawler, llm_client, model_name: str = "llama3.2"):
+    def __init__(self, crawler, llm_client, model_name: str = "llama3.2", ranker=None, top_k: int = 25):
         self.crawler = crawler
         self.llm_client = llm_client
         self.model_name = model_name
+        # Optional callable(task, elements, top_k) -> elements, e.g. next/ranker.py's ElementRanker().rank_lines
+        self.ranker = ranker
+        self.top_k = top_k
         self.step_history: List[StepResult] = []
         self.research_context = ""
         self.findings = []
+        self.structured_output = accepts_format(llm_client.chat)
+        self.parse_stats = {"responses": 0, "failed": 0}
         
     def execute_research(self, task: str, max_steps: int = 10, starting_url: str = "https://duckduckgo.com") -> Dict[str, Any]:
         """
@@ -80,8 +94,6 @@ class ResearchAgent:
                 if not step_result.success:
                     print(f"⚠️ Step {step} failed: {step_result.error}")
                     continue
-                
-                time.sleep(1)
             
             # Generate final research summary
             final_summary = self._generate_final_summary(task)
@@ -93,6 +105,7 @@ class ResearchAgent:
                 "max_steps": max_steps,
                 "findings": self.findings,
                 "summary": final_summary,
+                "action_parsing": parse_report(self.parse_stats),
                 "step_history": [self._step_result_to_dict(step) for step in self.step_history]
             }
             
@@ -104,6 +117,7 @@ class ResearchAgent:
                 "error": str(e),
                 "steps_used": len(self.step_history),
                 "findings": self.findings,
+                "action_parsing": parse_report(self.parse_stats),
                 "step_history": [self._step_result_to_dict(step) for step in self.step_history]
             }
         finally:
@@ -122,7 +136,7 @@ RESEARCH TASK: {task}
 CURRENT STEP: {step}
 
 CURRENT PAGE ELEMENTS:
-{chr(10).join(page_state[:50])}  # Limit to first 50 elements to avoid token limits
+{chr(10).join(elements_for_prompt(self.ranker, page_state, task, self.top_k) if self.ranker else page_state[:50])}  # Top-K by relevance, else the first 50
 
 PREVIOUS FINDINGS:
 {chr(10).join(self.findings[-3:])}  # Last 3 findings
@@ -151,10 +165,12 @@ Respond with ONLY a JSON object in this exact format:
 }}
 """
         try:
-            response = self.llm_client.chat(prompt)
+            response = chat_action(self.llm_client, prompt, ACTION_SCHEMA, self.structured_output)
             
             ai_decision = self._parse_ai_response(response['response'])
-            action_type = ActionType(ai_decision.get('action_type', 'analyze').lower())
+            if ai_decision is None:
+                return Action(type=ActionType.ANALYZE, reasoning="Fallback action: unusable AI response")
+            action_type = ActionType(ai_decision['action_type'].lower())
             
             return Action(
                 type=action_type,
@@ -206,14 +222,16 @@ Respond with ONLY a JSON object in this exact format:
                 if analysis:
                     self.findings.append(f"Step {step}: {analysis}")
                     
-            # Get updated page state after action
+            # Get updated page state once the page has settled after the action
+            settle_seconds = wait_for_page(self.crawler, 1.0)
             updated_page_state = self.crawler.crawl()
             return StepResult(
                 step_number=step,
                 action=action,
                 page_state=updated_page_state,
                 ai_analysis="",
-                success=True
+                success=True,
+                settle_seconds=settle_seconds
             )
             
         except Exception as e:
@@ -255,7 +273,7 @@ Respond with ONLY a JSON object in this exact format:
 Analyze this webpage content for information relevant to the research task: "{self.research_context}"
 
 PAGE CONTENT:
-{chr(10).join(page_state[:100])}
+{chr(10).join(fit_to_budget(page_state))}
 
 Extract any relevant information, facts, data, or insights that help answer the research question.
 Be concise and focus only on information directly related to the research task.
@@ -288,22 +306,17 @@ Response:"""
         
         return "; ".join(context_parts)
     
-    def _parse_ai_response(self, response: str) -> Dict[str, Any]:
-        """Parse AI response, handling potential JSON formatting issues."""
-        try:
-            # Try to find JSON in the response
-            start_idx = response.find('{')
-            end_idx = response.rfind('}') + 1
-            
-            if start_idx != -1 and end_idx != 0:
-                json_str = response[start_idx:end_idx]
-                return json.loads(json_str)
-            else:
-                # Fallback parsing
-                return {"action_type": "analyze", "reasoning": "Could not parse AI response"}
-                
-        except json.JSONDecodeError:
-            return {"action_type": "analyze", "reasoning": "Invalid JSON in AI response"}
+    def _parse_ai_response(self, response: str) -> Optional[Dict[str, Any]]:
+        """Parse and validate the AI's action reply. None, counted as a parse failure, if it does not match ACTION_SCHEMA."""
+        self.parse_stats["responses"] += 1
+        parsed = parse_json_reply(response)
+        error = validate_action(parsed, ACTION_SCHEMA, action_field="action_type")
+        if error:
+            self.parse_stats["failed"] += 1
+            print(colored(f"⚠️ Unusable AI response ({error})", "red"))
+            return None
+        return parsed
+
     
     def _extract_element_id(self, element_text: str) -> Optional[str]:
         """Extract element ID from element text representation."""
@@ -356,6 +369,7 @@ Summary:"""
             "reasoning": step_result.action.reasoning,
             "success": step_result.success,
             "error": step_result.error,
+            "settle_seconds": round(step_result.settle_seconds, 3),
             "page_elements_count": len(step_result.page_state)
         }
 
@@ -9,6 +9,8 @@ from llm.base_llm import OllamaClient
 from browser.playwright_browser import Crawler
 
 from termcolor import colored
+from agent_helpers import (wait_for_page, stream_page_text, fit_to_budget, elements_for_prompt,
+                           action_schema, validate_action, accepts_format, chat_action, parse_json_reply, parse_report)
 
 class ActionType(Enum):
     NAVIGATE = "navigate"
@@ -27,6 +29,9 @@ class Action:
     value: Optional[str] = None
     reasoning: Optional[str] = None
 
+# The reply to an action prompt (see agent_helpers.action_schema)
+ACTION_SCHEMA = action_schema([action_type.value for action_type in ActionType])
+
 @dataclass
 class StepResult:
     step_number: int
@@ -35,14 +40,20 @@ class StepResult:
     ai_analysis: str
     success: bool
     error: Optional[str] = None
+    settle_seconds: float = 0.0
 
 class ResearchAgent:
-    def __init__(self, crawler, llm_client):
+    def __init__(self, crawler, llm_client, ranker=None, top_k: int = 25):
         self.crawler = crawler
         self.llm_client = llm_client
+        # Optional callable(task, elements, top_k) -> elements, e.g. next/ranker.py's ElementRanker().rank_lines
+        self.ranker = ranker
+        self.top_k = top_k
         self.step_history: List[StepResult] = []
         self.research_context = ""
         self.findings = []
+        self.structured_output = accepts_format(llm_client.chat)
+        self.parse_stats = {"responses": 0, "failed": 0}
         
     def execute_research(self, task: str, max_steps: int = 10, starting_url: str = "https://duckduckgo.com") -> Dict[str, Any]:
         """
@@ -80,8 +91,6 @@ class ResearchAgent:
                 if not step_result.success:
                     print(colored(f"⚠️ Step {step} failed: {step_result.error}", "red"))
                     continue
-                
-                time.sleep(1)
             
             final_summary = self._generate_final_summary(task)            
             return {
@@ -91,6 +100,7 @@ class ResearchAgent:
                 "max_steps": max_steps,
                 "findings": self.findings,
                 "summary": final_summary,
+                "action_parsing": parse_report(self.parse_stats),
                 "step_history": [self._step_result_to_dict(step) for step in self.step_history]
             }
             
@@ -102,6 +112,7 @@ class ResearchAgent:
                 "error": str(e),
                 "steps_used": len(self.step_history),
                 "findings": self.findings,
+                "action_parsing": parse_report(self.parse_stats),
                 "step_history": [self._step_result_to_dict(step) for step in self.step_history]
             }
         finally:
@@ -111,7 +122,7 @@ class ResearchAgent:
     def _decide_next_action(self, step: int, elements: List[str], task: str) -> Action:
         context = self._build_context_summary() # Build context from previous steps
         
-        elements_text = "\n".join(elements) # Format elements for AI
+        elements_text = "\n".join(elements_for_prompt(self.ranker, elements, task, self.top_k)) # Format elements for AI
         prompt = f"""You are an AI research agent. Analyze the current webpage and decide the best next action.
 
 RESEARCH TASK: {task}
@@ -153,9 +164,11 @@ Respond ONLY with this JSON format:
 }}"""
 
         try:
-            response = self.llm_client.chat(prompt)
+            response = chat_action(self.llm_client, prompt, ACTION_SCHEMA, self.structured_output)
             ai_decision = self._parse_ai_response(response) 
-            action_type = ActionType(ai_decision.get('action', 'analyze').lower())
+            if ai_decision is None:
+                return Action(type=ActionType.ANALYZE, reasoning="Fallback action: unusable AI response")
+            action_type = ActionType(ai_decision['action'].lower())
             return Action(
                 type=action_type,
                 target=ai_decision.get('target'),
@@ -219,7 +232,7 @@ Respond ONLY with this JSON format:
                 print(f"📝 Found: {analysis}")
                 
         # Get updated page elements after action
-        time.sleep(0.5)  # Brief wait for page to update
+        settle_seconds = wait_for_page(self.crawler, 1.5)  # Wait for the page to update
         updated_elements = self.crawler.crawl()
         
         return StepResult(
@@ -227,7 +240,8 @@ Respond ONLY with this JSON format:
             action=action,
             page_elements=updated_elements,
             ai_analysis="",
-            success=True
+            success=True,
+            settle_seconds=settle_seconds
         )
             
         # except Exception as e:
@@ -267,19 +281,22 @@ Respond ONLY with this JSON format:
     def _analyze_current_page(self, elements: List[str]) -> str:
         """Use AI to analyze current page elements for research insights."""
         
-        # Extract text content from elements
-        text_elements = []
-        for element in elements:
-            if '<text' in element or 'href=' in element:
-                # Extract readable content
-                content = self._extract_text_content(element)
-                if content and len(content.strip()) > 3:
-                    text_elements.append(content)
+        # Prefer the page's own text, streamed so the walk stops once the prompt budget is full
+        text_elements = stream_page_text(self.crawler, max_blocks=20)
+        
+        # Otherwise extract text content from elements
+        if not text_elements:
+            for element in elements:
+                if '<text' in element or 'href=' in element:
+                    # Extract readable content
+                    content = self._extract_text_content(element)
+                    if content and len(content.strip()) > 3:
+                        text_elements.append(content)
         
         if not text_elements:
             return "No text content found on page."
         
-        text_content = "\n".join(text_elements[:20])  # Limit to first 20 text elements
+        text_content = "\n".join(fit_to_budget(text_elements))  # Whole elements within the prompt budget
         
         prompt = f"""Analyze this webpage content for information relevant to: "{self.research_context}"
 
@@ -346,33 +363,17 @@ Relevant information:"""
         
         return "; ".join(context_parts)
     
-    def _parse_ai_response(self, response: str) -> Dict[str, Any]:
-        """Parse AI response, handling potential JSON formatting issues."""
-        try:
-            # Try to find JSON in the response
-            start_idx = response.find('{')
-            end_idx = response.rfind('}') + 1
-            
-            if start_idx != -1 and end_idx != 0:
-                json_str = response[start_idx:end_idx]
-                parsed = json.loads(json_str)
-                return parsed
-            else:
-                # Fallback: try to extract key information with regex
-                action_match = re.search(r'"action":\s*"([^"]+)"', response)
-                target_match = re.search(r'"target":\s*"([^"]+)"', response)
-                value_match = re.search(r'"value":\s*"([^"]+)"', response)
-                reasoning_match = re.search(r'"reasoning":\s*"([^"]+)"', response)
-                
-                return {
-                    "action": action_match.group(1) if action_match else "analyze",
-                    "target": target_match.group(1) if target_match else None,
-                    "value": value_match.group(1) if value_match else None,
-                    "reasoning": reasoning_match.group(1) if reasoning_match else "Extracted from malformed response"
-                }
-                
-        except (json.JSONDecodeError, AttributeError):
-            return {"action": "analyze", "reasoning": "Could not parse AI response"}
+    def _parse_ai_response(self, response: str) -> Optional[Dict[str, Any]]:
+        """Parse and validate the AI's action reply. None, counted as a parse failure, if it does not match ACTION_SCHEMA."""
+        self.parse_stats["responses"] += 1
+        parsed = parse_json_reply(response)
+        error = validate_action(parsed, ACTION_SCHEMA)
+        if error:
+            self.parse_stats["failed"] += 1
+            print(colored(f"⚠️ Unusable AI response ({error})", "red"))
+            return None
+        return parsed
+
     
     def _generate_final_summary(self, task: str) -> str:
         """Generate a final summary of research findings."""
@@ -413,6 +414,7 @@ Summary:"""
             "reasoning": step_result.action.reasoning,
             "success": step_result.success,
             "error": step_result.error,
+            "settle_seconds": round(step_result.settle_seconds, 3),
             "elements_count": len(step_result.page_elements)
         }
 
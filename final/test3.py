@@ -2,6 +2,7 @@ import json
 import time
 import re
 from typing import List, Dict, Any, Optional
+from urllib.parse import quote_plus
 from dataclasses import dataclass
 from enum import Enum
 
@@ -9,8 +10,11 @@ from llm.base_llm import OllamaClient
 from browser.playwright_browser import Crawler
 
 from termcolor import colored
+from agent_helpers import (wait_for_page, stream_page_text, fit_to_budget, elements_for_prompt,
+                           action_schema, validate_action, accepts_format, chat_action, parse_json_reply, parse_report)
 
 class ActionType(Enum):
+    SEARCH = "search"
     NAVIGATE = "navigate"
     CLICK = "click"
     TYPE = "type"
@@ -19,12 +23,32 @@ class ActionType(Enum):
     ANALYZE = "analyze"
     COMPLETE = "complete"
 
+# Results page the SEARCH action opens directly, instead of typing into a search box
+SEARCH_URL = "https://html.duckduckgo.com/html/?q={query}"
+
 @dataclass
 class Action:
     type: ActionType
     target: Optional[str] = None
     value: Optional[str] = None
     reasoning: Optional[str] = None
+    # Checked before the action runs as a later step of a plan: {"element_present": id, "url_contains": text}
+    precondition: Optional[Dict[str, Optional[str]]] = None
+
+# The reply to an action prompt (see agent_helpers.action_schema), with the precondition a later plan step checks
+ACTION_SCHEMA = action_schema([action_type.value for action_type in ActionType], extra_properties={
+    "precondition": {
+        "type": ["object", "null"],
+        "properties": {"element_present": {"type": ["string", "null"]}, "url_contains": {"type": ["string", "null"]}},
+    },
+})
+
+# The reply as an ordered batch of actions
+PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {"actions": {"type": "array", "minItems": 1, "items": ACTION_SCHEMA}},
+    "required": ["actions"],
+}
 
 @dataclass
 class StepResult:
@@ -34,64 +58,136 @@ class StepResult:
     ai_analysis: str
     success: bool
     error: Optional[str] = None
+    settle_seconds: float = 0.0
 
 class ResearchAgent:
-    def __init__(self, crawler, llm_client):
+    def __init__(self, crawler, llm_client, ranker=None, top_k: int = 25, skills=None, fetcher=None):
         self.crawler = crawler
         self.llm_client = llm_client
+        # Optional callable(task, elements, top_k) -> elements, e.g. next/ranker.py's ElementRanker().rank_lines
+        self.ranker = ranker
+        self.top_k = top_k
+        # Optional store with match(url, task), report(key, ok) and record(url, task, steps, llm_calls,
+        # llm_seconds), e.g. next/skills.py's SkillStore: a matching skill is replayed before asking the model
+        self.skills = skills
+        # Optional callable(url) -> text blocks, or None when the page needs a browser, e.g. next/static_fetch.py's
+        # StaticFetcher(): ANALYZE with a URL target reads that page over HTTP instead of opening it
+        self.fetcher = fetcher
         self.step_history: List[StepResult] = []
         self.research_context = ""
         self.findings = []
+        self.structured_output = accepts_format(llm_client.chat)
+        self.parse_stats = {"responses": 0, "failed": 0}
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+        self.precondition_failures = 0
         
-    def execute_research(self, task: str, max_steps: int = 10, starting_url: str = "https://duckduckgo.com") -> Dict[str, Any]:
+    def execute_research(self, task: str, max_steps: int = 10, starting_url: str = "https://duckduckgo.com",
+                         search_query: Optional[str] = None) -> Dict[str, Any]:
         print(f"🔍 Starting research task: {task}")
         print(f"📊 Maximum steps allowed: {max_steps}")
         
         self.research_context = task
         self.step_history = []
         self.findings = []
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+        self.precondition_failures = 0
+        self.executed = []  # Actions run, each with the URL it ran on, for the skill store
         
-        self.crawler.go_to_page(starting_url)
+        # With a search query, start on its results page: no model call or typing to get there
+        self.crawler.go_to_page(SEARCH_URL.format(query=quote_plus(search_query)) if search_query else starting_url)
+        completed = self._replay_skill(task)
         
         for step in range(1, max_steps + 1):
+            if completed:
+                break
             print(f"\n----- Step {step}/{max_steps} -----")
             
             elements = self.crawler.crawl()
             print(colored(f"📄 Found {len(elements)} elements on page", "yellow"))
         
-            action = self._decide_next_action(step, elements, task)
+            actions = self._decide_next_actions(step, elements, task)
+            completed = self._run_plan(step, actions, elements)
             
-            if action.type == ActionType.COMPLETE:
+            if completed:
                 print("✅ Research task completed!")
-                break
-            
-            # Execute the decided action
-            step_result = self._execute_action(step, action, elements)
-            self.step_history.append(step_result)
-            
-            if not step_result.success:
-                print(colored(f"⚠️ Step {step} failed: {step_result.error}", "red"))
-                continue
-            
-            time.sleep(1)
         
+        if self.skills is not None and completed and self.llm_calls:
+            self.skills.record(starting_url, task, self.executed, self.llm_calls, self.llm_seconds)
+        print(colored(f"🤖 LLM calls: {self.llm_calls} for {len(self.step_history)} actions", "yellow"))
         final_summary = self._generate_final_summary(task)            
         return {
             "task": task,
             "completed": True,
             "steps_used": len(self.step_history),
             "max_steps": max_steps,
+            "llm_calls": self.llm_calls,
+            "precondition_failures": self.precondition_failures,
+            "skills": self.skills.stats() if self.skills is not None and hasattr(self.skills, "stats") else None,
             "findings": self.findings,
             "summary": final_summary,
+            "action_parsing": parse_report(self.parse_stats),
             "step_history": [self._step_result_to_dict(step) for step in self.step_history]
         }
 
     
-    def _decide_next_action(self, step: int, elements: List[str], task: str) -> Action:
+    def _run_plan(self, step: int, actions: List[Action], elements: List[str], check_first: bool = False) -> bool:
+        """
+        Runs the planned actions back to back; the model is asked again once the plan is used up, a
+        precondition does not hold or an action fails. Returns True if the plan reached COMPLETE.
+        """
+        for i, action in enumerate(actions):
+            url = getattr(getattr(self.crawler, "page", None), "url", "")
+            if action.type == ActionType.COMPLETE:
+                self.executed.append({"action": action.type.value, "target": None, "value": None, "url": url})
+                return True
+            if i > 0 or check_first:
+                failed = self._check_precondition(action.precondition, elements)
+                if failed:
+                    self.precondition_failures += 1
+                    print(colored(f"⏭️ Skipping the rest of the plan at action {i + 1}/{len(actions)}: {failed}", "yellow"))
+                    return False
+            
+            # Execute the decided action
+            step_result = self._execute_action(step, action, elements)
+            self.step_history.append(step_result)
+            elements = step_result.page_elements
+            
+            if not step_result.success:
+                print(colored(f"⚠️ Step {step} failed: {step_result.error}", "red"))
+                return False
+            self.executed.append({"action": action.type.value, "target": action.target, "value": action.value, "url": url})
+        return False
+    
+    def _replay_skill(self, task: str) -> bool:
+        """Replays a recorded skill for `task` from the current page. True if it completed the task."""
+        if self.skills is None:
+            return False
+        page = getattr(self.crawler, "page", None)
+        match = self.skills.match(page.url if page is not None else "", task)
+        if match is None:
+            return False
+        key, steps = match
+        print(colored(f"🔁 Replaying skill '{key}' ({len(steps)} actions)", "cyan"))
+        actions = [
+            Action(type=ActionType(step["action"]), target=step.get("target"), value=step.get("value"),
+                   reasoning="Recorded skill", precondition=step.get("precondition"))
+            for step in steps
+        ]
+        completed = self._run_plan(0, actions, self.crawler.crawl(), check_first=True)
+        self.skills.report(key, completed)
+        if completed:
+            print("✅ Research task completed from a recorded skill!")
+        else:
+            print(colored("⚠️ Skill did not match the page, asking the model", "yellow"))
+        return completed
+    
+    def _decide_next_actions(self, step: int, elements: List[str], task: str) -> List[Action]:
         context = self._build_context_summary() # Build context from previous steps
         print(colored(f"📊 Context summary: {context}", "black"))
         
-        elements_text = "\n".join(elements) # Format elements for AI
+        elements_text = "\n".join(elements_for_prompt(self.ranker, elements, task, self.top_k)) # Format elements for AI
         prompt = f"""You are an AI research agent. Analyze the current webpage and decide the best next action.
 
 RESEARCH TASK: {task}
@@ -105,15 +201,16 @@ PREVIOUS CONTEXT: {context}
 RECENT FINDINGS:
 {chr(10).join(self.findings[-3:]) if self.findings else "No findings yet"}
 
-Based on the research task and current page elements, choose the BEST single action:
+Based on the research task and current page elements, choose the BEST next action, or a short sequence of actions:
 
-1. NAVIGATE - go to a URL (use href from link elements)
-2. CLICK - click an element by its ID number (e.g., "5" for <button id=5/>)  
-3. TYPE - type text into an input field by ID
-4. TYPE_SUBMIT -type text into an input field by ID and submit
-5. SCROLL - scroll "up" or "down"
-6. ANALYZE - extract information from current page text elements
-7. COMPLETE - research task is finished
+1. SEARCH - open the web search results for the query in "value" directly
+2. NAVIGATE - go to a URL (use href from link elements)
+3. CLICK - click an element by its ID number (e.g., "5" for <button id=5/>)  
+4. TYPE - type text into an input field by ID
+5. TYPE_SUBMIT -type text into an input field by ID and submit
+6. SCROLL - scroll "up" or "down"
+7. ANALYZE - extract information from current page text elements, or from the page at the URL in "target" without opening it
+8. COMPLETE - research task is finished
 
 Look for:
 - Search boxes (input elements) to search for the research topic
@@ -121,25 +218,57 @@ Look for:
 - Text content that answers the research question
 - Navigation elements to explore relevant pages
 
-Also, to search use TYPE_SUBMIT which types the search query and submits it.
+Also, to search use SEARCH with the query as "value"; it is faster than typing into a search box.
+
+Plan several actions only when the later ones are predictable, e.g. SEARCH and then
+ANALYZE the results. Give each later action a "precondition" describing the page it expects
+(an element id that must be present and/or text the URL must contain); if it does not hold, the
+rest of the list is skipped and you will see the new page. When unsure, return a single action.
 
 Respond ONLY with this JSON format:
 {{
-    "action": "NAVIGATE|CLICK|TYPE|TYPE_SUBMIT|SCROLL|ANALYZE|COMPLETE",
-    "target": "element_id_number OR url OR direction",
-    "value": "text_to_type_or_search_query",
-    "reasoning": "why this action helps complete the research task"
+    "actions": [
+        {{
+            "action": "SEARCH|NAVIGATE|CLICK|TYPE|TYPE_SUBMIT|SCROLL|ANALYZE|COMPLETE",
+            "target": "element_id_number OR url OR direction",
+            "value": "text_to_type_or_search_query",
+            "reasoning": "why this action helps complete the research task",
+            "precondition": {{"element_present": "element_id_number or null", "url_contains": "text or null"}}
+        }}
+    ]
 }}"""
 
-        response = self.llm_client.chat(prompt)
-        ai_decision = self._parse_ai_response(response) 
-        action_type = ActionType(ai_decision.get('action', 'analyze').lower())
-        return Action(
-            type=action_type,
-            target=ai_decision.get('target'),
-            value=ai_decision.get('value'),
-            reasoning=ai_decision.get('reasoning', '')
-        )
+        self.llm_calls += 1
+        start = time.perf_counter()
+        response = chat_action(self.llm_client, prompt, PLAN_SCHEMA, self.structured_output)
+        self.llm_seconds += time.perf_counter() - start
+        ai_decisions = self._parse_ai_response(response) 
+        if ai_decisions is None:
+            return [Action(type=ActionType.ANALYZE, reasoning="Fallback action: unusable AI response")]
+        return [
+            Action(
+                type=ActionType(ai_decision['action'].lower()),
+                target=ai_decision.get('target'),
+                value=ai_decision.get('value'),
+                reasoning=ai_decision.get('reasoning', ''),
+                precondition=ai_decision.get('precondition')
+            )
+            for ai_decision in ai_decisions
+        ]
+
+    def _check_precondition(self, precondition: Optional[Dict[str, Optional[str]]], elements: List[str]) -> Optional[str]:
+        """Why `precondition` does not hold for the current page, or None if it holds (or there is none)."""
+        if not precondition:
+            return None
+        url_part = precondition.get("url_contains")
+        if url_part:
+            page = getattr(self.crawler, "page", None)
+            if page is None or url_part not in page.url:
+                return f"URL does not contain '{url_part}'"
+        element_id = precondition.get("element_present")
+        if element_id and not any(re.search(rf'id={re.escape(str(element_id))}\b', element) for element in elements):
+            return f"element {element_id} is not on the page"
+        return None
     
     def _execute_action(self, step: int, action: Action, elements: List[str]) -> StepResult:
         """Execute the decided action and return the result."""
@@ -152,7 +281,12 @@ Respond ONLY with this JSON format:
         if action.reasoning:
             print(f"💭 Reasoning: {action.reasoning}")
         
-        if action.type == ActionType.NAVIGATE:
+        if action.type == ActionType.SEARCH:
+            query = action.value or action.target
+            if query:
+                self.crawler.go_to_page(SEARCH_URL.format(query=quote_plus(query)))
+            
+        elif action.type == ActionType.NAVIGATE:
             self.crawler.go_to_page(action.target)
             
         elif action.type == ActionType.CLICK:
@@ -173,13 +307,14 @@ Respond ONLY with this JSON format:
                 
         elif action.type == ActionType.ANALYZE:
             # Extract information from current page
-            analysis = self._analyze_current_page(elements)
+            url = action.target if action.target and "://" in action.target else None
+            analysis = self._analyze_current_page(elements, url)
             if analysis and analysis != "No relevant information found.":
                 self.findings.append(f"Step {step}: {analysis}")
                 print(f"📝 Found: {analysis}")
                 
         # Get updated page elements after action
-        time.sleep(0.5)  # Brief wait for page to update
+        settle_seconds = wait_for_page(self.crawler, 1.5)  # Wait for the page to update
         updated_elements = self.crawler.crawl()
         
         return StepResult(
@@ -187,7 +322,8 @@ Respond ONLY with this JSON format:
             action=action,
             page_elements=updated_elements,
             ai_analysis="",
-            success=True
+            success=True,
+            settle_seconds=settle_seconds
         )
     
     # def _perform_search(self, elements: List[str], query: str) -> bool:
@@ -213,22 +349,30 @@ Respond ONLY with this JSON format:
         #                 continue
         # return False
     
-    def _analyze_current_page(self, elements: List[str]) -> str:
-        """Use AI to analyze current page elements for research insights."""
+    def _analyze_current_page(self, elements: List[str], url: Optional[str] = None) -> str:
+        """Use AI to analyze current page elements (or the page at `url`) for research insights."""
+        
+        text_elements = self._fetch_page_text(url) if url else None
+        if text_elements is None:
+            if url:
+                self.crawler.go_to_page(url)  # The page needs a browser after all
+                elements = self.crawler.crawl()
+            # Prefer the page's own text, streamed so the walk stops once the prompt budget is full
+            text_elements = stream_page_text(self.crawler, max_blocks=20)
         
-        # Extract text content from elements
-        text_elements = []
-        for element in elements:
-            if '<text' in element or 'href=' in element:
-                # Extract readable content
-                content = self._extract_text_content(element)
-                if content and len(content.strip()) > 3:
-                    text_elements.append(content)
+        # Otherwise extract text content from elements
+        if not text_elements:
+            for element in elements:
+                if '<text' in element or 'href=' in element:
+                    # Extract readable content
+                    content = self._extract_text_content(element)
+                    if content and len(content.strip()) > 3:
+                        text_elements.append(content)
         
         if not text_elements:
             return "No text content found on page."
         
-        text_content = "\n".join(text_elements[:20])  # Limit to first 20 text elements
+        text_content = "\n".join(fit_to_budget(text_elements))  # Whole elements within the prompt budget
         
         prompt = f"""Analyze this webpage content for information relevant to: "{self.research_context}"
 
@@ -247,6 +391,23 @@ Relevant information:"""
         except Exception as e:
             return f"Analysis failed: {str(e)}"
     
+    def _fetch_page_text(self, url: str, max_blocks: int = 20, max_chars: int = 4000) -> Optional[List[str]]:
+        """First text blocks of the page at `url` read by the fetcher, without the browser; None if it cannot."""
+        if self.fetcher is None:
+            return None
+        blocks = self.fetcher(url)
+        if blocks is None:
+            return None
+        kept, chars = [], 0
+        for block in blocks:
+            if len(block.strip()) <= 3:
+                continue
+            kept.append(block)
+            chars += len(block)
+            if len(kept) >= max_blocks or chars >= max_chars:
+                break
+        return kept
+    
     def _extract_element_id(self, element: str) -> Optional[str]:
         """Extract element ID from element string."""
         # Look for id=X pattern
@@ -292,31 +453,27 @@ Relevant information:"""
         
         return "; ".join(context_parts)
     
-    def _parse_ai_response(self, response: str) -> Dict[str, Any]:
-        """Parse AI response, handling potential JSON formatting issues."""
-            # Try to find JSON in the response
-        start_idx = response.find('{')
-        end_idx = response.rfind('}') + 1
-        
-        if start_idx != -1 and end_idx != 0:
-            json_str = response[start_idx:end_idx]
-            parsed = json.loads(json_str)
-            return parsed
+    def _parse_ai_response(self, response: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Parse and validate the AI's reply into its list of actions (a lone action object is a list
+        of one). None, counted as a parse failure, if an action does not match ACTION_SCHEMA.
+        """
+        self.parse_stats["responses"] += 1
+        parsed = parse_json_reply(response)
+        if isinstance(parsed, dict) and "actions" not in parsed:
+            parsed = {"actions": [parsed]}
+        actions = parsed.get("actions") if isinstance(parsed, dict) else None
+        if not isinstance(actions, list) or not actions:
+            error = "no actions"
         else:
-            # Fallback: try to extract key information with regex
-            action_match = re.search(r'"action":\s*"([^"]+)"', response)
-            target_match = re.search(r'"target":\s*"([^"]+)"', response)
-            value_match = re.search(r'"value":\s*"([^"]+)"', response)
-            reasoning_match = re.search(r'"reasoning":\s*"([^"]+)"', response)
-            
-            return {
-                "action": action_match.group(1) if action_match else "analyze",
-                "target": target_match.group(1) if target_match else None,
-                "value": value_match.group(1) if value_match else None,
-                "reasoning": reasoning_match.group(1) if reasoning_match else "Extracted from malformed response"
-            }
-                
+            error = next((error for error in (validate_action(action, ACTION_SCHEMA) for action in actions) if error), None)
+        if error:
+            self.parse_stats["failed"] += 1
+            print(colored(f"⚠️ Unusable AI response ({error})", "red"))
+            return None
+        return actions
 
+    
     def _generate_final_summary(self, task: str) -> str:
         """Generate a final summary of research findings."""
         
@@ -353,6 +510,7 @@ Summary:"""
             "reasoning": step_result.action.reasoning,
             "success": step_result.success,
             "error": step_result.error,
+            "settle_seconds": round(step_result.settle_seconds, 3),
             "elements_count": len(step_result.page_elements)
         }
 
@@ -0,0 +1,99 @@
+from agent_helpers import action_schema, validate_action, accepts_format, chat_action, parse_json_reply, parse_report
+
+SCHEMA = action_schema(["navigate", "click", "complete"])
+PRECONDITION_SCHEMA = action_schema(["navigate", "click"], extra_properties={
+    "precondition": {"type": ["object", "null"], "properties": {"element_present": {"type": ["string", "null"]}}},
+})
+
+
+def action(**fields):
+    return dict({"action": "CLICK", "target": "12", "value": None, "reasoning": "opens the article"}, **fields)
+
+
+def test_valid_action():
+    assert validate_action(action(), SCHEMA) is None
+    assert validate_action(action(action="click"), SCHEMA) is None  # Case-insensitive
+
+
+def test_not_an_object():
+    assert validate_action(None, SCHEMA) == "not a JSON object"
+    assert validate_action(["CLICK"], SCHEMA) == "not a JSON object"
+
+
+def test_missing_required_field():
+    data = action()
+    del data["reasoning"]
+    assert validate_action(data, SCHEMA) == "missing 'reasoning'"
+
+
+def test_unknown_action():
+    assert validate_action(action(action="HOVER"), SCHEMA) == "unknown action 'HOVER'"
+
+
+def test_wrong_types():
+    assert validate_action(action(target=12), SCHEMA) == "'target' must be a string"
+    assert validate_action(action(reasoning=None), SCHEMA) == "'reasoning' must be a string"  # Not nullable
+
+
+def test_custom_action_field():
+    schema = action_schema(["navigate"], action_field="action_type")
+    data = {"action_type": "NAVIGATE", "target": None, "value": "example.com", "reasoning": "start"}
+    assert validate_action(data, schema, action_field="action_type") is None
+    assert validate_action(dict(data, action_type="FLY"), schema, action_field="action_type") == "unknown action 'FLY'"
+
+
+def test_precondition_object():
+    assert validate_action(action(precondition={"element_present": "12"}), PRECONDITION_SCHEMA) is None
+    assert validate_action(action(precondition=None), PRECONDITION_SCHEMA) is None
+    assert validate_action(action(precondition={"element_present": 12}), PRECONDITION_SCHEMA) == "'precondition' values must be strings"
+    assert validate_action(action(precondition="12"), PRECONDITION_SCHEMA) == "'precondition' must be an object"
+
+
+class FormatClient:
+    def __init__(self):
+        self.calls = []
+
+    def chat(self, prompt, format=None):
+        self.calls.append((prompt, format))
+        return "{}"
+
+
+class KwargsClient:
+    def chat(self, prompt, **options):
+        return "{}"
+
+
+class PlainClient:
+    def __init__(self):
+        self.calls = []
+
+    def chat(self, prompt):
+        self.calls.append(prompt)
+        return "{}"
+
+
+def test_accepts_format():
+    assert accepts_format(FormatClient().chat)
+    assert accepts_format(KwargsClient().chat)
+    assert not accepts_format(PlainClient().chat)
+    assert not accepts_format(len)  # Builtins without a signature
+
+
+def test_chat_action_passes_the_schema_only_when_supported():
+    client = FormatClient()
+    chat_action(client, "next?", SCHEMA, accepts_format(client.chat))
+    assert client.calls == [("next?", SCHEMA)]
+    plain = PlainClient()
+    chat_action(plain, "next?", SCHEMA, accepts_format(plain.chat))
+    assert plain.calls == ["next?"]
+
+
+def test_parse_json_reply():
+    assert parse_json_reply('Sure: {"action": "CLICK"} done') == {"action": "CLICK"}
+    assert parse_json_reply("no json here") is None
+    assert parse_json_reply("{not json}") is None
+
+
+def test_parse_report():
+    assert parse_report({"responses": 4, "failed": 1}) == {"responses": 4, "failed": 1, "failure_rate": 0.25}
+    assert parse_report({"responses": 0, "failed": 0})["failure_rate"] == 0.0
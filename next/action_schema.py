@@ -0,0 +1,190 @@
+from collections import Counter
+import json
+import re
+
+from helper import loads_lenient, first_object, visible_text
+
+# LLMAgent's action, as JSON Schema. Passed as Ollama's `format`, it constrains decoding to
+# objects of this shape; `ActionParser` validates against the same schema.
+ACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action": {"type": "string", "enum": ["search", "navigate", "click", "fill_input", "type", "scroll", "done"]},
+        "element_id": {"type": ["string", "null"]},
+        "value": {"type": ["string", "null"]},
+        "text": {"type": ["string", "null"]},
+        "input_mode": {"type": ["string", "null"], "enum": ["bulk", "keys", None]},
+    },
+    "required": ["action"],
+}
+
+# Checked against the live page right before a planned action runs
+PRECONDITION_SCHEMA = {
+    "type": ["object", "null"],
+    "properties": {
+        "element_present": {"type": ["string", "null"]},  # ID of an element that must be visible
+        "url_contains": {"type": ["string", "null"]},  # Text the current URL must contain
+    },
+}
+
+# An ordered batch of actions, each with an optional precondition
+PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "actions": {
+            "type": "array",
+            "minItems": 1,
+            "items": dict(ACTION_SCHEMA, properties=dict(ACTION_SCHEMA["properties"], precondition=PRECONDITION_SCHEMA)),
+        },
+    },
+    "required": ["actions"],
+}
+
+# Fields each action needs on top of 'action'
+REQUIRED_FIELDS = {
+    "search": ("value",),
+    "navigate": ("value",),
+    "click": ("element_id",),
+    "fill_input": ("element_id", "text"),
+    "type": ("element_id", "text"),
+    "scroll": ("value",),
+    "done": (),
+}
+
+_JSON_TYPES = {"object": dict, "array": list, "string": str, "boolean": bool, "null": type(None)}
+_FENCE_RE = re.compile(r"```json\s*")
+
+
+def _type_matches(value, name):
+    if name in ("integer", "number"):
+        return isinstance(value, (int, float) if name == "number" else int) and not isinstance(value, bool)
+    return isinstance(value, _JSON_TYPES[name])
+
+
+def validate(instance, schema, path="$"):
+    """
+    Errors for `instance` against the subset of JSON Schema used here: type, enum, properties,
+    required, additionalProperties, items and minItems. An empty list means valid.
+    """
+    types = schema.get("type")
+    if types is not None:
+        types = [types] if isinstance(types, str) else types
+        if not any(_type_matches(instance, name) for name in types):
+            return [f"{path}: expected {' or '.join(types)}, got {type(instance).__name__}"]
+    if "enum" in schema and instance not in schema["enum"]:
+        return [f"{path}: {instance!r} is not one of {schema['enum']}"]
+
+    errors = []
+    if isinstance(instance, dict):
+        properties = schema.get("properties", {})
+        errors += [f"{path}: missing '{name}'" for name in schema.get("required", ()) if name not in instance]
+        for name, value in instance.items():
+            if name in properties:
+                errors += validate(value, properties[name], f"{path}.{name}")
+            elif schema.get("additionalProperties") is False:
+                errors.append(f"{path}: unexpected '{name}'")
+    if isinstance(instance, list):
+        if len(instance) < schema.get("minItems", 0):
+            errors.append(f"{path}: needs at least {schema['minItems']} items")
+        if "items" in schema:
+            for i, item in enumerate(instance):
+                errors += validate(item, schema["items"], f"{path}[{i}]")
+    return errors
+
+
+def candidate_objects(text):
+    """JSON object texts in a response, most likely first: the whole text, fenced blocks, then the first bare object."""
+    stripped = text.strip()
+    if stripped.startswith("{"):
+        yield stripped
+    for fence in _FENCE_RE.finditer(text):
+        if text.startswith("{", fence.end()):
+            end = first_object(text, fence.end())
+            if end:
+                yield text[fence.end():end]
+    start = text.find("{")
+    if start >= 0:
+        end = first_object(text, start)
+        if end:
+            yield text[start:end]
+
+
+class ActionParser:
+    """
+    Parses and validates model responses against `schema`, counting failures by cause.
+
+    `parse` returns (action, None), with every schema property present (missing ones as None), or
+    (None, error). `parse_plan` does the same for a `PLAN_SCHEMA` reply and returns the list of
+    actions; a reply with a single action is a plan of one. `stats` gives the parse-failure rate.
+    """
+    def __init__(self, schema=ACTION_SCHEMA, required_fields=REQUIRED_FIELDS, plan_schema=PLAN_SCHEMA):
+        self.schema = schema
+        self.plan_schema = plan_schema
+        self.required_fields = required_fields
+        self.parsed = 0
+        self.failed = 0
+        self.errors = Counter()
+
+    def _fail(self, kind, detail):
+        self.failed += 1
+        self.errors[kind] += 1
+        return None, f"{kind}: {detail}"
+
+    def _load(self, text):
+        if text is None:
+            return None, "no response"
+        text = visible_text(text)  # Reasoning models may sketch example objects in <think> blocks
+        last_error = "no JSON object found"
+        for candidate in candidate_objects(text):
+            try:
+                return loads_lenient(candidate), None
+            except json.JSONDecodeError as e:
+                last_error = str(e)
+        return None, last_error
+
+    def _missing_fields(self, action):
+        missing = [name for name in self.required_fields.get(action["action"], ()) if not action.get(name)]
+        return f"'{action['action']}' needs {', '.join(missing)}" if missing else None
+
+    def parse(self, text):
+        data, error = self._load(text)
+        if data is None:
+            return self._fail("invalid_json", error)
+
+        errors = validate(data, self.schema)
+        if errors:
+            return self._fail("schema", "; ".join(errors))
+        missing = self._missing_fields(data)
+        if missing:
+            return self._fail("missing_field", missing)
+
+        self.parsed += 1
+        return {name: data.get(name) for name in self.schema["properties"]}, None
+
+    def parse_plan(self, text):
+        data, error = self._load(text)
+        if data is None:
+            return self._fail("invalid_json", error)
+        if isinstance(data, dict) and "actions" not in data and "action" in data:
+            data = {"actions": [data]}
+
+        errors = validate(data, self.plan_schema)
+        if errors:
+            return self._fail("schema", "; ".join(errors))
+        for action in data["actions"]:
+            missing = self._missing_fields(action)
+            if missing:
+                return self._fail("missing_field", missing)
+
+        self.parsed += 1
+        fields = self.plan_schema["properties"]["actions"]["items"]["properties"]
+        return [{name: action.get(name) for name in fields} for action in data["actions"]], None
+
+    def stats(self):
+        total = self.parsed + self.failed
+        return {
+            "responses": total,
+            "failed": self.failed,
+            "failure_rate": self.failed / total if total else 0.0,
+            "errors": dict(self.errors),
+        }
@@ -0,0 +1,73 @@
+import json
+import re
+
+from helper import loads_lenient, first_object, visible_text
+from action_schema import ACTION_SCHEMA
+
+# The actions the early stop accepts: exactly those ActionParser will validate
+ACTIONS = tuple(ACTION_SCHEMA["properties"]["action"]["enum"])
+
+_FENCE_RE = re.compile(r"```json\s*")
+# natbot's one-line commands. TYPE ends at its closing quote; the others need the line to end,
+# so that "CLICK 1" is not taken while "CLICK 12" is still streaming.
+_NATBOT_RE = re.compile(r'^\s*(TYPESUBMIT \d+ "[^"\n]*"|TYPE \d+ "[^"\n]*"|(?:CLICK \d+|SCROLL UP|SCROLL DOWN)(?=[ \t]*\n))', re.MULTILINE)
+
+
+def is_valid_action(action):
+    """A single action, or a plan whose every action is valid."""
+    if isinstance(action, dict) and isinstance(action.get("actions"), list):
+        return bool(action["actions"]) and all(is_valid_action(item) for item in action["actions"])
+    return isinstance(action, dict) and action.get("action") in ACTIONS
+
+
+class ActionStreamParser:
+    """
+    Watches a model's streamed output and reports the first complete action, so the rest of the
+    generation can be cancelled.
+
+    `formats` are 'json' (the fenced ```json block `helper.extract_json_from_response` expects, or a
+    response that is just the object, complete once it closes and parses as a known action or a
+    plan of them) and/or 'natbot' (a CLICK, TYPE, TYPESUBMIT or SCROLL line). Anything inside
+    `<think>` blocks is ignored.
+    Feed tokens with `feed`; it returns the action (a dict, or the natbot command string) once one
+    is complete, else None.
+    """
+    def __init__(self, formats=("json",)):
+        self.formats = formats
+        self.text = ""
+        self.tokens = 0
+        self.action = None
+
+    def feed(self, token):
+        if self.action is not None:
+            return self.action
+        self.text += token
+        self.tokens += 1
+        visible = visible_text(self.text)
+        if "json" in self.formats:
+            self.action = self._json_action(visible)
+        if self.action is None and "natbot" in self.formats:
+            match = _NATBOT_RE.search(visible)
+            self.action = match.group(1) if match else None
+        return self.action
+
+    def __call__(self, token):
+        return self.feed(token)
+
+    @staticmethod
+    def _json_action(visible):
+        # Schema-constrained output (Ollama `format`) is a bare object; otherwise look for fenced blocks
+        bare = len(visible) - len(visible.lstrip())
+        starts = [bare] if visible.startswith("{", bare) else []
+        starts += [fence.end() for fence in _FENCE_RE.finditer(visible) if visible.startswith("{", fence.end())]
+        for start in starts:
+            end = first_object(visible, start)
+            if end is None:
+                return None
+            try:
+                action = loads_lenient(visible[start:end])
+            except json.JSONDecodeError:
+                continue
+            if is_valid_action(action):
+                return action
+        return None
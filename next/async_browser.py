@@ -0,0 +1,291 @@
+from playwright.async_api import async_playwright
+import asyncio
+import argparse
+from termcolor import colored
+from datetime import datetime
+import os
+
+from browser import render_page_state
+from resource_blocker import ResourceBlocker
+from settle import AsyncSettleDetector
+from navigation import AdaptiveNavigator, ReadinessHistory
+from input_strategy import InputStrategy, KEY_DELAY_MS
+from text_stream import stream_text_blocks_async, CHUNK_BLOCKS, CHUNK_CHARS
+from page_scripts import (
+    INTERACTIVE_SELECTORS, PAGE_STATE_SCRIPT, VIEWPORT_TEXT_SCRIPT, FIELD_INFO_SCRIPT, RESTORE_FIELD_SCRIPT,
+    SCROLL_UP_SCRIPT, SCROLL_DOWN_SCRIPT, SERP_RESULTS_SCRIPT
+)
+from search import SEARCH_ENGINES, DEFAULT_ENGINE, search_url, clean_results
+
+
+async def launch_browser(headless=False):
+    """
+    Starts Playwright and one Firefox process that several `AsyncBrowser`s can share.
+    ------------
+    :return: (playwright, browser). Stop both with `close_browser` when done.
+    """
+    playwright = await async_playwright().start()
+    browser = await playwright.firefox.launch(headless=headless)
+    print(colored("Browser launched successfully.", "cyan"))
+    return playwright, browser
+
+
+async def close_browser(playwright, browser):
+    await browser.close()
+    await playwright.stop()
+    print(colored("Browser closed.", "green"))
+
+
+class AsyncBrowser:
+    """
+    `Browser` counterpart built on `playwright.async_api`.
+
+    Each instance drives one page in its own browser context, so many of them can run
+    concurrently in a single event loop while sharing one Firefox process:
+
+        playwright, browser = await launch_browser(headless=True)
+        tabs = [await AsyncBrowser.create(browser=browser) for _ in range(10)]
+        await asyncio.gather(*(tab.navigate(url) for tab, url in zip(tabs, urls)))
+    """
+    def __init__(self, headless=False, slo_mode=False, verbose=True, browser=None, block_profile=None, block_overrides=None,
+                 navigation_history=None):
+        self.playwright = None
+        self.browser = browser
+        self.context = None
+        self.page = None
+        self.headless = headless
+        self.slo_mode = slo_mode
+        self.verbose = verbose
+        self._owns_browser = browser is None
+        self.blocker = ResourceBlocker(block_profile, block_overrides) if block_profile else None
+        self.settle = None
+        self.navigator = AdaptiveNavigator(navigation_history, verbose=verbose)
+        self.input_strategy = InputStrategy()
+        self.search_engines = SEARCH_ENGINES
+
+        self.downloads_dir = "next/downloads/"
+        if not os.path.exists(self.downloads_dir):
+            os.makedirs(self.downloads_dir)
+
+    @classmethod
+    async def create(cls, headless=False, slo_mode=False, verbose=True, browser=None, block_profile=None, block_overrides=None,
+                     navigation_history=None):
+        """Creates and starts an AsyncBrowser. Pass `browser` to share an already launched Firefox."""
+        instance = cls(headless=headless, slo_mode=slo_mode, verbose=verbose, browser=browser,
+                       block_profile=block_profile, block_overrides=block_overrides, navigation_history=navigation_history)
+        await instance._launch()
+        return instance
+
+    async def _launch(self):
+        """Opens a page in a fresh context, launching Firefox first unless one was shared."""
+        if self._owns_browser:
+            self.playwright, self.browser = await launch_browser(headless=self.headless)
+        self.context = await self.browser.new_context()
+        self.page = await self.context.new_page()
+        if self.blocker:
+            await self.blocker.attach_async(self.page)
+        self.settle = AsyncSettleDetector(self.page, quiet_ms=1000 if self.slo_mode else 300, verbose=self.verbose)
+        await self.settle.install()
+
+    async def wait_for_settle(self, action="action"):
+        """Waits until the page is quiet after an action (see settle.py). Returns the seconds it took."""
+        return await self.settle.wait(action)
+
+    async def navigate(self, url, target_selector=None):
+        """Navigates to a specified URL, returning once the page is ready to act on (see navigation.py)."""
+        try:
+            await self.navigator.goto_async(self.page, url if "://" in url else "https://" + url, target_selector)
+            print(colored((f"Navigated to: {url}"), "cyan"))
+            if self.slo_mode:
+                await self.wait_for_settle("navigate")
+        except Exception as e:
+            print(f"Error navigating to {url}: {e}")
+
+    async def search(self, query, engine=DEFAULT_ENGINE, max_results=10):
+        """Opens the results page for `query` directly and returns its ranked results, see `Browser.search`."""
+        config = self.search_engines[engine]
+        await self.navigate(search_url(query, engine, self.search_engines), target_selector=config["link"])
+        return clean_results(await self.page.evaluate(SERP_RESULTS_SCRIPT, config), max_results)
+
+    async def go_back(self):
+        """Navigates back in the browser history."""
+        await self.page.go_back()
+        print(colored("Navigated back.", "cyan"))
+        await self.wait_for_settle("go_back")
+
+    async def _get_page_state(self):
+        """Same structure as `Browser._get_page_state`, collected in a single `page.evaluate`."""
+        return await self.page.evaluate(PAGE_STATE_SCRIPT, INTERACTIVE_SELECTORS)
+
+    async def get_viewport_text_blocks(self):
+        """
+        Retrieves all text blocks that are strictly in the viewport, by traversing the DOM.
+        ------------
+        :return: A list of strings, where each string is the text content of a block
+                 element that is visible and in the viewport.
+        """
+        blocks = await self.page.evaluate(VIEWPORT_TEXT_SCRIPT)
+
+        if self.verbose:
+            print(colored("=== START of extracted text from page:===", "cyan"))
+            print("\n".join(blocks))
+            print(colored("=== END of extracted text ===", "cyan"))
+
+        return blocks
+
+    async def iter_text_blocks(self, viewport_only=False, chunk_blocks=CHUNK_BLOCKS, chunk_chars=CHUNK_CHARS):
+        """Async generator over the page's text blocks in DOM order (see `Browser.iter_text_blocks`)."""
+        async for block in stream_text_blocks_async(self.page, viewport_only, chunk_blocks, chunk_chars):
+            yield block
+
+    async def crawl(self):
+        """
+        Crawl the current page and extract interactive elements and links.
+        Only elements strictly visible within the current viewport are included.
+        """
+        if self.verbose:
+            print(colored("Fetching Page state", "cyan"))
+        result = render_page_state(await self._get_page_state())
+
+        if self.verbose:
+            print(colored("\n=== PAGE CRAWL RESULTS STARTS ===", "green"))
+            print('\n'.join(result))
+            print(colored("\n=== PAGE CRAWL RESULTS ENDS ===\n", 'green'))
+
+        return '\n'.join(result)
+
+    async def element_present(self, element_id):
+        """Whether an element with this ID is on the page and visible."""
+        element = self.page.locator(f"#{element_id}")
+        return await element.count() > 0 and await element.first.is_visible()
+
+    async def click_element(self, element_id):
+        """Click an element by its ID"""
+        element = self.page.locator(f"#{element_id}")
+        if await element.count() == 0:
+            print(f"Element with ID '{element_id}' not found")
+            return False
+
+        if not await element.is_visible():
+            print(f"Element with ID '{element_id}' is not visible")
+            return False
+
+        await element.click()
+        print(colored(f"Clicked element with ID: {element_id}", "cyan"))
+        await self.wait_for_settle("click")
+        return True
+
+    async def enter(self):
+        """Presses the Enter key."""
+        await self.page.keyboard.press("Enter")
+        print(colored(f"Pressed Enter", "cyan"))
+        await self.wait_for_settle("enter")
+
+    async def scroll(self, direction):
+        """Scrolls the page up or down by one viewport height, staying within the viewport."""
+        if direction.lower() == "u" or direction.lower() == "up":
+            direction = "up"
+        else:
+            direction = "down"
+
+        await self.page.evaluate(SCROLL_UP_SCRIPT if direction == "up" else SCROLL_DOWN_SCRIPT)
+        print(colored(f"Scrolled {direction}", "cyan"))
+
+    async def type(self, text, mode=None):
+        """Types into the focused field, in bulk or key by key (see `Browser.type`)."""
+        field = await self.page.evaluate(FIELD_INFO_SCRIPT)
+        mode = self.input_strategy.choose(self.page.url, field, mode)
+        fell_back = False
+        if mode == "bulk":
+            await self.page.keyboard.insert_text(text)
+            # The insert worked only if it added the text; one already in the field does not count
+            if (await self.page.evaluate(FIELD_INFO_SCRIPT))["value"].count(text) <= field["value"].count(text):
+                await self.page.evaluate(RESTORE_FIELD_SCRIPT, field["value"])  # Undo any part the field took
+                mode, fell_back = "keys", True
+        if mode == "keys":
+            await self.page.keyboard.type(text, delay=KEY_DELAY_MS)
+        self.input_strategy.record(self.page.url, field, mode, text, fell_back)
+        print(colored(f"Typed text ({mode}): {text[:10]}...", "cyan"))
+        await self.wait_for_settle("type")
+
+    async def fill_input(self, element_id, text, mode=None):
+        """Fill an input element with text by its ID"""
+        element = self.page.locator(f"#{element_id}")
+        if await element.count() == 0:
+            print(f"Element with ID '{element_id}' not found")
+            return False
+
+        if not await element.is_visible():
+            print(f"Element with ID '{element_id}' is not visible")
+            return False
+
+        tag_name = await element.evaluate("el => el.tagName.toLowerCase()")
+        if tag_name not in ['input', 'textarea']:
+            print(f"Element with ID '{element_id}' is not an input field (it's a {tag_name})")
+            return False
+
+        field = await element.evaluate(FIELD_INFO_SCRIPT)
+        mode = self.input_strategy.choose(self.page.url, field, mode)
+        fell_back = False
+        if mode == "bulk":
+            await element.fill(text)
+            await element.dispatch_event("change")
+            if (await element.evaluate(FIELD_INFO_SCRIPT))["value"] != text:
+                mode, fell_back = "keys", True
+        if mode == "keys":
+            await element.fill("")
+            await element.press_sequentially(text, delay=KEY_DELAY_MS)
+        self.input_strategy.record(self.page.url, field, mode, text, fell_back)
+        await self.enter()
+        print(colored(f"Filled element '{element_id}' with text ({mode}): {text}", "cyan"))
+        return True
+
+    async def take_screenshot(self):
+        """Takes a screenshot of the current page."""
+        time_when_ss = datetime.now().strftime("%Y_%m_%d__%H_%M_%S_%f")
+        filename = f"screenshot_{time_when_ss}.png"
+
+        try:
+            await self.page.screenshot(path=self.downloads_dir + filename)
+            print(colored(f"Screenshot saved as: {filename}", "cyan"))
+        except Exception as e:
+            print(f"Error taking screenshot: {e}")
+
+    async def close(self):
+        """Closes this page's context, and the browser too if this instance launched it."""
+        if self.context:
+            await self.context.close()
+            self.context = None
+        if self._owns_browser and self.browser:
+            await close_browser(self.playwright, self.browser)
+            self.browser = None
+
+
+async def main(urls, headless):
+    """Crawls every URL in its own page, all concurrently on one Firefox process."""
+    playwright, browser = await launch_browser(headless=headless)
+    try:
+        history = ReadinessHistory()
+        tabs = await asyncio.gather(*(AsyncBrowser.create(verbose=False, browser=browser, navigation_history=history) for _ in urls))
+
+        async def visit(tab, url):
+            await tab.navigate(url)
+            return await tab.crawl()
+
+        results = await asyncio.gather(*(visit(tab, url) for tab, url in zip(tabs, urls)))
+        for url, result in zip(urls, results):
+            print(colored(f"\n=== {url} ===", "green"))
+            print(result)
+
+        await asyncio.gather(*(tab.close() for tab in tabs))
+    finally:
+        await close_browser(playwright, browser)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl several pages concurrently")
+    parser.add_argument("urls", nargs="*", default=["duckduckgo.com", "en.wikipedia.org", "news.ycombinator.com"])
+    parser.add_argument("--headless", action="store_true", help="Run the browser in headless mode")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.urls, args.headless))
@@ -1,5 +1,9 @@
 import ollama
 from termcolor import colored
+import time
+
+from memory import ConversationMemory
+from llm_cache import cache_key
 
 
 class OllamaClient:
@@ -9,8 +13,21 @@ class OllamaClient:
     The following actions are supported:
     - `chat`: Engage in a conversation with the model.
     - `generate`: Generate text based on a prompt.
+
+    `self.messages` is the full transcript; what is resent on each call is chosen by `self.memory`
+    (system prompt, the last `keep_turns` turns verbatim, older page observations summarized, all
+    within `memory_budget` tokens). Between compactions each request only appends to the previous
+    one, and `keep_alive` keeps the model loaded, so Ollama reuses the cached prefix and only
+    prefills the new turn. `self.call_stats` records each call's prompt size and prefill time.
+
+    Pass a `llm_cache.ResponseCache` as `cache` to answer repeated requests without the model.
+    Pass `stop_when` (e.g. an `action_stream.ActionStreamParser`) to `generate` to cancel the rest
+    of a streamed generation once it returns a truthy value for the text so far;
+    `early_stop_stats` estimates the tokens and seconds that saved. Pass a JSON Schema as `format`
+    to constrain the output to it.
     """
-    def __init__(self, model="llama3.2", stream=True, verbose=True):
+    def __init__(self, model="llama3.2", stream=True, verbose=True, memory_budget=4000, keep_turns=2,
+                 system_prompt="", keep_alive="30m", cache=None):
         print(colored(f"Starting chat with Ollama model: {colored(model, 'yellow')}", "cyan", attrs=["underline"]))
         self.model = model
         self.client = ollama.Client(
@@ -18,42 +35,124 @@ class OllamaClient:
             headers={'x-some-header': 'some-value'}
         )
         self.stream = stream
-        self.system_msg = {"role": "system", "content": ""}
+        self.keep_alive = keep_alive
+        self.cache = cache
+        self.memory = ConversationMemory(token_budget=memory_budget, keep_turns=keep_turns)
+        # Per call: estimated prompt tokens, tokens the server actually evaluated (cached prefix excluded) and prefill time
+        self.call_stats = []
+        self.verbose = verbose
+        self.reset(system_prompt)
+
+    def reset(self, system_prompt=""):
+        """Starts a new conversation with `system_prompt`."""
+        self.system_msg = {"role": "system", "content": system_prompt}
         self.messages = []
-        
         if self.system_msg["content"] != "":
             self.messages.append(self.system_msg)
-            print("System message set to:", self.system_msg["content"])
-        
-        self.verbose = verbose
+            if self.verbose:
+                print("System message set to:", self.system_msg["content"][:80] + "...")
 
-    def send_to_llm(self, prompt):           
+    def send_to_llm(self, prompt, stop_when=None, format=None):           
         self.messages.append({"role": "user", "content": prompt})
+        messages = self.memory.compact(self.messages)
         
         payload = {
             "model": self.model,
-            "messages": self.messages,
+            "messages": messages,
             "stream": self.stream,
+            "keep_alive": self.keep_alive,
             "options": {
                 "temperature": 0.1,
                 "num_predict": 1000,
             }
         }
+        if format is not None:
+            payload["format"] = format  # "json" or a JSON Schema the output must match
+        key = cache_key(payload) if self.cache is not None else None
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            if self.verbose:
+                print(colored("(cached response)", "grey"), cached, end="")
+            if stop_when:
+                stop_when(cached)
+            self.call_stats.append({"estimated": self.memory.prompt_tokens(messages), "prompt_eval_count": None, "prefill_ms": 0.0,
+                                    "eval_tokens": 0, "eval_seconds": 0.0, "stopped_early": False})
+            self.messages.append({"role": "assistant", "content": cached})
+            return
+
         response = self.client.chat(
             **payload
         )
         
         full_response = ""
+        final = None
+        chunks = 0
+        first_chunk_at = None
         if self.stream:
             for chunk in response:
                 full_response += str(chunk.message.content)
+                chunks += 1
+                first_chunk_at = first_chunk_at or time.perf_counter()
                 if self.verbose:
                     print(chunk.message.content, end="")
+                if chunk.done:
+                    final = chunk
+                elif stop_when and stop_when(str(chunk.message.content)):
+                    # Closing the stream drops the connection, which makes the server stop generating
+                    response.close()
+                    break
+        else:
+            full_response = response.message.content
+            final = response
         
+        stopped_early = final is None
+        self.call_stats.append({
+            "estimated": self.memory.prompt_tokens(messages),
+            # The server reports nothing for a cancelled stream
+            "prompt_eval_count": None if stopped_early else final.prompt_eval_count,
+            "prefill_ms": 0.0 if stopped_early else (final.prompt_eval_duration or 0) / 1e6,
+            "eval_tokens": chunks if stopped_early else final.eval_count,
+            "eval_seconds": time.perf_counter() - first_chunk_at if stopped_early else (final.eval_duration or 0) / 1e9,
+            "stopped_early": stopped_early,
+        })
         self.messages.append({"role": "assistant", "content": full_response})
+        if key:
+            self.cache.put(key, full_response)
+
+    def prefill_stats(self):
+        """Prefill over all calls: tokens the server evaluated and milliseconds it took, per call."""
+        calls = [entry for entry in self.call_stats if entry["prompt_eval_count"] is not None]
+        n = max(len(calls), 1)
+        return {
+            "calls": len(calls),
+            "avg_estimated_tokens": sum(entry["estimated"] for entry in calls) / n,
+            "avg_evaluated_tokens": sum(entry["prompt_eval_count"] for entry in calls) / n,
+            "avg_prefill_ms": sum(entry["prefill_ms"] for entry in calls) / n,
+        }
     
-    def generate(self, prompt):
-        self.send_to_llm(prompt)
+    def early_stop_stats(self):
+        """
+        Generated tokens and seconds per call, with and without early stopping. The saving per
+        stopped call is estimated from the calls that ran to the end.
+        """
+        stopped = [entry for entry in self.call_stats if entry.get("stopped_early")]
+        full = [entry for entry in self.call_stats if entry.get("stopped_early") is False and entry["eval_tokens"]]
+        average = lambda entries, field: sum(entry[field] for entry in entries) / len(entries) if entries else 0.0
+        stats = {
+            "stopped_calls": len(stopped),
+            "full_calls": len(full),
+            "avg_tokens_stopped": average(stopped, "eval_tokens"),
+            "avg_tokens_full": average(full, "eval_tokens"),
+            "avg_seconds_stopped": average(stopped, "eval_seconds"),
+            "avg_seconds_full": average(full, "eval_seconds"),
+        }
+        if stopped and full:
+            stats["saved_tokens_per_step"] = stats["avg_tokens_full"] - stats["avg_tokens_stopped"]
+            stats["saved_seconds_per_step"] = stats["avg_seconds_full"] - stats["avg_seconds_stopped"]
+        return stats
+
+    def generate(self, prompt, stop_when=None, format=None):
+        self.send_to_llm(prompt, stop_when, format)
         return self.messages[-1]["content"]
 
 
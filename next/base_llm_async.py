@@ -1,23 +1,36 @@
 import asyncio
 import ollama
 
+from llm_cache import cache_key
+
 class OllamaClient:
     """
     A client for interacting with Ollama AI models asynchronously.
     Features:
-    - Asynchronous streaming: Chat method is implemented as asynchronous and streams content.
+    - Asynchronous streaming: `stream` yields tokens with `async for`; `async_send` collects them.
+      Built on `ollama.AsyncClient`, so a generation never blocks the event loop and concurrent
+      agents overlap.
+    - Cancellation: cancelling the task mid-stream closes the request and drops the unanswered
+      prompt from the history.
+    - Concurrency limit: at most `max_concurrent` generations at once. Pass the same `semaphore` to
+      several clients to share one limit between them.
     - Custom commands:
         /clear - Clears conversation history.
         /help  - Displays help message.
         /exit  - Terminates the chat.
+    - Optional response cache: pass a `llm_cache.ResponseCache` as `cache`.
     """
     
-    def __init__(self, model="llama3.2"):
+    def __init__(self, model="llama3.2", cache=None, host="http://localhost:11434", max_concurrent=4,
+                 semaphore=None, verbose=True):
         self.model = model
-        self.client = ollama.Client(
-            host='http://localhost:11434',
+        self.cache = cache
+        self.verbose = verbose
+        self.client = ollama.AsyncClient(
+            host=host,
             headers={'x-some-header': 'some-value'}
         )
+        self.semaphore = semaphore or asyncio.Semaphore(max_concurrent)
         
         self.default_options = {
             "temperature": 0.1,
@@ -25,38 +38,74 @@ class OllamaClient:
         }
         
         self.messages = []
-        
 
-    async def async_send(self, prompt):
+    async def stream(self, prompt, stop_when=None):
         """
-        Asynchronously handles the chat call with streaming responses.
+        Sends `prompt` as the next user turn and yields the response tokens as they arrive.
+        The full response is added to the history once the stream ends. With `stop_when` (e.g. an
+        `action_stream.ActionStreamParser`), the generation is cancelled after the first token for
+        which it returns a truthy value.
         """
-        # if prompt.startswith("/"):
-        #     if self.process_command(prompt):
-        #         return
-        
-        # else:
-        self.messages.append({"role": "user", "content": prompt})
+        user_msg = {"role": "user", "content": prompt}
+        self.messages.append(user_msg)
             
         payload = {
             "model": self.model,
-            "messages": self.messages,
+            "messages": list(self.messages),
             "stream": True,  
             "options": self.default_options,
         }
         
-        full_response = ""
-
-        response = self.client.chat(**payload)
+        key = cache_key(payload) if self.cache is not None else None
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            if stop_when:
+                stop_when(cached)
+            self.messages.append({"role": "assistant", "content": cached})
+            yield cached
+            return
 
-        # Iterate over the generator    
-        for chunk in response:
-            _chunk = chunk.message.content
-            print(_chunk, end="")
-            full_response += str(_chunk)
+        full_response = ""
+        completed = False
+        try:
+            async with self.semaphore:
+                response = await self.client.chat(**payload)
+                async for chunk in response:
+                    _chunk = str(chunk.message.content)
+                    full_response += _chunk
+                    yield _chunk
+                    if stop_when and not chunk.done and stop_when(_chunk):
+                        # Closing the stream drops the connection, which makes the server stop generating
+                        await response.aclose()
+                        break
+                completed = True
+        finally:
+            # Cancelled, failed or abandoned by the caller: leave no unanswered prompt behind
+            if not completed:
+                self.messages.remove(user_msg)
         
-        # print("\n")
         self.messages.append({"role": "assistant", "content": full_response})
+        if key:
+            self.cache.put(key, full_response)
+
+    async def async_send(self, prompt, stop_when=None):
+        """
+        Sends `prompt` and returns the full response, printing tokens as they stream in.
+        """
+        # if prompt.startswith("/"):
+        #     if self.process_command(prompt):
+        #         return
+        
+        # else:
+        full_response = ""
+        stream = self.stream(prompt, stop_when)
+        try:
+            async for _chunk in stream:
+                if self.verbose:
+                    print(_chunk, end="")
+                full_response += _chunk
+        finally:
+            await stream.aclose()
         return full_response
 
     def process_command(self, command):
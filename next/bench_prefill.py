@@ -0,0 +1,96 @@
+# Per-step prefill benchmark for the agent prompt layout, on sessions recorded by
+# LLMAgent(record_path=...). Needs a running Ollama server.
+#
+#   python bench_prefill.py sessions.jsonl --model llama3.2
+#
+# Each recorded session (consecutive steps with the same task) is replayed three ways:
+#   rebuilt  - the old layout: instructions, task and page state rebuilt inside every user turn
+#   prefix   - LLMAgent's layout: instructions and task once as the system message, then one
+#              append-only turn per page state
+#   context  - /api/generate with the `context` returned by the previous step, so only the new
+#              page state is sent
+# and reports, per step, the prompt tokens the server evaluated (the cached prefix is not
+# evaluated again) and the prefill time it reported (prompt_eval_duration).
+
+import argparse
+import asyncio
+import itertools
+import json
+
+from base_llm import OllamaClient
+from llm import ACTION_INSTRUCTIONS, system_prompt
+from ollama_client import OllamaClient as AsyncOllamaClient, GenerateSession
+from ranker import ElementRanker
+from serializer import PageSerializer
+
+OPTIONS = {"temperature": 0.1, "num_predict": 200}
+
+
+def load_sessions(paths):
+    steps = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            steps += [json.loads(line) for line in f if line.strip()]
+    return [list(group) for _, group in itertools.groupby(steps, key=lambda step: step["task"])]
+
+
+def observations(session, page_token_budget, top_k):
+    ranker, serializer = ElementRanker(), PageSerializer(token_budget=page_token_budget)
+    return [serializer.serialize(step["page_state"], ranker.score_fn(step["task"], step["page_state"]), top_k)
+            for step in session]
+
+
+def step_prompt(n, state):
+    return f"Step {n}. The current browser state is:\n{state}\n\nReply with the JSON for the next action."
+
+
+def rebuilt_prompt(task, state):
+    return f"{ACTION_INSTRUCTIONS}\nYour overall task to complete is: {task}\nThe current browser state is:\n{state}\n"
+
+
+def replay_chat(model, task, states, rebuilt):
+    client = OllamaClient(model=model, verbose=False, memory_budget=10**9)
+    client.reset("" if rebuilt else system_prompt(task))
+    for n, state in enumerate(states, 1):
+        client.generate(rebuilt_prompt(task, state) if rebuilt else step_prompt(n, state))
+    return [(entry["prompt_eval_count"], entry["prefill_ms"]) for entry in client.call_stats]
+
+
+async def replay_context(model, task, states):
+    async with AsyncOllamaClient() as client:
+        session = GenerateSession(client, model, system=system_prompt(task), options=OPTIONS)
+        for n, state in enumerate(states, 1):
+            await session.send(step_prompt(n, state))
+        return [(entry["prompt_eval_count"], entry["prefill_ms"]) for entry in session.stats]
+
+
+def run(paths, model, page_token_budget, top_k):
+    sessions = load_sessions(paths)
+    if not sessions:
+        print("No recorded steps found.")
+        return
+
+    results = {"rebuilt": [], "prefix": [], "context": []}
+    for session in sessions:
+        task, states = session[0]["task"], observations(session, page_token_budget, top_k)
+        results["rebuilt"] += replay_chat(model, task, states, rebuilt=True)
+        results["prefix"] += replay_chat(model, task, states, rebuilt=False)
+        results["context"] += asyncio.run(replay_context(model, task, states))
+
+    print(f"{len(sessions)} sessions, {sum(len(session) for session in sessions)} steps, model={model}")
+    for layout, calls in results.items():
+        calls = [(tokens or 0, ms) for tokens, ms in calls]
+        n = max(len(calls), 1)
+        print(f"  {layout:8s} evaluated tokens per step {sum(t for t, _ in calls) / n:8.1f}"
+              f"   prefill per step {sum(ms for _, ms in calls) / n:8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-step prefill of the agent prompt layouts")
+    parser.add_argument("sessions", nargs="+", help="JSONL files written by LLMAgent(record_path=...)")
+    parser.add_argument("--model", default="llama3.2")
+    parser.add_argument("--page_token_budget", type=int, default=800)
+    parser.add_argument("--top_k", type=int, default=20)
+    args = parser.parse_args()
+
+    run(args.sessions, args.model, args.page_token_budget, args.top_k)
@@ -0,0 +1,106 @@
+# Prompt-size and accuracy benchmark for the element ranker, on sessions recorded by
+# LLMAgent(record_path=...): one JSON line per executed step with the task, the full page state
+# and the action taken.
+#
+#   python bench_ranker.py sessions.jsonl --top_k 20
+#   python bench_ranker.py sessions.jsonl --top_k 20 --model llama3.2   # also replays the prompts
+#
+# Offline it reports prompt tokens (everything vs the top-K) and how often the element or URL the
+# recorded action used survives the cut, for the ranker and for plain page order. With --model each
+# step is asked again with both page renderings and the answers are compared to the recorded action.
+
+import argparse
+import json
+
+from browser import render_page_state
+from serializer import PageSerializer, count_tokens
+from ranker import ElementRanker
+
+
+def load_steps(paths):
+    steps = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            steps += [json.loads(line) for line in f if line.strip()]
+    return [step for step in steps if step["action"] and step["action"].get("action") in ("click", "fill_input", "type", "navigate")]
+
+
+def target_of(action):
+    """('element', id) or ('link', url) the recorded action acted on."""
+    if action["action"] == "navigate":
+        return "link", action.get("value")
+    return "element", action.get("element_id")
+
+
+def kept(entries, target):
+    kind, value = target
+    for entry_kind, item in entries:
+        if kind == "element" and entry_kind == "element" and item["id"] == value:
+            return True
+        if kind == "link" and item.get("href") == value:
+            return True
+    return False
+
+
+def same_action(predicted, recorded, serializer):
+    if not predicted or predicted.get("action") != recorded["action"]:
+        return False
+    if recorded["action"] == "navigate":
+        return serializer.resolve(predicted.get("value")) == recorded.get("value")
+    return predicted.get("element_id") == recorded.get("element_id")
+
+
+def run(paths, top_k, model=None):
+    steps = load_steps(paths)
+    if not steps:
+        print("No recorded click/fill_input/type/navigate steps found.")
+        return
+
+    ranker = ElementRanker()
+    agent = None
+    if model:
+        from llm import LLMAgent
+        agent = LLMAgent("", ollama_model=model, verbose=False)
+
+    full_tokens = ranked_tokens = 0
+    ranker_hits = page_order_hits = 0
+    full_correct = ranked_correct = 0
+    for step in steps:
+        state, action = step["page_state"], step["action"]
+        target = target_of(action)
+
+        full_text = "\n".join(render_page_state(state))
+        serializer = PageSerializer(token_budget=10**9)
+        ranked_text = serializer.serialize(state, ranker.score_fn(step["task"], state), top_k)
+        full_tokens += count_tokens(full_text)
+        ranked_tokens += count_tokens(ranked_text)
+
+        ranked = [(kind, item) for _, kind, item in ranker.rank(step["task"], state)][:top_k]
+        in_page_order = ([("element", item) for item in state["interactive_elements"]] +
+                         [("link", item) for item in state["links"]])[:top_k]
+        ranker_hits += kept(ranked, target)
+        page_order_hits += kept(in_page_order, target)
+
+        if agent:
+            agent.start_task(step["task"])
+            full_correct += same_action(agent.decide_action(full_text), action, serializer)
+            agent.start_task(step["task"])
+            ranked_correct += same_action(agent.decide_action(ranked_text), action, serializer)
+
+    n = len(steps)
+    print(f"{n} recorded steps, top_k={top_k}")
+    print(f"  prompt tokens per step: all elements {full_tokens / n:8.1f}   top-K {ranked_tokens / n:8.1f}"
+          f"   ({100 * (1 - ranked_tokens / max(full_tokens, 1)):.1f}% fewer)")
+    print(f"  recorded target kept:   ranker {100 * ranker_hits / n:5.1f}%   page order {100 * page_order_hits / n:5.1f}%")
+    if agent:
+        print(f"  action accuracy:        all elements {100 * full_correct / n:5.1f}%   top-K {100 * ranked_correct / n:5.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the element ranker on recorded sessions")
+    parser.add_argument("sessions", nargs="+", help="JSONL files written by LLMAgent(record_path=...)")
+    parser.add_argument("--top_k", type=int, default=20)
+    parser.add_argument("--model", help="Ollama model to replay the prompts with (measures action accuracy)")
+    args = parser.parse_args()
+
+    run(args.sessions, args.top_k, args.model)
@@ -1,54 +1,258 @@
 from playwright.sync_api import sync_playwright
-import time
 import argparse
 from termcolor import colored
 from datetime import datetime
 import os
 
+from resource_blocker import ResourceBlocker
+from settle import SettleDetector
+from navigation import AdaptiveNavigator
+from input_strategy import InputStrategy, KEY_DELAY_MS
+from text_stream import stream_text_blocks, CHUNK_BLOCKS, CHUNK_CHARS
+from serializer import PageSerializer, render_element, render_link
+from ranker import ElementRanker
+from page_scripts import (
+    INTERACTIVE_SELECTORS, PAGE_STATE_SCRIPT, REGISTRY_INIT_SCRIPT, REGISTRY_COLLECT_SCRIPT,
+    FULL_SNAPSHOT_SCRIPT, SNAPSHOT_WATCH_SCRIPT, VIEWPORT_TEXT_SCRIPT, FIELD_INFO_SCRIPT, RESTORE_FIELD_SCRIPT,
+    SCROLL_UP_SCRIPT, SCROLL_DOWN_SCRIPT, SERP_RESULTS_SCRIPT
+)
+from search import SEARCH_ENGINES, DEFAULT_ENGINE, search_url, clean_results, result_aliases
+
+def render_page_state(page_state):
+    """Renders a `_get_page_state` result as the text lines `crawl()` returns."""
+    result = []
+    result.append(f"Current Page: {page_state['url']}")
+    result.append(f"Title: {page_state['title']}")
+    result.append(f"\nFound {len(page_state['interactive_elements'])} interactive elements (strictly in viewport):")
+
+    for i, element in enumerate(page_state['interactive_elements'], 1):
+        result.append(f"{i:2d}. {render_element(element)}")
+    result.append(f"\nFound {len(page_state['links'])} links (strictly in viewport):")
+
+    for link in page_state['links']:
+        result.append(f"{link['ID']:2d}. {render_link(link)}")
+    return result
+
+def render_page_delta(delta):
+    """Renders an incremental-crawl delta as +/~/- lines per added, changed and removed entry."""
+    result = []
+    result.append(f"Current Page: {delta['url']}")
+    result.append(f"Title: {delta['title']}")
+
+    if not any(delta[kind][change] for kind in ("elements", "links") for change in ("added", "changed", "removed")):
+        result.append("\nNo changes since last crawl.")
+        return result
+
+    for kind, label, render in (
+        ("elements", "Interactive elements", render_element),
+        ("links", "Links", render_link),
+    ):
+        changes = delta[kind]
+        if not (changes["added"] or changes["changed"] or changes["removed"]):
+            continue
+        result.append(
+            f"\n{label} changed since last crawl (strictly in viewport): "
+            f"{len(changes['added'])} added, {len(changes['changed'])} changed, {len(changes['removed'])} removed"
+        )
+        for _, entry in changes["added"]:
+            result.append(f" + {render(entry)}")
+        for _, entry in changes["changed"]:
+            result.append(f" ~ {render(entry)}")
+        for entry in changes["removed"]:
+            result.append(f" - {render(entry)}")
+    return result
+
+
 class Browser:
-    def __init__(self, headless=False, slo_mode=False, verbose=True):
+    def __init__(self, headless=False, slo_mode=False, verbose=True, single_pass=True, virtual_scroll=False,
+                 context=None, pool=None, block_profile=None, block_overrides=None, navigation_history=None,
+                 input_strategy=None):
         self.playwright = None
         self.browser = None
+        self.context = context  # When given (e.g. by BrowserPool), the page is opened in it instead of a new browser
+        self.pool = pool
         self.page = None
         self.headless = headless
         self.slo_mode = slo_mode
+        self.single_pass = single_pass  # Extract page state with one injected script instead of per-element calls
+        self._registry = {"generation": None, "url": "", "title": "", "elements": {}, "links": {}}
+        
+        # With virtual_scroll, one full-document snapshot is sliced in Python for each scroll step;
+        # the page itself is only scrolled when an action needs it.
+        self.virtual_scroll = virtual_scroll
+        self._snapshot = None
+        self._snapshot_url = None  # URL of the last snapshot, kept when a mutation drops the snapshot itself
+        self._virtual_scroll_pos = (0, 0)
+        self._page_scroll_pos = (0, 0)
+        
+        # Optional request blocking ('text-only', 'no-media', 'no-third-party', 'full'), see resource_blocker.py
+        self.blocker = ResourceBlocker(block_profile, block_overrides) if block_profile else None
+        self.settle = None
+        self.verbose = verbose
+        # Picks the fastest safe readiness wait per domain; share `navigation_history` to pool what it learns
+        self.navigator = AdaptiveNavigator(navigation_history, verbose=verbose)
+        # Bulk vs per-key text input, remembered per domain and field (see input_strategy.py)
+        self.input_strategy = input_strategy if input_strategy is not None else InputStrategy()
+        # Token-budgeted rendering for prompts; remembers the URL aliases it handed out
+        self.serializer = PageSerializer()
+        self.ranker = ElementRanker()
+        self.page_state = None  # Full state of the last crawl, whatever was rendered
+        self.search_engines = SEARCH_ENGINES
+        self.search_results = None  # Ranked results of the last `search`
         
         self.downloads_dir = "next/downloads/"
         if not os.path.exists(self.downloads_dir):
             os.makedirs(self.downloads_dir)
         
         self._launch()
-        self.verbose = verbose
 
     def _launch(self):
-        """Launches a Firefox browser instance."""
+        """Launches a Firefox browser instance, or opens a page in the given context."""
+        if self.context is not None:
+            self.browser = self.context.browser
+            self.page = self.context.new_page()
+            self._setup_page()
+            return
         self.playwright = sync_playwright().start()
         self.browser = self.playwright.firefox.launch(headless=self.headless)
         self.page = self.browser.new_page()
+        self._setup_page()
         print(colored("Browser launched successfully.", "cyan"))
 
-    def navigate(self, url):
-        """Navigates to a specified URL."""
+    def _setup_page(self):
+        """Installs the in-page registry and the hooks that invalidate the full-page snapshot."""
+        self.page.add_init_script(REGISTRY_INIT_SCRIPT)
+        self.page.add_init_script(SNAPSHOT_WATCH_SCRIPT)
+        self.page.expose_function("__foxmindSnapshotStale", self._invalidate_snapshot)
+        self.page.on("framenavigated", lambda frame: frame == self.page.main_frame and self._invalidate_snapshot())
+        if self.blocker:
+            self.blocker.attach(self.page)
+        # slo_mode keeps its slower pace as a longer quiet window rather than fixed sleeps
+        self.settle = SettleDetector(self.page, quiet_ms=1000 if self.slo_mode else 300, verbose=self.verbose)
+
+    def _invalidate_snapshot(self):
+        self._snapshot = None
+
+    def wait_for_settle(self, action="action"):
+        """Waits until the page is quiet after an action (see settle.py). Returns the seconds it took."""
+        return self.settle.wait(action)
+
+    def navigate(self, url, target_selector=None):
+        """
+        Navigates to a specified URL. Returns as soon as the page is ready to act on
+        (or `target_selector` appears), see navigation.py.
+        """
+        self._invalidate_snapshot()
+        self._snapshot_url = None  # Even a reload of the same URL starts at the top
+        url = self.serializer.resolve(url)
         try:
-            self.page.goto(url=url if "://" in url else "https://" + url)
+            self.navigator.goto(self.page, url if "://" in url else "https://" + url, target_selector)
             print(colored((f"Navigated to: {url}"), "cyan"))
             if self.slo_mode:
-                time.sleep(1)
+                self.wait_for_settle("navigate")
         except Exception as e:
             print(f"Error navigating to {url}: {e}")
     
+    def search(self, query, engine=DEFAULT_ENGINE, max_results=10):
+        """
+        Opens the results page for `query` directly (no typing into a search box) and returns its
+        results as [{rank, title, url, snippet}], parsed from the page without a model call.
+        Result URLs can then be opened with `navigate('R1')`, ... (see search.py).
+        """
+        config = self.search_engines[engine]
+        self.navigate(search_url(query, engine, self.search_engines), target_selector=config["link"])
+        self.search_results = clean_results(self.page.evaluate(SERP_RESULTS_SCRIPT, config), max_results)
+        self.serializer.aliases.update(result_aliases(self.search_results))
+        if self.verbose:
+            print(colored(f"{len(self.search_results)} results for '{query}' ({engine})", "cyan"))
+        return self.search_results
+
     def go_back(self):
         """Navigates back in the browser history."""
+        self._invalidate_snapshot()
+        self._snapshot_url = None
         self.page.go_back()
         print(colored("Navigated back.", "cyan"))
-        if self.slo_mode:
-            time.sleep(1)
+        self.wait_for_settle("go_back")
     
     def _get_page_state(self):
         """
         Retrieves the current state of the page, including URL, title,
         and interactive elements/links that are strictly visible within the viewport.
         """
+        if self.virtual_scroll:
+            return self._get_page_state_virtual()
+        if self.single_pass:
+            return self._get_page_state_single_pass()
+        return self._get_page_state_per_element()
+
+    def _take_snapshot(self):
+        """Captures every visible candidate of the document with absolute coordinates."""
+        self._snapshot = self.page.evaluate(FULL_SNAPSHOT_SCRIPT, INTERACTIVE_SELECTORS)
+        self._page_scroll_pos = (self._snapshot['scroll_x'], self._snapshot['scroll_y'])
+        if self._snapshot['url'] != self._snapshot_url:
+            self._virtual_scroll_pos = self._page_scroll_pos  # A new document starts where the page is
+        self._snapshot_url = self._snapshot['url']
+
+    def _get_page_state_virtual(self):
+        """
+        Slices the full-page snapshot at the virtual scroll position. A new snapshot is only taken
+        after navigation or a DOM mutation; scrolling alone never goes back to the page.
+        """
+        if self._snapshot is None or self._snapshot['url'] != self.page.url:
+            self._take_snapshot()
+
+        snapshot = self._snapshot
+        scroll_x, scroll_y = self._virtual_scroll_pos
+        viewport_width = snapshot['viewport_width']
+        viewport_height = snapshot['viewport_height']
+
+        def is_in_viewport(box):
+            x = box['x'] if box['fixed'] else box['x'] - scroll_x
+            y = box['y'] if box['fixed'] else box['y'] - scroll_y
+            return (x < viewport_width and
+                    x + box['width'] > 0 and
+                    y < viewport_height and
+                    y + box['height'] > 0)
+
+        interactive_elements = []
+        seen_ids = set()
+        for entry in snapshot['interactive_elements']:
+            element = entry['element']
+            if element['id'] in seen_ids or not is_in_viewport(entry['box']):
+                continue
+            seen_ids.add(element['id'])
+            interactive_elements.append(element)
+
+        links = []
+        for entry in snapshot['links']:
+            if is_in_viewport(entry['box']):
+                links.append({'ID': len(links) + 1, 'text': entry['link']['text'], 'href': entry['link']['href']})
+
+        return {
+            'url': snapshot['url'],
+            'title': snapshot['title'],
+            'interactive_elements': interactive_elements,
+            'links': links
+        }
+
+    def _sync_scroll(self):
+        """Scrolls the real page to the virtual scroll position before an action that needs it."""
+        if not self.virtual_scroll or self._snapshot is None:
+            return
+        if self._virtual_scroll_pos != self._page_scroll_pos:
+            self.page.evaluate("([x, y]) => window.scrollTo(x, y)", list(self._virtual_scroll_pos))
+            self._page_scroll_pos = self._virtual_scroll_pos
+
+    def _get_page_state_single_pass(self):
+        """
+        Same result as `_get_page_state_per_element`, but collected by one injected
+        script in a single `page.evaluate` instead of several round trips per element.
+        """
+        return self.page.evaluate(PAGE_STATE_SCRIPT, INTERACTIVE_SELECTORS)
+
+    def _get_page_state_per_element(self):
+        """Collects the page state element by element through Playwright locators."""
         url = self.page.url
         title = self.page.title()
         
@@ -57,13 +261,6 @@ class Browser:
         viewport_width = viewport_size['width']
         viewport_height = viewport_size['height']
 
-        # Define interactive element selectors
-        interactive_selectors = [
-            'button[id]', 'input[id]', 'select[id]', 'textarea[id]',
-            'a[id]', '[onclick][id]', '[role="button"][id]',
-            'form[id]', '[tabindex][id]'
-        ]
-        
         interactive_elements = []
         seen_ids = set()
         
@@ -81,7 +278,7 @@ class Browser:
                     bbox['y'] + bbox['height'] > 0)
 
         # Find all interactive elements with IDs that are strictly visible AND in the viewport
-        for selector in interactive_selectors:
+        for selector in INTERACTIVE_SELECTORS:
             elements = self.page.locator(selector).all()
             for element in elements:
                 try:
@@ -164,49 +361,8 @@ class Browser:
         :return: A list of strings, where each string is the text content of a block
                  element that is visible and in the viewport.
         """
-        script = """
-        () => {
-            const isVisible = (el) => {
-                const style = window.getComputedStyle(el);
-                return (
-                    style &&
-                    style.display !== 'none' &&
-                    style.visibility !== 'hidden' &&
-                    el.offsetParent !== null
-                );
-            };
-
-            const isInViewport = (el) => {
-                const rect = el.getBoundingClientRect();
-                return (
-                    rect.top >= 0 &&
-                    rect.top < window.innerHeight &&
-                    rect.bottom > 0
-                );
-            };
-
-            const blockTags = new Set(['P', 'LI', 'H1', 'H2', 'H3', 'H4', 'H5', 'H6']);
-            const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_ELEMENT, null, false);
-            const results = [];
-
-            while (walker.nextNode()) {
-                const el = walker.currentNode;
-
-                if (!blockTags.has(el.tagName)) continue;
-                if (!isVisible(el)) continue;
-                if (!isInViewport(el)) continue;
-
-                const text = el.innerText.trim();
-                if (text.length > 0) {
-                    results.push(text);
-                }
-            }
-
-            return results;
-        }
-        """
-
-        blocks = self.page.evaluate(script)
+        self._sync_scroll()
+        blocks = self.page.evaluate(VIEWPORT_TEXT_SCRIPT)
         
         if self.verbose:
             print(colored("=== START of extracted text from page:===", "cyan"))
@@ -215,29 +371,92 @@ class Browser:
         
         return blocks
 
+    def iter_text_blocks(self, viewport_only=False, chunk_blocks=CHUNK_BLOCKS, chunk_chars=CHUNK_CHARS):
+        """
+        Yields the page's text blocks in DOM order, pulled from the page in bounded chunks.
+        Stop iterating to stop the walk early (see text_stream.py).
+        """
+        if viewport_only:
+            self._sync_scroll()
+        yield from stream_text_blocks(self.page, viewport_only, chunk_blocks, chunk_chars)
+
     
-    def crawl(self):
+    def _get_page_delta(self):
+        """
+        Pulls the changes recorded by the in-page registry since the last call and applies them to
+        the local copy. Returns the delta (with the entries that were removed), or None when the
+        registry is not installed in the current document.
+        """
+        delta = self.page.evaluate(REGISTRY_COLLECT_SCRIPT, self._registry["generation"])
+        if delta is None:
+            return None
+
+        state = self._registry
+        if delta["reset"]:
+            state["elements"] = {}
+            state["links"] = {}
+        state["generation"] = delta["generation"]
+        state["url"] = delta["url"]
+        state["title"] = delta["title"]
+
+        for kind in ("elements", "links"):
+            table = state[kind]
+            changes = delta[kind]
+            changes["removed"] = [table.pop(key) for key in changes["removed"] if key in table]
+            for key, entry in changes["added"] + changes["changed"]:
+                table[key] = entry
+            if changes["order"] is not None:
+                state[kind] = {key: table[key] for key in changes["order"]}
+
+        return delta
+
+    def rebuild_page_state(self):
+        """
+        Rebuilds the full `_get_page_state` result from the registry copy kept by incremental
+        crawls, without a round trip to the page.
+        """
+        state = self._registry
+        return {
+            'url': state["url"],
+            'title': state["title"],
+            'interactive_elements': list(state["elements"].values()),
+            'links': [
+                {'ID': i, 'text': link['text'], 'href': link['href']}
+                for i, link in enumerate(state["links"].values(), 1)
+            ]
+        }
+
+    def crawl(self, incremental=False, token_budget=None, task=None, top_k=None):
         """
         Crawl the current page and extract interactive elements and links.
         Only elements strictly visible within the current viewport are included.
+
+        With `token_budget`, the state is packed into that many (estimated) tokens by
+        `self.serializer`, most useful elements first; `self.serializer.report` says what was dropped.
+        With `task`, "most useful" is the ranker's relevance to the task, and `top_k` caps how many
+        elements and links are rendered. `self.page_state` always keeps the full set.
+
+        With `incremental=True` only the changes since the previous incremental crawl are
+        returned, as recorded by the in-page MutationObserver registry. The first incremental
+        crawl on a document returns the full state; `rebuild_page_state()` gives the full
+        state at any time without another round trip.
         """
-        result = []
-        
         if self.verbose:
             print(colored("Fetching Page state", "cyan"))
-        page_state = self._get_page_state()
-        
-        
-        result.append(f"Current Page: {page_state['url']}")
-        result.append(f"Title: {page_state['title']}")
-        result.append(f"\nFound {len(page_state['interactive_elements'])} interactive elements (strictly in viewport):")
-        
-        for i, element in enumerate(page_state['interactive_elements'], 1):
-            result.append(f"{i:2d}. [{element['tag'].upper()}] ID: {element['id']} | {element['text'][:50]}{'...' if len(element['text']) > 50 else ''}")
-        result.append(f"\nFound {len(page_state['links'])} links (strictly in viewport):")
 
-        for i, link in enumerate(page_state['links'], 1):
-            result.append(f"{link['ID']:2d}. {link['text'][:40]}{'...' if len(link['text']) > 40 else ''} -> {link['href']}")
+        delta = self._get_page_delta() if incremental else None
+        self.page_state = self._get_page_state() if delta is None else self.rebuild_page_state()
+        if delta is not None and not delta["reset"]:
+            result = render_page_delta(delta)
+        elif token_budget is not None or task is not None:
+            if token_budget is not None:
+                self.serializer.token_budget = token_budget
+            score = self.ranker.score_fn(task, self.page_state) if task else None
+            result = self.serializer.serialize(self.page_state, score, top_k).split("\n")
+            if self.verbose:
+                print(colored(f"Serialized page state: {self.serializer.report}", "grey"))
+        else:
+            result = render_page_state(self.page_state)
         
         if self.verbose:
             print(colored("\n=== PAGE CRAWL RESULTS STARTS ===", "green"))
@@ -247,8 +466,14 @@ class Browser:
         
         return '\n'.join(result)
     
+    def element_present(self, element_id):
+        """Whether an element with this ID is on the page and visible."""
+        element = self.page.locator(f"#{element_id}")
+        return element.count() > 0 and element.first.is_visible()
+
     def click_element(self, element_id):
         """Click an element by its ID"""
+        self._sync_scroll()
         element = self.page.locator(f"#{element_id}")
         if element.count() == 0:
             print(f"Element with ID '{element_id}' not found")
@@ -261,15 +486,15 @@ class Browser:
         
         element.click()
         print(colored(f"Clicked element with ID: {element_id}", "cyan"))
+        self.wait_for_settle("click")
         return True
         
     def enter(self):
         """Presses the Enter key."""
+        self._sync_scroll()
         self.page.keyboard.press("Enter")
         print(colored(f"Pressed Enter", "cyan"))
-        time.sleep(0.5)
-        if self.slo_mode:
-            time.sleep(1.5)
+        self.wait_for_settle("enter")
             
     # def hover(self, element_id):
     #     """Hover over an element by its ID"""
@@ -295,28 +520,49 @@ class Browser:
         else:
             direction = "down"
         
+        if self.virtual_scroll:
+            # Shift the window over the snapshot instead of scrolling the page. A DOM mutation drops
+            # the snapshot; take the next one now, or a real scroll would be undone by `_sync_scroll`
+            if self._snapshot is None or self._snapshot['url'] != self.page.url:
+                self._take_snapshot()
+            snapshot = self._snapshot
+            scroll_x, scroll_y = self._virtual_scroll_pos
+            step = snapshot['viewport_height'] if direction == "down" else -snapshot['viewport_height']
+            max_scroll_y = max(0, snapshot['document_height'] - snapshot['viewport_height'])
+            self._virtual_scroll_pos = (scroll_x, min(max_scroll_y, max(0, scroll_y + step)))
+            print(colored(f"Scrolled {direction} (virtual)", "cyan"))
+            return
+        
         if direction == "up":
-            self.page.evaluate(
-                "(document.scrollingElement || document.body).scrollTop = "
-                "Math.max(0, (document.scrollingElement || document.body).scrollTop - window.innerHeight);"
-            )
+            self.page.evaluate(SCROLL_UP_SCRIPT)
         elif direction == "down":
-            self.page.evaluate(
-                "(document.scrollingElement || document.body).scrollTop = "
-                "Math.min((document.scrollingElement || document.body).scrollHeight - window.innerHeight, "
-                "(document.scrollingElement || document.body).scrollTop + window.innerHeight);"
-            )
+            self.page.evaluate(SCROLL_DOWN_SCRIPT)
         print(colored(f"Scrolled {direction}", "cyan"))
         
-    def type(self, text):
-        self.page.keyboard.type(text, delay=50)
-        print(colored(f"Typed text: {text[:10]}...", "cyan"))
-        time.sleep(0.5)
-        if self.slo_mode:
-            time.sleep(1.5)
-        
-    def fill_input(self, element_id, text):
-        """Fill an input element with text by its ID"""
+    def type(self, text, mode=None):
+        """
+        Types into the focused field. `mode` 'bulk' inserts the text at once, 'keys' presses each key;
+        by default the field's history and hints decide.
+        """
+        self._sync_scroll()
+        field = self.page.evaluate(FIELD_INFO_SCRIPT)
+        mode = self.input_strategy.choose(self.page.url, field, mode)
+        fell_back = False
+        if mode == "bulk":
+            self.page.keyboard.insert_text(text)
+            # The insert worked only if it added the text; one already in the field does not count
+            if self.page.evaluate(FIELD_INFO_SCRIPT)["value"].count(text) <= field["value"].count(text):
+                self.page.evaluate(RESTORE_FIELD_SCRIPT, field["value"])  # Undo any part the field took
+                mode, fell_back = "keys", True  # The field ignored the insert
+        if mode == "keys":
+            self.page.keyboard.type(text, delay=KEY_DELAY_MS)
+        self.input_strategy.record(self.page.url, field, mode, text, fell_back)
+        print(colored(f"Typed text ({mode}): {text[:10]}...", "cyan"))
+        self.wait_for_settle("type")
+        
+    def fill_input(self, element_id, text, mode=None):
+        """Fill an input element with text by its ID. `mode` is 'bulk', 'keys' or None, as in `type`."""
+        self._sync_scroll()
         element = self.page.locator(f"#{element_id}")
         if element.count() == 0:
             print(f"Element with ID '{element_id}' not found")
@@ -334,9 +580,20 @@ class Browser:
             return False
         
         # Clear existing text and fill with new text
-        element.fill(text)
-        _browser.enter()
-        print(colored(f"Filled element '{element_id}' with text: {text}", "cyan"))
+        field = element.evaluate(FIELD_INFO_SCRIPT)
+        mode = self.input_strategy.choose(self.page.url, field, mode)
+        fell_back = False
+        if mode == "bulk":
+            element.fill(text)
+            element.dispatch_event("change")
+            if element.evaluate(FIELD_INFO_SCRIPT)["value"] != text:
+                mode, fell_back = "keys", True
+        if mode == "keys":
+            element.fill("")
+            element.press_sequentially(text, delay=KEY_DELAY_MS)
+        self.input_strategy.record(self.page.url, field, mode, text, fell_back)
+        self.enter()
+        print(colored(f"Filled element '{element_id}' with text ({mode}): {text}", "cyan"))
         return True
 
     def take_screenshot(self):
@@ -345,13 +602,18 @@ class Browser:
         filename = f"screenshot_{time_when_ss}.png"
         
         try:
+            self._sync_scroll()
             self.page.screenshot(path=self.downloads_dir + filename)
             print(colored(f"Screenshot saved as: {filename}", "cyan"))
         except Exception as e:
             print(f"Error taking screenshot: {e}")
 
     def close(self):
-        """Closes the browser instance."""
+        """Closes the browser instance, or hands it back to the pool it came from."""
+        self.navigator.history.save()
+        if self.pool is not None:
+            self.pool.release(self)
+            return
         if self.browser:
             self.browser.close()
             print(colored("Browser closed.", "green"))
@@ -364,10 +626,14 @@ if __name__ == "__main__":
     parser.add_argument("--headless", action="store_true", help="Run the browser in headless mode")
     parser.add_argument("--slo_mo", action="store_true", help="Run the browser in slow motion mode")
     parser.add_argument("--verbose", action="store_true", help="Enable verbose output")
+    parser.add_argument("--per_element", action="store_true", help="Crawl with per-element Playwright calls instead of a single injected script")
+    parser.add_argument("--virtual_scroll", action="store_true", help="Scroll over a full-page snapshot instead of re-crawling the page")
+    parser.add_argument("--block", choices=["text-only", "no-media", "no-third-party", "full"], help="Block page resources the agent does not need")
     args = parser.parse_args()
     
     
-    _browser = Browser(headless=args.headless, slo_mode=args.slo_mo, verbose=args.verbose)
+    _browser = Browser(headless=args.headless, slo_mode=args.slo_mo, verbose=args.verbose,
+                       single_pass=not args.per_element, virtual_scroll=args.virtual_scroll, block_profile=args.block)
     try:
         # _browser.navigate("duckduckgo.com")
         # _browser.fill_input("searchbox_input", "cars")
@@ -390,7 +656,7 @@ if __name__ == "__main__":
         # _browser.get_viewport_text_blocks()
         
         while True:
-            option = input("""Options:\n1. Navigate: (url - default="duckduckgo.com")\n2. crawl\n3. click: (ID)\n4. type: (ID, text)\n5. Scroll: (up/down)\n6. Get Page text content\n7. Go Back\n8. Take screenshot\n0. exit\n==> """)
+            option = input("""Options:\n1. Navigate: (url - default="duckduckgo.com")\n2. crawl (2i: changes since last incremental crawl)\n3. click: (ID)\n4. type: (ID, text)\n5. Scroll: (up/down)\n6. Get Page text content\n7. Go Back\n8. Take screenshot\n0. exit\n==> """)
             
             if option == "1":
                 url = input("Enter the url: ")
@@ -401,6 +667,9 @@ if __name__ == "__main__":
             elif option == "2":
                 _browser.crawl()
                 
+            elif option == "2i":
+                _browser.crawl(incremental=True)
+                
             elif option == "3":
                 element_id = input("Enter the id to click: ")
                 _browser.click_element(element_id)
@@ -425,6 +694,10 @@ if __name__ == "__main__":
                 _browser.take_screenshot()
                 
             elif option == "0":
+                if _browser.blocker:
+                    print(_browser.blocker.stats())
+                print(_browser.settle.stats())
+                print(_browser.input_strategy.stats())
                 _browser.close()
                 break
             else:
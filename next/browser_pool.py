@@ -0,0 +1,192 @@
+from playwright.sync_api import sync_playwright
+from contextlib import contextmanager
+from termcolor import colored
+import time
+import os
+
+from browser import Browser
+from navigation import ReadinessHistory
+from input_strategy import InputStrategy
+
+try:
+    import psutil  # Optional: only needed for the RSS recycling threshold
+except ImportError:
+    psutil = None
+
+
+class _Slot:
+    """One warm Firefox process and the idle contexts it can hand out."""
+    def __init__(self, browser, pids):
+        self.browser = browser
+        self.pids = pids
+        self.uses = 0
+        self.checked_out = 0
+        self.idle_contexts = []
+        self.retiring = False
+
+
+class BrowserPool:
+    """
+    Keeps `size` Firefox processes warm and hands out `Browser`s bound to isolated contexts.
+
+    Returned contexts are reset (storage and cookies cleared, pages closed) and reused. A process is
+    recycled after `max_uses` checkouts, or once its RSS exceeds `max_rss_mb` (needs psutil).
+
+    Usage:
+        pool = BrowserPool(size=2, headless=True)
+        with pool.browser(verbose=False) as browser:
+            browser.navigate("duckduckgo.com")
+        print(pool.metrics())
+        pool.close()
+    """
+    def __init__(self, size=2, headless=False, max_uses=50, max_rss_mb=None):
+        self.size = size
+        self.headless = headless
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        if max_rss_mb is not None and psutil is None:
+            print(colored("psutil is not installed; the RSS recycling threshold is disabled.", "yellow"))
+
+        self.hits = 0
+        self.misses = 0
+        self.recycles = 0
+        self.checkout_times = []
+        # Shared, so every pooled browser learns from the others
+        self.navigation_history = ReadinessHistory()
+        self.input_strategy = InputStrategy()
+
+        self.playwright = sync_playwright().start()
+        self._slots = [self._launch_slot() for _ in range(size)]
+
+    def _child_pids(self):
+        if psutil is None:
+            return set()
+        return {p.pid for p in psutil.Process(os.getpid()).children(recursive=True)}
+
+    def _launch_slot(self):
+        """Launches a Firefox process, remembering its PIDs so its memory can be measured."""
+        before = self._child_pids()
+        browser = self.playwright.firefox.launch(headless=self.headless)
+        print(colored("Pooled browser launched.", "cyan"))
+        return _Slot(browser, self._child_pids() - before)
+
+    def _rss_mb(self, slot):
+        if psutil is None:
+            return 0
+        total = 0
+        for pid in slot.pids:
+            try:
+                total += psutil.Process(pid).memory_info().rss
+            except psutil.Error:
+                continue
+        return total / (1024 * 1024)
+
+    def _needs_recycle(self, slot):
+        if slot.uses >= self.max_uses:
+            return True
+        return self.max_rss_mb is not None and self._rss_mb(slot) > self.max_rss_mb
+
+    def _recycle(self, index):
+        slot = self._slots[index]
+        for context in slot.idle_contexts:
+            context.close()
+        slot.browser.close()
+        self.recycles += 1
+        print(colored(f"Recycled pooled browser after {slot.uses} uses.", "cyan"))
+        self._slots[index] = self._launch_slot()
+
+    def acquire(self, slo_mode=False, verbose=True, **browser_kwargs):
+        """Checks out a `Browser` on a warm context. Return it with `release` (or `Browser.close`)."""
+        start = time.perf_counter()
+
+        # Processes waiting to be recycled only serve checkouts when nothing else is available
+        candidates = [slot for slot in self._slots if not slot.retiring] or self._slots
+        slot = min(candidates, key=lambda s: (not s.idle_contexts, s.checked_out, s.uses))
+
+        if slot.idle_contexts:
+            context = slot.idle_contexts.pop()
+            self.hits += 1
+        else:
+            context = slot.browser.new_context()
+            self.misses += 1
+        slot.uses += 1
+        slot.checked_out += 1
+
+        browser_kwargs.setdefault("navigation_history", self.navigation_history)
+        browser_kwargs.setdefault("input_strategy", self.input_strategy)
+        browser = Browser(slo_mode=slo_mode, verbose=verbose, context=context, pool=self, **browser_kwargs)
+        self.checkout_times.append(time.perf_counter() - start)
+        return browser
+
+    def release(self, browser):
+        """Resets the browser's context and returns it to the pool."""
+        context = browser.context
+        if context is None or browser.pool is not self:
+            return  # Already released
+        browser.pool = browser.context = browser.page = browser.browser = None
+
+        slot = next(s for s in self._slots if s.browser == context.browser)
+        slot.checked_out -= 1
+
+        try:
+            for page in context.pages:
+                page.evaluate("() => { try { localStorage.clear(); sessionStorage.clear(); } catch (e) {} }")
+            context.clear_cookies()
+            context.clear_permissions()
+            for page in context.pages:
+                page.close()
+            # Storage of other origins the task visited cannot be cleared from here; drop such contexts
+            reusable = not context.storage_state()["origins"]
+        except Exception as e:
+            print(f"Error resetting pooled context: {e}")
+            reusable = False
+
+        if reusable and not slot.retiring:
+            slot.idle_contexts.append(context)
+        else:
+            context.close()
+
+        if self._needs_recycle(slot):
+            slot.retiring = True
+        if slot.retiring and slot.checked_out == 0:
+            self._recycle(self._slots.index(slot))
+
+    @contextmanager
+    def browser(self, **kwargs):
+        browser = self.acquire(**kwargs)
+        try:
+            yield browser
+        finally:
+            self.release(browser)
+
+    def metrics(self):
+        """Pool hit/miss counters and checkout latency in seconds."""
+        checkouts = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / checkouts if checkouts else 0.0,
+            "recycles": self.recycles,
+            "checkout_avg": sum(self.checkout_times) / len(self.checkout_times) if self.checkout_times else 0.0,
+            "checkout_max": max(self.checkout_times, default=0.0),
+            "rss_mb": [round(self._rss_mb(slot), 1) for slot in self._slots],
+        }
+
+    def close(self):
+        for slot in self._slots:
+            slot.browser.close()
+        self._slots = []
+        self.playwright.stop()
+        print(colored("Browser pool closed.", "green"))
+
+
+if __name__ == "__main__":
+    pool = BrowserPool(size=2, headless=True, max_uses=5)
+    try:
+        for url in ["duckduckgo.com", "en.wikipedia.org", "duckduckgo.com", "news.ycombinator.com"] * 2:
+            with pool.browser(verbose=False) as _browser:
+                _browser.navigate(url)
+                _browser.crawl()
+        print(pool.metrics())
+    finally:
+        pool.close()
@@ -0,0 +1,129 @@
+# Shows that base_llm_async.OllamaClient generations overlap, against a local stub of Ollama's
+# /api/chat that streams a fixed number of tokens with a delay between them. No model needed.
+#
+#   python demo_async_ollama.py --clients 4 --tokens 10 --delay 0.1
+#
+# Runs N generations concurrently and compares the wall time with N back-to-back generations,
+# then runs them again under a concurrency limit of 2 and finally cancels one mid-stream.
+# Exits non-zero if the generations did not overlap, the limit was not respected, or the
+# cancelled request was left open on the server or in the client history.
+
+from datetime import datetime, timezone
+from termcolor import colored
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from aiohttp import web
+
+from base_llm_async import OllamaClient
+
+
+class StubOllama:
+    """Minimal streaming /api/chat: `tokens` chunks, `delay` seconds apart."""
+    def __init__(self, tokens, delay):
+        self.tokens = tokens
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self.disconnected = 0
+
+    async def chat(self, request):
+        body = await request.json()
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            for i in range(self.tokens):
+                await asyncio.sleep(self.delay)
+                await response.write(json.dumps(self._chunk(body["model"], f"tok{i} ", False)).encode() + b"\n")
+            await response.write(json.dumps(self._chunk(body["model"], "", True)).encode() + b"\n")
+        except ConnectionResetError:
+            self.disconnected += 1  # The client went away mid-stream
+        except asyncio.CancelledError:
+            self.disconnected += 1
+            raise
+        finally:
+            self.active -= 1
+        return response
+
+    @staticmethod
+    def _chunk(model, content, done):
+        chunk = {"model": model, "created_at": datetime.now(timezone.utc).isoformat(),
+                 "message": {"role": "assistant", "content": content}, "done": done}
+        if done:
+            chunk.update(done_reason="stop", prompt_eval_count=1, eval_count=1)
+        return chunk
+
+
+async def start_stub(stub):
+    app = web.Application()
+    app.router.add_post("/api/chat", stub.chat)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    await coro
+    return time.perf_counter() - start
+
+
+async def main(n_clients, tokens, delay):
+    stub = StubOllama(tokens, delay)
+    runner, host = await start_stub(stub)
+    single = tokens * delay
+    ok = True
+    try:
+        clients = [OllamaClient(model="stub", host=host, verbose=False) for _ in range(n_clients)]
+        serial = 0.0
+        for client in clients:
+            serial += await timed(client.async_send("hello"))
+        concurrent = await timed(asyncio.gather(*(client.async_send("hello again") for client in clients)))
+        overlap = stub.max_active == n_clients and concurrent < serial / 2
+        ok &= overlap
+        print(f"{n_clients} generations of ~{single:.2f}s: back-to-back {serial:.2f}s, concurrent {concurrent:.2f}s "
+              f"(max {stub.max_active} streams at once)", colored("overlap" if overlap else "NO OVERLAP", "green" if overlap else "red"))
+
+        stub.max_active = 0
+        shared = asyncio.Semaphore(2)
+        limited_clients = [OllamaClient(model="stub", host=host, verbose=False, semaphore=shared) for _ in range(n_clients)]
+        limited = await timed(asyncio.gather(*(client.async_send("hello") for client in limited_clients)))
+        respected = stub.max_active <= 2
+        ok &= respected
+        print(f"With a shared limit of 2: {limited:.2f}s (max {stub.max_active} streams at once)",
+              colored("limit respected" if respected else "LIMIT EXCEEDED", "green" if respected else "red"))
+
+        client = OllamaClient(model="stub", host=host, verbose=False)
+        task = asyncio.create_task(client.async_send("cancel me"))
+        await asyncio.sleep(single / 3)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await asyncio.sleep(delay * 2)  # Lets the stub notice the closed connection
+        cancelled = stub.active == 0 and stub.disconnected >= 1 and client.messages == []
+        ok &= cancelled
+        print(f"Cancelled mid-stream: server disconnects {stub.disconnected}, open streams {stub.active}, "
+              f"history {len(client.messages)} messages", colored("clean" if cancelled else "LEAKED", "green" if cancelled else "red"))
+    finally:
+        await runner.cleanup()
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrency demo for the async Ollama client against a stub server")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--tokens", type=int, default=10)
+    parser.add_argument("--delay", type=float, default=0.1)
+    args = parser.parse_args()
+
+    sys.exit(0 if asyncio.run(main(args.clients, args.tokens, args.delay)) else 1)
@@ -37,22 +37,67 @@ import json
 #         print("No JSON block found.")
 #     return None
 
+# A JSON string literal, or a bare Python-style literal outside of one
+_LITERAL_RE = re.compile(r'"(?:\\.|[^"\\])*"|\b(None|True|False)\b')
+_JSON_LITERALS = {"None": "null", "True": "true", "False": "false"}
+
+def loads_lenient(json_str):
+    """json.loads that also accepts the Python-style literals models tend to write."""
+    # Replace Python-style literals with valid JSON, leaving string values untouched
+    json_str = _LITERAL_RE.sub(lambda m: _JSON_LITERALS[m.group(1)] if m.group(1) else m.group(0), json_str)
+    return json.loads(json_str)
+
 def extract_json_from_response(text):
     match = re.search(r"```json\s*([\s\S]*?)\s*```", text)
     if match:
         json_str = match.group(1).strip()
 
-        # Replace Python-style literals with valid JSON
-        json_str = json_str.replace("None", "null")
-        json_str = json_str.replace("True", "true")
-        json_str = json_str.replace("False", "false")
-
         try:
-            json_obj = json.loads(json_str)
+            json_obj = loads_lenient(json_str)
             print(type(json_obj))  # Should print <class 'dict'>
             return json_obj
         except json.JSONDecodeError as e:
             print("JSON parse error:", e)
     else:
         print("No JSON block found.")
-    return None
\ No newline at end of file
+    return None
+
+
+_THINK_OPEN, _THINK_CLOSE = "<think>", "</think>"
+
+
+def visible_text(text):
+    """`text` without `<think>` reasoning blocks, cut at one that is still open."""
+    result, position = "", 0
+    while True:
+        start = text.find(_THINK_OPEN, position)
+        if start < 0:
+            return result + text[position:]
+        result += text[position:start]
+        end = text.find(_THINK_CLOSE, start)
+        if end < 0:
+            return result
+        position = end + len(_THINK_CLOSE)
+
+
+def first_object(text, start):
+    """End index of the balanced `{...}` starting at `text[start]`, or None while it is still open."""
+    depth, in_string, escaped = 0, False, False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return None
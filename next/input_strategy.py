@@ -0,0 +1,53 @@
+from collections import Counter
+from urllib.parse import urlparse
+
+from resource_blocker import site_of
+
+# 'bulk' sets the whole text at once (insert_text / fill plus input and change events);
+# 'keys' types it key by key, for fields whose scripts listen to keydown/keyup.
+INPUT_MODES = ("bulk", "keys")
+KEY_DELAY_MS = 50
+
+
+class InputStrategy:
+    """
+    Chooses how text goes into a field, and remembers per (domain, field) where bulk input
+    did not work so later actions on that field type key by key straight away.
+    """
+    def __init__(self):
+        self.memory = {}
+        self.counts = Counter()
+        self.fallbacks = 0
+        self.seconds_saved = 0.0
+
+    @staticmethod
+    def domain_of(url):
+        return site_of(urlparse(url).hostname)
+
+    def choose(self, url, field, requested=None):
+        """`requested` ('bulk'/'keys') wins; then what this field needed before; then the field's own hints."""
+        if requested in INPUT_MODES:
+            return requested
+        remembered = self.memory.get((self.domain_of(url), field["key"]))
+        if remembered:
+            return remembered
+        return "keys" if field["needs_keys"] else "bulk"
+
+    def record(self, url, field, mode, text, fell_back=False):
+        """Counts one input. Per-key decisions are remembered for the field."""
+        self.counts[mode] += 1
+        if fell_back:
+            self.fallbacks += 1
+        if mode == "keys" and field["key"]:
+            self.memory[(self.domain_of(url), field["key"])] = "keys"
+        if mode == "bulk":
+            self.seconds_saved += len(text) * KEY_DELAY_MS / 1000
+
+    def stats(self):
+        return {
+            "bulk": self.counts["bulk"],
+            "keys": self.counts["keys"],
+            "fallbacks": self.fallbacks,
+            "remembered_fields": len(self.memory),
+            "seconds_saved": round(self.seconds_saved, 2),
+        }
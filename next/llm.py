@@ -1,56 +1,38 @@
 from base_llm import OllamaClient
 from browser import Browser
-from helper import extract_json_from_response
+from action_stream import ActionStreamParser
+from action_schema import PLAN_SCHEMA, ActionParser
+from skills import SkillStore
+from search import DEFAULT_ENGINE, engine_for_url, render_results, result_aliases
 from termcolor import colored
+import json
+import time
 
-class LLMAgent:
-    def __init__(self, task_description: str, ollama_model: str = "llama3.2", verbose=True):
-        self.task_description = task_description
-        self.ollama_model = ollama_model
-        self.task_complete = False
-        self.verbose = verbose
-        
-        self.client = OllamaClient(model=ollama_model)
-        
-    
-    
-        
-    def start_browser(self, headless=False, slo_mode=True, verbose=True, starting_url="https://www.duckduckgo.com"):
-        self.browser = Browser(headless=headless, slo_mode=slo_mode, verbose=verbose)
-        self.browser.navigate(starting_url)
-        
-        self.browsing_actions = {
-            "navigate": self.browser.navigate,
-            "type": self.browser.type,
-            "click": self.browser.click_element,
-            "scroll": self.browser.scroll,
-            "fill_input": self.browser.fill_input,
-            "get text from viewport": self.browser.get_viewport_text_blocks,
-            "done": self.browser.close
-        }
-        
-    def decide_action(self, browser_state: dict) -> dict:
-        print("Deciding action...")
-        
-        llm_res = self.client.generate(f"""
-You are a LLM agent that decides browser actions based on the current state. Your overall task to complete is: {self.task_description}
-The current browser state is:
-{browser_state}
-
-*This is state is similified webpage.*
-Your response MUST be a JSON object with the following structure:
+# Sent once as the system message. Everything before the task is identical across runs, and each
+# step only appends the new page state, so Ollama reuses the cached prefix instead of prefilling
+# these instructions again.
+ACTION_INSTRUCTIONS = """You are a LLM agent that decides browser actions based on the current state.
+Each user message gives the current browser state: a simplified webpage.
+Your response MUST be a JSON object with an ordered list of actions, run one after another:
 ```json
-{{'action': 'navigate' | 'click' | 'fill_input' | 'done',
-    'element_id': 'id',
-    'value': 'locator_value' | 'URL' | 'up/down' |None,
-    'text': 'text_to_type' | None}}
+{'actions': [
+    {'action': 'search' | 'navigate' | 'click' | 'fill_input' | 'done',
+        'element_id': 'id',
+        'value': 'locator_value' | 'URL' | 'up/down' | null,
+        'text': 'text_to_type' | null,
+        'input_mode': 'bulk' | 'keys' | null,
+        'precondition': {'element_present': 'id' | null, 'url_contains': 'text' | null} | null}
+]}
 ```
 
     Note: id for id can be obtained from the browser_state. 
     Also, if you find a search box, you can directly use it using 'fill_input' action. No need to click on it before.
-- If 'action' is 'navigate', 'value' should be the URL.
+- If 'action' is 'search', 'value' should be the search query. It opens the results page directly and you are shown the results as a ranked list (R1, R2, ...). Prefer it to typing into a search box.
+- If 'action' is 'navigate', 'value' should be the URL, or a result such as 'R1'.
 - If 'action' is 'click' or 'type', 'locator' and 'value' are required. 'text' is required for 'type'.
+- 'input_mode' is optional for 'fill_input' and 'type'. Use 'keys' only for fields that react to every keystroke (e.g. autocomplete suggestions); otherwise leave it null.
 - If the task is completed, set 'action' to 'done'.
+- Plan several actions only when the later ones are predictable from the current page, such as searching and then opening the first result. Give every later action a 'precondition' describing the page it expects: if it does not hold, the rest of the list is skipped and you are shown the new page. When unsure, plan a single action.
 
 For eg.,
 If task to is to search 'some research topic to search' using ducduckgo and page contents are:
@@ -66,57 +48,273 @@ Found 3 links (strictly in viewport):
 
 Expected outout:
 ```json
-{{
-  "action": "fill_input",
-  "element_id": "searchbox_input",
-  "value": None,
-  "text": "some research topic to search"
-}}
+{
+  "actions": [
+    {
+      "action": "search",
+      "element_id": null,
+      "value": "some research topic to search",
+      "text": null,
+      "precondition": null
+    },
+    {
+      "action": "navigate",
+      "element_id": null,
+      "value": "R1",
+      "text": null,
+      "precondition": {"element_present": null, "url_contains": "q="}
+    }
+  ]
+}
 ```
+"""
 
-""")    
+
+def system_prompt(task_description):
+    return f"{ACTION_INSTRUCTIONS}\nYour overall task to complete is: {task_description}"
+
+
+class LLMAgent:
+    def __init__(self, task_description: str, ollama_model: str = "llama3.2", verbose=True, page_token_budget=800,
+                 top_k=20, record_path=None, response_cache=None, structured_output=True, skills=None,
+                 search_engine=DEFAULT_ENGINE):
+        self.task_description = task_description
+        self.page_token_budget = page_token_budget  # Prompt tokens for the page state (prefill time on CPU hosts)
+        self.top_k = top_k  # Elements most relevant to the task that reach the prompt
+        self.record_path = record_path  # JSONL of (page state, executed action) steps, for bench_ranker.py
+        self.ollama_model = ollama_model
+        self.task_complete = False
+        self.structured_output = structured_output  # Constrain replies to ACTION_SCHEMA via Ollama's `format`
+        self.action_parser = ActionParser()  # Validates replies and counts parse failures
+        self.search_engine = search_engine  # search.SEARCH_ENGINES entry the 'search' action opens
+        self.search_query = None
+        self.skills = skills  # skills.SkillStore: replays recorded action sequences before asking the model
+        self.verbose = verbose
+        
+        self.client = OllamaClient(model=ollama_model, verbose=verbose, cache=response_cache)  # llm_cache.ResponseCache
+        self.start_task(task_description)
+
+    def start_task(self, task_description: str):
+        """Starts a fresh conversation for `task_description`."""
+        self.task_description = task_description
+        self.task_complete = False
+        self.step = 0
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+        self.precondition_failures = 0
+        self.executed = []  # Actions run for this task, each with the URL it ran on
+        self.client.reset(system_prompt(task_description))
+        
+    def start_browser(self, headless=False, slo_mode=True, verbose=True, starting_url="https://www.duckduckgo.com", pool=None,
+                      search_query=None):
+        """Opens `starting_url`, or with `search_query` that query's results page, so the model starts from the results."""
+        if pool is not None:
+            # Warm context from a BrowserPool; closing the agent hands it back
+            self.browser = pool.acquire(slo_mode=slo_mode, verbose=verbose)
+        else:
+            self.browser = Browser(headless=headless, slo_mode=slo_mode, verbose=verbose)
+        if search_query:
+            self.search(search_query)
+        else:
+            self.browser.navigate(starting_url)
+        
+        self.browsing_actions = {
+            "navigate": self.browser.navigate,
+            "search": self.search,
+            "type": self.browser.type,
+            "click": self.browser.click_element,
+            "scroll": self.browser.scroll,
+            "fill_input": self.browser.fill_input,
+            "get text from viewport": self.browser.get_viewport_text_blocks,
+            "done": self.browser.close
+        }
+        
+    def decide_plan(self, browser_state: str) -> list:
+        """Asks the model for the next actions. Returns the validated list, or None if the reply was unusable."""
+        print("Deciding action...")
+        
+        self.step += 1
+        self.llm_calls += 1
+        # Generation is cancelled as soon as a complete plan has streamed in
+        parser = ActionStreamParser()
+        start = time.perf_counter()
+        llm_res = self.client.generate(f"Step {self.step}. The current browser state is:\n{browser_state}\n\nReply with the JSON for the next actions.",
+                                       stop_when=parser, format=PLAN_SCHEMA if self.structured_output else None)
+        self.llm_seconds += time.perf_counter() - start
         if self.verbose:
             print(colored("LLM Response:", "cyan"), llm_res)
         
-        action = extract_json_from_response(llm_res)
-        return action
+        plan, error = self.action_parser.parse_plan(llm_res)
+        if error:
+            print(colored(f"Could not parse action ({error})", "red"))
+        return plan
+
+    def decide_action(self, browser_state: str) -> dict:
+        """The first action the model plans for `browser_state`."""
+        plan = self.decide_plan(browser_state)
+        return plan[0] if plan else None
     
-    def execute_action(self, action: dict) -> dict:
+    def search(self, query: str):
+        self.search_query = query
+        return self.browser.search(query, self.search_engine)
+
+    def observe(self) -> str:
+        """
+        Crawls the page, keeping the `top_k` elements most relevant to the task within the token budget.
+        On the results page of the last search, the parsed result list is shown instead.
+        """
+        if self.browser.search_results is not None and engine_for_url(self.browser.page.url, self.browser.search_engines):
+            state = f"Current Page: {self.browser.page.url}\n{render_results(self.search_query, self.browser.search_results)}"
+            if self.verbose:
+                print(colored(state, "green"))
+            return state
+        return self.browser.crawl(token_budget=self.page_token_budget, task=self.task_description, top_k=self.top_k)
+
+    def record_step(self, action: dict):
+        """Appends the last crawled page state and the action taken on it to `record_path`."""
+        if not self.record_path or self.browser.page_state is None:
+            return
+        with open(self.record_path, "a", encoding="utf-8") as f:
+            if action.get("action") == "navigate":
+                action = dict(action, value=self.browser.serializer.resolve(action.get("value")))
+            f.write(json.dumps({"task": self.task_description, "page_state": self.browser.page_state, "action": action}) + "\n")
+
+    def execute_action(self, action: dict, record=True) -> bool:
+        """Runs one action. Returns False if the browser could not carry it out."""
         print(colored("Executing action...", color="light_green"))
+        if record:
+            self.record_step(action)
         
-        if action["action"] in ["navigate", "scroll"]:
-            self.browsing_actions[action["action"]](action["value"])
-        elif action["action"] in ["fill_input", "type"]:
-            self.browsing_actions[action["action"]](action["element_id"], action["text"])
+        result = None
+        if action["action"] in ["navigate", "scroll", "search"]:
+            result = self.browsing_actions[action["action"]](action["value"])
+        elif action["action"] == "fill_input":
+            result = self.browsing_actions["fill_input"](action["element_id"], action["text"], action.get("input_mode"))
+        elif action["action"] == "type":
+            # `Browser.type` writes into the focused field, so focus the target first
+            result = self.browser.click_element(action["element_id"])
+            if result is not False:
+                result = self.browsing_actions["type"](action["text"], action.get("input_mode"))
         elif action["action"] == "click":
-            self.browsing_actions[action["action"]](action["element_id"])
+            result = self.browsing_actions[action["action"]](action["element_id"])
         else:
             
             print(colored(f"Unknown action: {action['action']}", "red"))
         
-        return action
+        return result is not False
+
+    def check_precondition(self, precondition) -> str:
+        """Why `precondition` does not hold on the live page, or None if it holds (or there is none)."""
+        if not precondition:
+            return None
+        url_part = precondition.get("url_contains")
+        if url_part and url_part not in self.browser.page.url:
+            return f"URL does not contain '{url_part}'"
+        element_id = precondition.get("element_present")
+        if element_id and not self.browser.element_present(element_id):
+            return f"element '{element_id}' is not present"
+        return None
+
+    def execute_plan(self, plan: list, record=True):
+        """
+        Runs the planned actions in order, without asking the model in between. Stops at the first
+        precondition that does not hold, action that fails, or 'done'.
+        Returns the number of actions run and why the plan stopped early (None if it did not).
+        """
+        for i, action in enumerate(plan):
+            failed = self.check_precondition(action.get("precondition"))
+            if failed:
+                self.precondition_failures += 1
+                print(colored(f"Skipping the rest of the plan at action {i + 1}/{len(plan)}: {failed}", "yellow"))
+                return i, failed
+            url = self.browser.page.url
+            if action["action"] == "done":
+                self.task_complete = True
+                self.executed.append(dict(action, url=url))
+                return i, None
+            recorded = dict(action, url=url)
+            if action["action"] == "navigate":
+                recorded["value"] = self._result_alias(action.get("value"))
+                action = dict(action, value=self.browser.serializer.resolve(action.get("value")))
+            # Only the first action was decided on a freshly crawled page
+            if not self.execute_action(action, record=record and i == 0):
+                return i + 1, "action failed"
+            self.executed.append(recorded)
+        return len(plan), None
+
+    def _result_alias(self, value):
+        """
+        How a navigate to `value` is kept for the skill store: as its 'Rn' alias when it opens a
+        search result (a replay's own search hands the alias out again, for its own results),
+        otherwise as the URL it resolves to.
+        """
+        results = self.browser.search_results if engine_for_url(self.browser.page.url) else None
+        aliases = result_aliases(results or [])
+        name = value.strip().strip("[]") if isinstance(value, str) else value
+        if name in aliases:
+            return name
+        url = self.browser.serializer.resolve(value)
+        return next((alias for alias, result_url in aliases.items() if result_url == url), url)
+
+    def replay_skill(self) -> int:
+        """
+        Replays a recorded skill for the task from the current page, if there is one. Returns the
+        actions run; the task is complete if the whole skill ran, otherwise the model takes over.
+        """
+        if self.skills is None:
+            return 0
+        match = self.skills.match(self.browser.page.url, self.task_description)
+        if match is None:
+            return 0
+        key, plan = match
+        print(colored(f"Replaying skill '{key}' ({len(plan)} actions)", "cyan"))
+        ran, reason = self.execute_plan(plan, record=False)
+        self.skills.report(key, self.task_complete)
+        if not self.task_complete:
+            print(colored(f"Skill stopped after {ran} actions ({reason or 'no done step'}), asking the model", "yellow"))
+        return ran
+
+    def run(self, max_llm_calls=20, confirm=False):
+        """
+        Observes, plans and executes until the task is done or `max_llm_calls` is spent. With
+        `confirm`, every plan is shown for approval first. Returns the LLM calls and actions used.
+        """
+        start_url = self.browser.page.url
+        actions_run = self.replay_skill()
+        while not self.task_complete and self.llm_calls < max_llm_calls:
+            plan = self.decide_plan(self.observe())
+            if not plan:
+                continue
+            if confirm and input(f"Execute plan: {plan}? (y/n) ").lower() != "y":
+                continue
+            ran, _ = self.execute_plan(plan)
+            actions_run += ran
+            if confirm and not self.task_complete and input("Exit? (y/n) ").lower() == "y":
+                break
+        
+        if self.skills is not None and self.task_complete and self.llm_calls:
+            # Only sequences the model had to work out are worth keeping
+            self.skills.record(start_url, self.task_description, self.executed, self.llm_calls, self.llm_seconds)
+            self.skills.save()
+        stats = {"completed": self.task_complete, "llm_calls": self.llm_calls, "actions": actions_run,
+                 "precondition_failures": self.precondition_failures}
+        print(colored(f"LLM calls: {self.llm_calls} for {actions_run} actions (task completed: {self.task_complete})", "grey"))
+        return stats
 
     def close(self):
         print("Exiting browser...")
         self.browser.close()
         
 if __name__ == "__main__":
-    agent = LLMAgent("go to duckduckgo and search for supercars", "deepseek-r1:7b")
+    agent = LLMAgent("go to duckduckgo and search for supercars", "deepseek-r1:7b", skills=SkillStore("skills.json"))
     
     agent.start_browser(headless=False, slo_mode=True, verbose=True, starting_url="https://www.duckduckgo.com")
     
-    while not agent.task_complete:
-        browser_state = agent.browser.crawl()
-        action = agent.decide_action(browser_state)
-        confirm_action = input(f"Execute action: {action}? (y/n) ")
-        if confirm_action.lower() == "y":
-            agent.execute_action(action)
-            exit = input("Exit? (y/n) ")
-            if exit.lower() == "y":
-                action["action"] = "done"
-                
-        
-        if action["action"] == "done":
-            agent.task_complete = True
+    agent.run(confirm=True)
     
+    print(colored(f"Prefill: {agent.client.prefill_stats()}", "grey"))
+    print(colored(f"Early stop: {agent.client.early_stop_stats()}", "grey"))
+    print(colored(f"Action parsing: {agent.action_parser.stats()}", "grey"))
+    if agent.skills is not None:
+        print(colored(f"Skills: {agent.skills.stats()}", "grey"))
     agent.close()
\ No newline at end of file
@@ -0,0 +1,120 @@
+from collections import OrderedDict
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+import re
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Request fields that change what the model answers; everything else (stream, keep_alive, ...) does not
+_KEY_FIELDS = ("model", "system", "prompt", "messages", "context", "format", "options")
+
+
+def _normalize(text):
+    return _WHITESPACE_RE.sub(" ", text).strip() if isinstance(text, str) else text
+
+
+def cache_key(payload):
+    """Key for an Ollama chat/generate request payload: model, options and whitespace-normalized text."""
+    request = {field: payload[field] for field in _KEY_FIELDS if payload.get(field) is not None}
+    if "messages" in request:
+        request["messages"] = [{"role": m["role"], "content": _normalize(m["content"])} for m in request["messages"]]
+    for field in ("system", "prompt"):
+        if field in request:
+            request[field] = _normalize(request[field])
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Cache of model responses, keyed by `cache_key`.
+
+    Recent entries are kept in an in-memory LRU of `max_entries`; with `path`, every entry is
+    also written to a SQLite file so reruns of the same task start warm. The file keeps at most
+    `max_disk_entries` (least recently used go first). Entries older than `ttl_seconds` are misses.
+    Values are anything JSON-serializable. `stats` reports hits, misses and evictions.
+    """
+    def __init__(self, path=None, max_entries=256, max_disk_entries=5000, ttl_seconds=7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory = OrderedDict()  # key -> (created, value)
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "memory_evictions": 0, "disk_evictions": 0}
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses "
+                             "(key TEXT PRIMARY KEY, value TEXT, created REAL, last_used REAL)")
+            self._db.commit()
+
+    def _expired(self, created):
+        return self.ttl_seconds is not None and time.time() - created > self.ttl_seconds
+
+    def _remember(self, key, created, value):
+        self.memory[key] = (created, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+            self.counters["memory_evictions"] += 1
+
+    def get(self, key):
+        """The cached value for `key`, or None."""
+        with self._lock:
+            if key in self.memory:
+                created, value = self.memory[key]
+                if not self._expired(created):
+                    self.memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return value
+                del self.memory[key]
+                self.counters["expired"] += 1
+            if self._db is not None:
+                row = self._db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row and not self._expired(row[1]):
+                    self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    value = json.loads(row[0])
+                    self._remember(key, row[1], value)
+                    self.counters["disk_hits"] += 1
+                    return value
+                if row:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+                    self.counters["expired"] += 1
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            now = time.time()
+            self._remember(key, now, value)
+            if self._db is None:
+                return
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, json.dumps(value), now, now))
+            overflow = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_disk_entries
+            if overflow > 0:
+                self._db.execute("DELETE FROM responses WHERE key IN "
+                                 "(SELECT key FROM responses ORDER BY last_used LIMIT ?)", (overflow,))
+                self.counters["disk_evictions"] += overflow
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self.memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self):
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+        lookups = hits + self.counters["misses"]
+        return dict(self.counters, hits=hits, hit_rate=hits / lookups if lookups else 0.0, entries=len(self.memory))
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
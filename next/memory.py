@@ -0,0 +1,83 @@
+import re
+
+from serializer import count_tokens
+
+_PAGE_RE = re.compile(r"^Current Page: (\S+)", re.MULTILINE)
+_TITLE_RE = re.compile(r"^Title: (.*)$", re.MULTILINE)
+
+
+def summarize_observation(content):
+    """One-line stand-in for a message that carried a crawled page state, or None if it had none."""
+    page = _PAGE_RE.search(content)
+    if not page:
+        return None
+    title = _TITLE_RE.search(content)
+    return f"[Earlier step on {page.group(1)}{' - ' + title.group(1).strip()[:60] if title else ''}; page state omitted]"
+
+
+class ConversationMemory:
+    """
+    Decides which messages are resent to the model, within `token_budget` (estimated) tokens.
+
+    The system prompt and the last `keep_turns` user/assistant turns are always sent verbatim, and
+    so is the newest user message (the current observation) even with `keep_turns=0`.
+    While the transcript fits the budget it is sent unchanged, so every request extends the
+    previous one and the server can reuse its cached prefix. Only when it overflows are the older
+    messages compacted: user messages that carried a page observation become one-line summaries,
+    and if that is still too long the oldest turns are dropped. Compaction points only move on
+    overflow, so the compacted prefix stays the same between overflows too.
+    The full transcript is never modified.
+    """
+    def __init__(self, token_budget=4000, keep_turns=2):
+        if keep_turns < 0:
+            raise ValueError(f"keep_turns must be 0 or more, got {keep_turns}")
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self._summarized = 0  # Dialogue messages shown in summary form
+        self._dropped = 0     # Dialogue messages not sent at all
+        self._seen = 0
+
+    @staticmethod
+    def _cost(message):
+        return count_tokens(message["content"]) + 4  # Role and template tokens
+
+    @staticmethod
+    def _summarized_form(message):
+        summary = summarize_observation(message["content"]) if message["role"] == "user" else None
+        return {"role": message["role"], "content": summary} if summary else message
+
+    def _build(self, system, dialogue):
+        older = [self._summarized_form(m) for m in dialogue[self._dropped:self._summarized]]
+        return system + older + dialogue[max(self._summarized, self._dropped):]
+
+    def compact(self, messages):
+        """The messages to send for `messages` (the full transcript, oldest first)."""
+        system = [m for m in messages if m["role"] == "system"]
+        dialogue = [m for m in messages if m["role"] != "system"]
+        if len(dialogue) < self._seen:  # The transcript was cleared
+            self._summarized = self._dropped = 0
+        self._seen = len(dialogue)
+
+        result = self._build(system, dialogue)
+        if self.prompt_tokens(result) <= self.token_budget:
+            return result
+
+        # Over budget: summarize everything before the last `keep_turns` turns (each starts with a user message)
+        user_positions = [i for i, m in enumerate(dialogue) if m["role"] == "user"]
+        # The newest user message is the page the model must act on, so even keep_turns=0 keeps it
+        keep = max(self.keep_turns, 1)
+        recent_start = user_positions[-keep] if len(user_positions) >= keep else 0
+        self._summarized = max(self._summarized, recent_start)
+        result = self._build(system, dialogue)
+
+        # Still over: drop the oldest turns, never leaving a reply whose question was dropped first
+        while self.prompt_tokens(result) > self.token_budget and self._dropped < self._summarized:
+            self._dropped += 1
+            while self._dropped < self._summarized and dialogue[self._dropped]["role"] == "assistant":
+                self._dropped += 1
+            result = self._build(system, dialogue)
+        return result
+
+    def prompt_tokens(self, messages):
+        """Estimated prompt tokens of a message list."""
+        return sum(self._cost(m) for m in messages)
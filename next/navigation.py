@@ -0,0 +1,171 @@
+from playwright.sync_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+from urllib.parse import urlparse
+from collections import deque
+from termcolor import colored
+import json
+import time
+import os
+
+from resource_blocker import site_of
+from page_scripts import INTERACTIVE_SELECTORS, READY_SCRIPT
+
+# Fastest first. 'interactive' returns once the DOM is interactive and has something to act on
+# (or the target selector appears); 'load' is Playwright's default wait.
+STRATEGIES = ("interactive", "load")
+
+# A strategy is safe on a domain while at most this share of its recent visits timed out
+MAX_FAILURE_RATE = 0.25
+HISTORY_LENGTH = 20
+# An unsafe 'interactive' is tried again every this many navigations to the domain, in case the site changed
+REPROBE_EVERY = 10
+
+POLL_MS = 50
+
+
+class ReadinessHistory:
+    """
+    Per-domain record of how each navigation strategy fared: recent (seconds, ok) outcomes.
+    Pass `path` to keep the history in a JSON file across runs.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.domains = {}
+        self.since_probe = {}  # domain -> navigations since 'interactive' was last tried there
+        self.probing = set()  # Domains where 'interactive' is being re-tried after it was unsafe
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for domain, strategies in json.load(f).items():
+                    self.domains[domain] = {
+                        name: deque([tuple(outcome) for outcome in outcomes], maxlen=HISTORY_LENGTH)
+                        for name, outcomes in strategies.items()
+                    }
+
+    def record(self, domain, strategy, seconds, ok):
+        outcomes = self.domains.setdefault(domain, {}).setdefault(strategy, deque(maxlen=HISTORY_LENGTH))
+        if strategy == "interactive" and domain in self.probing:
+            self.probing.discard(domain)
+            if ok:
+                outcomes.clear()  # The old misses no longer describe the site
+        outcomes.append((seconds, ok))
+
+    def summary(self, domain):
+        """{strategy: {"visits", "failure_rate", "avg_seconds"}} for the strategies tried on `domain`."""
+        result = {}
+        for strategy, outcomes in self.domains.get(domain, {}).items():
+            ok_times = [seconds for seconds, ok in outcomes if ok]
+            result[strategy] = {
+                "visits": len(outcomes),
+                "failure_rate": 1 - len(ok_times) / len(outcomes) if outcomes else 0.0,
+                "avg_seconds": sum(ok_times) / len(ok_times) if ok_times else None,
+            }
+        return result
+
+    def choose(self, domain):
+        """
+        The fastest strategy that has been safe on `domain`. Untried domains start with 'interactive',
+        and a domain that settled on another strategy tries 'interactive' again every REPROBE_EVERY
+        navigations; if that re-probe succeeds, its earlier misses are forgotten.
+        """
+        summary = self.summary(domain)
+        if "interactive" not in summary:
+            return "interactive"
+        safe = [
+            (stats["avg_seconds"], STRATEGIES.index(strategy), strategy)
+            for strategy, stats in summary.items()
+            if stats["avg_seconds"] is not None and stats["failure_rate"] <= MAX_FAILURE_RATE
+        ]
+        strategy = min(safe)[2] if safe else "load"
+        if strategy == "interactive":
+            self.since_probe.pop(domain, None)
+            return strategy
+        self.since_probe[domain] = self.since_probe.get(domain, 0) + 1
+        if self.since_probe[domain] < REPROBE_EVERY:
+            return strategy
+        self.since_probe[domain] = 0
+        if summary["interactive"]["failure_rate"] > MAX_FAILURE_RATE or summary["interactive"]["avg_seconds"] is None:
+            self.probing.add(domain)
+        return "interactive"
+
+    def save(self):
+        if not self.path:
+            return
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({domain: {name: list(outcomes) for name, outcomes in strategies.items()}
+                       for domain, strategies in self.domains.items()}, f, indent=2)
+
+
+class AdaptiveNavigator:
+    """
+    Navigates with the readiness strategy that has been fastest and safe for the URL's domain.
+
+    With 'interactive', `goto` returns once the DOM is interactive and shows a visible link or
+    interactive element, or once `target_selector` appears. If that does not happen within
+    `ready_timeout_ms` it falls back to waiting for `load`, and the domain remembers the miss.
+    """
+    def __init__(self, history=None, ready_timeout_ms=3000, timeout_ms=30000, verbose=True):
+        self.history = history if history is not None else ReadinessHistory()
+        self.ready_timeout_ms = ready_timeout_ms
+        self.timeout_ms = timeout_ms
+        self.verbose = verbose
+
+    def _finish(self, domain, strategy, start, ready):
+        seconds = time.perf_counter() - start
+        # A fallback's time includes the readiness wait it gave up on, so it only counts as a miss
+        # of 'interactive', never as a 'load' sample
+        self.history.record(domain, strategy, seconds, ready)
+        if self.verbose:
+            note = "" if ready else ", fell back to load"
+            print(colored(f"Page ready in {seconds:.2f}s ({strategy}{note})", "grey"))
+        return {"domain": domain, "strategy": strategy, "seconds": seconds, "fell_back": not ready}
+
+    def goto(self, page, url, target_selector=None):
+        """Navigates a sync Playwright page. Returns the strategy used and how long it took."""
+        domain = site_of(urlparse(url).hostname)
+        strategy = self.history.choose(domain)
+        start = time.perf_counter()
+
+        if strategy == "load":
+            page.goto(url, timeout=self.timeout_ms)
+            return self._finish(domain, strategy, start, True)
+
+        page.goto(url, wait_until="commit", timeout=self.timeout_ms)
+        deadline = start + self.ready_timeout_ms / 1000
+        while True:
+            remaining_ms = (deadline - time.perf_counter()) * 1000
+            try:
+                if remaining_ms <= 0:
+                    raise PlaywrightTimeoutError("Readiness timeout")
+                page.wait_for_function(READY_SCRIPT, arg={"selectors": INTERACTIVE_SELECTORS, "target": target_selector},
+                                       polling=POLL_MS, timeout=remaining_ms)
+                return self._finish(domain, strategy, start, True)
+            except PlaywrightTimeoutError:
+                page.wait_for_load_state("load", timeout=self.timeout_ms)
+                return self._finish(domain, strategy, start, False)
+            except PlaywrightError:
+                continue  # A redirect replaced the document mid-check
+
+    async def goto_async(self, page, url, target_selector=None):
+        """`goto` for an async Playwright page."""
+        domain = site_of(urlparse(url).hostname)
+        strategy = self.history.choose(domain)
+        start = time.perf_counter()
+
+        if strategy == "load":
+            await page.goto(url, timeout=self.timeout_ms)
+            return self._finish(domain, strategy, start, True)
+
+        await page.goto(url, wait_until="commit", timeout=self.timeout_ms)
+        deadline = start + self.ready_timeout_ms / 1000
+        while True:
+            remaining_ms = (deadline - time.perf_counter()) * 1000
+            try:
+                if remaining_ms <= 0:
+                    raise PlaywrightTimeoutError("Readiness timeout")
+                await page.wait_for_function(READY_SCRIPT, arg={"selectors": INTERACTIVE_SELECTORS, "target": target_selector},
+                                             polling=POLL_MS, timeout=remaining_ms)
+                return self._finish(domain, strategy, start, True)
+            except PlaywrightTimeoutError:
+                await page.wait_for_load_state("load", timeout=self.timeout_ms)
+                return self._finish(domain, strategy, start, False)
+            except PlaywrightError:
+                continue
@@ -2,15 +2,59 @@
 
 import aiohttp
 import asyncio
+import codecs
 import json
+import time
+
+from llm_cache import cache_key
+
+class NDJSONDecoder:
+    """
+    Incremental decoder for newline-delimited JSON, as Ollama streams it.
+
+    Network chunks do not respect line (or even UTF-8 character) boundaries, so the unfinished
+    tail of each chunk is carried over to the next one. `feed` returns the objects completed by a
+    chunk; `flush` returns a final object that had no trailing newline.
+    """
+
+    def __init__(self):
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+
+    def feed(self, chunk: bytes) -> list:
+        self._buffer += self._utf8.decode(chunk)
+        *lines, self._buffer = self._buffer.split("\n")
+        return [json.loads(line) for line in lines if line.strip()]
+
+    def flush(self) -> list:
+        line, self._buffer = self._buffer + self._utf8.decode(b"", final=True), ""
+        return [json.loads(line)] if line.strip() else []
+
+
+def _with_throughput(final: dict, first_token_seconds: float = None) -> dict:
+    """Adds `tokens_per_second` (generation only, from the server's counters) and time to first token."""
+    final = dict(final)
+    if final.get("eval_count") and final.get("eval_duration"):
+        final["tokens_per_second"] = final["eval_count"] / (final["eval_duration"] / 1e9)
+    if first_token_seconds is not None:
+        final["first_token_seconds"] = first_token_seconds
+    return final
+
 
 class OllamaClient:
     """
     An asynchronous client for interacting with the Ollama API.
+
+    `generate_stream` and `chat_stream` yield the response chunks as they arrive, so callers can
+    act on the first tokens; the last chunk (`done` is true) carries the final stats. `generate`
+    and `chat` return the whole response at once.
+
+    Pass a `llm_cache.ResponseCache` as `cache` to answer repeated requests without the server.
     """
 
-    def __init__(self, base_url: str = "http://localhost:11434"):
+    def __init__(self, base_url: str = "http://localhost:11434", cache=None):
         self.base_url = base_url
+        self.cache = cache
         self.session = None  # aiohttp ClientSession will be created on first use
 
     async def _get_session(self):
@@ -21,69 +65,154 @@ class OllamaClient:
             self.session = aiohttp.ClientSession()
         return self.session
 
-    async def generate(self, model: str, prompt: str, stream: bool = False) -> dict:
-        """
-        Sends a generate request to the Ollama API.
-
-        Args:
-            model (str): The name of the model to use (e.g., "llama2").
-            prompt (str): The input prompt for the model.
-            stream (bool): Whether to stream the response. Defaults to False.
+    @staticmethod
+    def _payload(model: str, stream: bool, **fields) -> dict:
+        payload = {"model": model, "stream": stream}
+        payload.update({key: value for key, value in fields.items() if value is not None})
+        return payload
 
-        Returns:
-            dict: The JSON response from the Ollama API.
+    async def _stream(self, endpoint: str, payload: dict):
+        """
+        Posts `payload` and yields each decoded chunk of the NDJSON response.
 
         Raises:
             aiohttp.ClientError: If there's an HTTP client error.
             ValueError: If the API returns an error or an unexpected status code.
         """
-        endpoint = f"{self.base_url}/api/generate"
-        payload = {
-            "model": model,
-            "prompt": prompt,
-            "stream": stream,
-        }
-
         session = await self._get_session()
         try:
-            async with session.post(endpoint, json=payload) as response:
-                if response.status == 200:
-                    if stream:
-                        # For streaming, we'd typically process each chunk
-                        # but for simplicity, this example collects all and returns
-                        # This part would need more sophisticated handling for real streaming
-                        full_response_text = ""
-                        async for chunk in response.content.iter_any():
-                            try:
-                                # Each chunk might be a partial JSON line
-                                # assuming ndjson format from Ollama for streaming
-                                for line in chunk.decode('utf-8').splitlines():
-                                    if line.strip():
-                                        data = json.loads(line)
-                                        if "response" in data:
-                                            full_response_text += data["response"]
-                                        if data.get("done"):
-                                            return {"response": full_response_text, "done": True}
-                            except json.JSONDecodeError:
-                                print(f"Warning: Could not decode JSON chunk: {line}")
-                        return {"response": full_response_text, "done": True}
-                    else:
-                        return await response.json()
-                else:
+            async with session.post(f"{self.base_url}{endpoint}", json=payload) as response:
+                if response.status != 200:
                     error_detail = await response.text()
                     raise ValueError(
                         f"Ollama API request failed with status {response.status}: {error_detail}"
                     )
+                decoder = NDJSONDecoder()
+                async for chunk in response.content.iter_any():
+                    for data in decoder.feed(chunk):
+                        if "error" in data:
+                            raise ValueError(f"Ollama API error: {data['error']}")
+                        yield data
+                for data in decoder.flush():
+                    yield data
         except aiohttp.ClientConnectorError as e:
             raise aiohttp.ClientError(
                 f"Could not connect to Ollama server at {self.base_url}. Is it running? Error: {e}"
             )
-        except aiohttp.ClientError as e:
-            raise aiohttp.ClientError(f"An HTTP client error occurred: {e}")
-        except Exception as e:
-            raise Exception(f"An unexpected error occurred: {e}")
 
-    async def chat(self, model: str, messages: list, stream: bool = False) -> dict:
+    async def _chunks(self, endpoint: str, payload: dict, text):
+        """
+        `_stream`, answered from the cache when possible. A cached response is yielded as a single
+        final chunk; a streamed one is cached once it completes. The final chunk gets throughput stats.
+        """
+        key = cache_key(payload) if self.cache is not None else None
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            yield cached
+            return
+
+        start = time.perf_counter()
+        first_token_seconds = None
+        full_text = ""
+        async for data in self._stream(endpoint, payload):
+            if first_token_seconds is None and text(data):
+                first_token_seconds = time.perf_counter() - start
+            full_text += text(data)
+            if data.get("done"):
+                data = _with_throughput(data, first_token_seconds)
+                if key:
+                    self.cache.put(key, self._with_text(endpoint, data, full_text))
+            yield data
+
+    @staticmethod
+    def _with_text(endpoint: str, final: dict, full_text: str) -> dict:
+        """`final` carrying the whole response text, shaped like a non-streamed response."""
+        if endpoint == "/api/chat":
+            return dict(final, message={"role": "assistant", "content": full_text})
+        return dict(final, response=full_text)
+
+    async def _collect(self, endpoint: str, payload: dict, text) -> dict:
+        full_text = ""
+        async for data in self._chunks(endpoint, payload, text):
+            full_text += text(data)
+            if data.get("done"):
+                return self._with_text(endpoint, data, full_text)
+        raise ValueError("Ollama stream ended without a final chunk")
+
+    @staticmethod
+    def _response_text(data: dict) -> str:
+        return data.get("response", "")
+
+    @staticmethod
+    def _message_text(data: dict) -> str:
+        return data.get("message", {}).get("content", "")
+
+    def generate_stream(self, model: str, prompt: str, system: str = None, context: list = None,
+                        keep_alive: str = None, options: dict = None):
+        """
+        Streams a generate request to the Ollama API.
+
+        Args:
+            Same as `generate`.
+
+        Yields:
+            dict: Each chunk as it arrives; its `response` is the next piece of text. The last
+                chunk has `done` set and the final stats: `eval_count`, `eval_duration`,
+                `prompt_eval_count`, `prompt_eval_duration`, `context`, plus `tokens_per_second`
+                and `first_token_seconds`.
+
+        Example:
+            async for chunk in client.generate_stream("llama3.2", "Hi"):
+                print(chunk["response"], end="")
+        """
+        payload = self._payload(model, True, prompt=prompt, system=system, context=context,
+                                keep_alive=keep_alive, options=options)
+        return self._chunks("/api/generate", payload, self._response_text)
+
+    async def generate(self, model: str, prompt: str, stream: bool = False, system: str = None,
+                       context: list = None, keep_alive: str = None, options: dict = None) -> dict:
+        """
+        Sends a generate request to the Ollama API.
+
+        Args:
+            model (str): The name of the model to use (e.g., "llama2").
+            prompt (str): The input prompt for the model.
+            stream (bool): Whether the server streams the response. It is still returned whole;
+                use `generate_stream` to consume it as it arrives. Defaults to False.
+            system (str): System prompt. Only needed on the first call of a `context` chain.
+            context (list): The `context` returned by the previous call. The server continues from
+                those tokens, so only `prompt` has to be prefilled.
+            keep_alive (str): How long the model stays loaded after the call (e.g. "30m").
+            options (dict): Model options such as temperature or num_predict.
+
+        Returns:
+            dict: The JSON response from the Ollama API, with the full `response` text, `context`
+                and the timing fields.
+
+        Raises:
+            aiohttp.ClientError: If there's an HTTP client error.
+            ValueError: If the API returns an error or an unexpected status code.
+        """
+        payload = self._payload(model, stream, prompt=prompt, system=system, context=context,
+                                keep_alive=keep_alive, options=options)
+        return await self._collect("/api/generate", payload, self._response_text)
+
+    def chat_stream(self, model: str, messages: list, keep_alive: str = None, options: dict = None):
+        """
+        Streams a chat request to the Ollama API.
+
+        Args:
+            Same as `chat`.
+
+        Yields:
+            dict: Each chunk as it arrives; its `message.content` is the next piece of text. The
+                last chunk has `done` set and the final stats, as for `generate_stream`.
+        """
+        payload = self._payload(model, True, messages=messages, keep_alive=keep_alive, options=options)
+        return self._chunks("/api/chat", payload, self._message_text)
+
+    async def chat(self, model: str, messages: list, stream: bool = False, keep_alive: str = None,
+                   options: dict = None) -> dict:
         """
         Sends a chat request to the Ollama API.
 
@@ -92,7 +221,10 @@ class OllamaClient:
             messages (list): A list of message objects for the chat history.
                              Each message should be a dict with "role" and "content".
                              Example: [{"role": "user", "content": "Hello!"}]
-            stream (bool): Whether to stream the response. Defaults to False.
+            stream (bool): Whether the server streams the response. It is still returned whole;
+                use `chat_stream` to consume it as it arrives. Defaults to False.
+            keep_alive (str): How long the model stays loaded after the call (e.g. "30m").
+            options (dict): Model options such as temperature or num_predict.
 
         Returns:
             dict: The JSON response from the Ollama API.
@@ -101,49 +233,8 @@ class OllamaClient:
             aiohttp.ClientError: If there's an HTTP client error.
             ValueError: If the API returns an error or an unexpected status code.
         """
-        endpoint = f"{self.base_url}/api/chat"
-        payload = {
-            "model": model,
-            "messages": messages,
-            "stream": stream,
-        }
-
-        session = await self._get_session()
-        try:
-            async with session.post(endpoint, json=payload) as response:
-                if response.status == 200:
-                    if stream:
-                        # Similar to generate, this would need more robust handling
-                        # for real-time streaming of chat responses.
-                        full_content = ""
-                        async for chunk in response.content.iter_any():
-                            try:
-                                for line in chunk.decode('utf-8').splitlines():
-                                    if line.strip():
-                                        data = json.loads(line)
-                                        if "message" in data and "content" in data["message"]:
-                                            full_content += data["message"]["content"]
-                                        if data.get("done"):
-                                            # Return a structure similar to non-streamed response
-                                            return {"message": {"role": "assistant", "content": full_content}, "done": True}
-                            except json.JSONDecodeError:
-                                print(f"Warning: Could not decode JSON chunk: {line}")
-                        return {"message": {"role": "assistant", "content": full_content}, "done": True}
-                    else:
-                        return await response.json()
-                else:
-                    error_detail = await response.text()
-                    raise ValueError(
-                        f"Ollama chat API request failed with status {response.status}: {error_detail}"
-                    )
-        except aiohttp.ClientConnectorError as e:
-            raise aiohttp.ClientError(
-                f"Could not connect to Ollama server at {self.base_url}. Is it running? Error: {e}"
-            )
-        except aiohttp.ClientError as e:
-            raise aiohttp.ClientError(f"An HTTP client error occurred: {e}")
-        except Exception as e:
-            raise Exception(f"An unexpected error occurred: {e}")
+        payload = self._payload(model, stream, messages=messages, keep_alive=keep_alive, options=options)
+        return await self._collect("/api/chat", payload, self._message_text)
 
     async def close(self):
         """
@@ -163,3 +254,45 @@ class OllamaClient:
         """Ensures the session is closed when exiting the context manager."""
         await self.close()
 
+
+class GenerateSession:
+    """
+    A multi-turn conversation over `/api/generate` that only sends each new turn.
+
+    Every response carries `context`, the token ids of the conversation so far; passing it back
+    lets the server continue from them, so a step only prefills its own prompt instead of the
+    system prompt and all earlier turns. Once the context outgrows `max_context_tokens` the session
+    starts over from the system prompt. `stats` records the evaluated prompt tokens and prefill time
+    of each call.
+    """
+
+    def __init__(self, client: OllamaClient, model: str, system: str = None, keep_alive: str = "30m",
+                 options: dict = None, max_context_tokens: int = 6000):
+        self.client = client
+        self.model = model
+        self.system = system
+        self.keep_alive = keep_alive
+        self.options = options
+        self.max_context_tokens = max_context_tokens
+        self.context = None
+        self.stats = []
+
+    def reset(self):
+        """Forgets the conversation; the next call starts from the system prompt."""
+        self.context = None
+
+    async def send(self, prompt: str) -> str:
+        """Sends `prompt` as the next turn and returns the model's response text."""
+        if self.context and len(self.context) > self.max_context_tokens:
+            self.reset()
+        data = await self.client.generate(
+            # The system prompt is already inside `context` after the first call
+            self.model, prompt, system=self.system if self.context is None else None, context=self.context,
+            keep_alive=self.keep_alive, options=self.options,
+        )
+        self.context = data.get("context")
+        self.stats.append({
+            "prompt_eval_count": data.get("prompt_eval_count"),
+            "prefill_ms": data.get("prompt_eval_duration", 0) / 1e6,
+        })
+        return data.get("response", "")
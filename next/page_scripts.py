@@ -0,0 +1,634 @@
+import json
+
+# JavaScript snippets injected into pages by `Browser`.
+# Kept in one place so the sync and async browsers extract exactly the same state.
+
+INTERACTIVE_SELECTORS = [
+    'button[id]', 'input[id]', 'select[id]', 'textarea[id]',
+    'a[id]', '[onclick][id]', '[role="button"][id]',
+    'form[id]', '[tabindex][id]'
+]
+
+# Shared helpers. Mirrors the checks the per-element Playwright path performs:
+# `is_visible()` (non-empty box, not visibility:hidden) and the viewport intersection test.
+_HELPERS = """
+    const isVisible = (el) => {
+        const style = window.getComputedStyle(el);
+        if (!style || style.visibility === 'hidden') return false;
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0;
+    };
+
+    const inViewport = (rect) => (
+        rect.x < window.innerWidth &&
+        rect.x + rect.width > 0 &&
+        rect.y < window.innerHeight &&
+        rect.y + rect.height > 0
+    );
+
+    const clean = (text, limit) => (text || '').trim().split(/\\s+/).join(' ').slice(0, limit);
+
+    const describe = (el) => {
+        let text = el.textContent || '';
+        if (!text.trim()) {
+            text = el.getAttribute('placeholder') ||
+                   el.getAttribute('value') ||
+                   el.getAttribute('alt') ||
+                   el.getAttribute('title') || '';
+        }
+        return {
+            id: el.getAttribute('id'),
+            tag: el.tagName.toLowerCase(),
+            type: el.getAttribute('type') || '',
+            text: clean(text, 100),
+            href: el.getAttribute('href') || '',
+            className: el.getAttribute('class') || ''
+        };
+    };
+
+    const describeLink = (el) => {
+        const href = el.getAttribute('href');
+        if (!href || !(href.startsWith('http://') || href.startsWith('https://'))) return null;
+        return {text: clean(el.textContent, 40), href: href};
+    };
+"""
+
+# Collects the whole `_get_page_state` payload in a single round trip.
+PAGE_STATE_SCRIPT = """
+(selectors) => {
+""" + _HELPERS + """
+    const interactive = [];
+    const seen = new Set();
+    for (const selector of selectors) {
+        for (const el of document.querySelectorAll(selector)) {
+            const id = el.getAttribute('id');
+            if (!id || seen.has(id)) continue;
+            if (!isVisible(el) || !inViewport(el.getBoundingClientRect())) continue;
+            seen.add(id);
+            interactive.push(describe(el));
+        }
+    }
+
+    const links = [];
+    for (const el of document.querySelectorAll('a[href]')) {
+        if (!isVisible(el) || !inViewport(el.getBoundingClientRect())) continue;
+        const link = describeLink(el);
+        if (!link) continue;
+        links.push({ID: links.length + 1, text: link.text, href: link.href});
+    }
+
+    return {
+        url: location.href,
+        title: document.title,
+        interactive_elements: interactive,
+        links: links
+    };
+}
+"""
+
+# Scroll by one viewport height, clamped to the document.
+SCROLL_UP_SCRIPT = (
+    "(document.scrollingElement || document.body).scrollTop = "
+    "Math.max(0, (document.scrollingElement || document.body).scrollTop - window.innerHeight);"
+)
+SCROLL_DOWN_SCRIPT = (
+    "(document.scrollingElement || document.body).scrollTop = "
+    "Math.min((document.scrollingElement || document.body).scrollHeight - window.innerHeight, "
+    "(document.scrollingElement || document.body).scrollTop + window.innerHeight);"
+)
+
+_TEXT_HELPERS = """
+    const isVisible = (el) => {
+        const style = window.getComputedStyle(el);
+        return (
+            style &&
+            style.display !== 'none' &&
+            style.visibility !== 'hidden'
+        );
+    };
+
+    const isInViewport = (el) => {
+        const rect = el.getBoundingClientRect();
+        return (
+            rect.top >= 0 &&
+            rect.top < window.innerHeight &&
+            rect.bottom > 0
+        );
+    };
+
+    const blockTags = new Set(['P', 'LI', 'H1', 'H2', 'H3', 'H4', 'H5', 'H6']);
+"""
+
+# Text of the block elements (paragraphs, list items, headings) visible in the viewport, in DOM order.
+VIEWPORT_TEXT_SCRIPT = """
+() => {
+""" + _TEXT_HELPERS + """
+    const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_ELEMENT, null, false);
+    const results = [];
+
+    while (walker.nextNode()) {
+        const el = walker.currentNode;
+
+        if (!blockTags.has(el.tagName)) continue;
+        if (!isVisible(el) || el.offsetParent === null) continue;
+        if (!isInViewport(el)) continue;
+
+        const text = el.innerText.trim();
+        if (text.length > 0) {
+            results.push(text);
+        }
+    }
+
+    return results;
+}
+"""
+
+# Streaming text extraction. `OPEN` parks a TreeWalker in the page and returns its id; each `NEXT`
+# resumes it and returns at most `maxBlocks` blocks / about `maxChars` characters, so only what the
+# caller consumes is walked and serialized. Blocks match `VIEWPORT_TEXT_SCRIPT` when `viewportOnly`,
+# and webscraper's whole-page `get_text_blocks` otherwise.
+TEXT_STREAM_OPEN_SCRIPT = """
+(viewportOnly) => {
+    const fm = window.__foxmind = window.__foxmind || {};
+    fm.textStreams = fm.textStreams || {};
+    fm.nextTextStream = (fm.nextTextStream || 0) + 1;
+    fm.textStreams[fm.nextTextStream] = {
+        walker: document.createTreeWalker(document.body, NodeFilter.SHOW_ELEMENT, null, false),
+        viewportOnly: viewportOnly
+    };
+    return fm.nextTextStream;
+}
+"""
+
+TEXT_STREAM_NEXT_SCRIPT = """
+({id, maxBlocks, maxChars}) => {
+""" + _TEXT_HELPERS + """
+    const streams = (window.__foxmind || {}).textStreams || {};
+    const stream = streams[id];
+    if (!stream) return {blocks: [], done: true};  // The document was replaced
+
+    const blocks = [];
+    let chars = 0;
+    while (blocks.length < maxBlocks && chars < maxChars) {
+        if (!stream.walker.nextNode()) {
+            delete streams[id];
+            return {blocks: blocks, done: true};
+        }
+        const el = stream.walker.currentNode;
+
+        if (!blockTags.has(el.tagName)) continue;
+        if (!isVisible(el)) continue;
+        if (stream.viewportOnly && (el.offsetParent === null || !isInViewport(el))) continue;
+
+        const text = el.innerText.trim();
+        if (text.length > 0) {
+            blocks.push(text);
+            chars += text.length;
+        }
+    }
+    return {blocks: blocks, done: false};
+}
+"""
+
+TEXT_STREAM_CLOSE_SCRIPT = """
+(id) => {
+    const streams = (window.__foxmind || {}).textStreams;
+    if (streams) delete streams[id];
+}
+"""
+
+# Installed with `add_init_script`, so it runs in every document before the page's own scripts.
+# Keeps a live registry of the interactive elements/links in the viewport; a MutationObserver marks
+# the elements a mutation may have affected so `collect` only re-describes those. Scrolls and
+# resizes change what is in the viewport without touching the DOM, so they force a rescan. So does
+# a layout shift: content inserted above (a late banner, an image without dimensions) moves
+# elements without mutating them, so after any mutation `collect` re-reads the registered
+# elements' positions in one batch and rescans if one of them moved.
+REGISTRY_INIT_SCRIPT = """
+(() => {
+    if (window.__foxmind && window.__foxmind.registry) return;
+
+    const SELECTORS = """ + json.dumps(INTERACTIVE_SELECTORS) + """;
+    const SELECTOR_ALL = SELECTORS.join(',');
+    const CANDIDATES = 'a[href],' + SELECTOR_ALL;
+""" + _HELPERS + """
+    const fm = window.__foxmind = window.__foxmind || {};
+    const registry = fm.registry = {
+        generation: Math.random().toString(36).slice(2) + Date.now().toString(36),
+        elements: new Map(),        // id -> {el, slot, data}
+        links: new Map(),           // key -> {el, data}
+        elementIds: new WeakMap(),  // el -> id it is registered under
+        linkKeys: new WeakMap(),    // el -> link key
+        nextLinkKey: 1,
+        dirty: new Set(),
+        fullRescan: true,
+        checkRemoved: false,
+        layoutChanged: false
+    };
+    fm.mutationSeq = 0;
+    fm.lastMutation = performance.now();
+
+    const markWithAncestors = (node) => {
+        let el = node.nodeType === 1 ? node : node.parentElement;
+        while (el) {
+            if (el.matches(CANDIDATES)) registry.dirty.add(el);
+            el = el.parentElement;
+        }
+    };
+
+    const markSubtree = (node) => {
+        if (node.nodeType !== 1) return;
+        if (node.matches(CANDIDATES)) registry.dirty.add(node);
+        for (const el of node.querySelectorAll(CANDIDATES)) registry.dirty.add(el);
+    };
+
+    new MutationObserver((records) => {
+        fm.mutationSeq += 1;
+        fm.lastMutation = performance.now();
+        if (fm.onMutation) fm.onMutation();
+        if (registry.fullRescan) return;
+        registry.layoutChanged = true;
+        for (const record of records) {
+            markWithAncestors(record.target);
+            if (record.type === 'childList') {
+                record.addedNodes.forEach(markSubtree);
+                if (record.removedNodes.length) registry.checkRemoved = true;
+            } else if (record.type === 'attributes') {
+                markSubtree(record.target);
+            }
+        }
+    }).observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+
+    const rescan = () => { registry.fullRescan = true; };
+    window.addEventListener('scroll', rescan, {capture: true, passive: true});
+    window.addEventListener('resize', rescan, {passive: true});
+
+    const slotOf = (el) => {
+        if (!el.getAttribute('id')) return -1;
+        for (let i = 0; i < SELECTORS.length; i++) {
+            if (el.matches(SELECTORS[i])) return i;
+        }
+        return -1;
+    };
+
+    const shown = (el) => el.isConnected && isVisible(el) && inViewport(el.getBoundingClientRect());
+
+    const positionOf = (el) => {
+        const rect = el.getBoundingClientRect();
+        return rect.x + ',' + rect.y + ',' + rect.width + ',' + rect.height;
+    };
+
+    // True if a registered element is no longer where it was registered (or nothing is registered)
+    const layoutShifted = () => {
+        if (!registry.elements.size && !registry.links.size) return true;
+        for (const entries of [registry.elements, registry.links]) {
+            for (const entry of entries.values()) {
+                if (entry.el.isConnected && positionOf(entry.el) !== entry.position) return true;
+            }
+        }
+        return false;
+    };
+
+    const byDocumentOrder = (a, b) => {
+        if (a.el === b.el) return 0;
+        return a.el.compareDocumentPosition(b.el) & Node.DOCUMENT_POSITION_FOLLOWING ? -1 : 1;
+    };
+
+    const fullScan = () => {
+        const elements = new Map();
+        for (let slot = 0; slot < SELECTORS.length; slot++) {
+            for (const el of document.querySelectorAll(SELECTORS[slot])) {
+                const id = el.getAttribute('id');
+                if (!id || elements.has(id) || !shown(el)) continue;
+                elements.set(id, {el: el, slot: slot, data: describe(el), position: positionOf(el)});
+            }
+        }
+        const links = new Map();
+        for (const el of document.querySelectorAll('a[href]')) {
+            if (!shown(el)) continue;
+            const data = describeLink(el);
+            if (!data) continue;
+            let key = registry.linkKeys.get(el);
+            if (!key) {
+                key = 'L' + registry.nextLinkKey++;
+                registry.linkKeys.set(el, key);
+            }
+            links.set(key, {el: el, data: data, position: positionOf(el)});
+        }
+        return {elements, links};
+    };
+
+    const diff = (previous, next, out) => {
+        let membershipChanged = false;
+        for (const key of previous.keys()) {
+            if (!next.has(key)) {
+                out.removed.push(key);
+                membershipChanged = true;
+            }
+        }
+        for (const [key, entry] of next) {
+            const old = previous.get(key);
+            if (!old) {
+                out.added.push([key, entry.data]);
+                membershipChanged = true;
+            } else if (JSON.stringify(old.data) !== JSON.stringify(entry.data)) {
+                out.changed.push([key, entry.data]);
+            }
+        }
+        return membershipChanged;
+    };
+
+    fm.collect = (knownGeneration) => {
+        const delta = {
+            generation: registry.generation,
+            url: location.href,
+            title: document.title,
+            reset: knownGeneration !== registry.generation,
+            elements: {added: [], changed: [], removed: [], order: null},
+            links: {added: [], changed: [], removed: [], order: null}
+        };
+        if (delta.reset) {
+            registry.elements = new Map();
+            registry.links = new Map();
+            registry.fullRescan = true;
+        }
+        if (!registry.fullRescan && registry.layoutChanged && layoutShifted()) registry.fullRescan = true;
+
+        let elementsMoved = false;
+        let linksMoved = false;
+
+        if (registry.fullRescan) {
+            const next = fullScan();
+            elementsMoved = diff(registry.elements, next.elements, delta.elements);
+            linksMoved = diff(registry.links, next.links, delta.links);
+            registry.elements = next.elements;
+            registry.links = next.links;
+            next.elements.forEach((entry, id) => registry.elementIds.set(entry.el, id));
+        } else {
+            const removeElement = (id) => {
+                registry.elements.delete(id);
+                delta.elements.removed.push(id);
+                elementsMoved = true;
+            };
+            const removeLink = (key) => {
+                registry.links.delete(key);
+                delta.links.removed.push(key);
+                linksMoved = true;
+            };
+
+            if (registry.checkRemoved) {
+                for (const [id, entry] of registry.elements) if (!entry.el.isConnected) removeElement(id);
+                for (const [key, entry] of registry.links) if (!entry.el.isConnected) removeLink(key);
+            }
+
+            for (const el of registry.dirty) {
+                const visible = shown(el);
+
+                const oldId = registry.elementIds.get(el);
+                const id = el.getAttribute('id');
+                const slot = visible ? slotOf(el) : -1;
+                const oldEntry = oldId ? registry.elements.get(oldId) : null;
+                if (oldEntry && oldEntry.el === el && (oldId !== id || slot < 0)) removeElement(oldId);
+                if (slot >= 0) {
+                    const current = registry.elements.get(id);
+                    if (current && current.el !== el && shown(current.el)) {
+                        // Duplicate id: the first registered element keeps it, as in a full scan.
+                    } else {
+                        const data = describe(el);
+                        if (!current || current.el !== el) {
+                            if (current) removeElement(id);
+                            registry.elements.set(id, {el: el, slot: slot, data: data, position: positionOf(el)});
+                            registry.elementIds.set(el, id);
+                            delta.elements.added.push([id, data]);
+                            elementsMoved = true;
+                        } else {
+                            current.position = positionOf(el);
+                            if (JSON.stringify(current.data) !== JSON.stringify(data)) {
+                                current.data = data;
+                                delta.elements.changed.push([id, data]);
+                            }
+                        }
+                    }
+                }
+
+                if (el.matches('a[href]')) {
+                    const key = registry.linkKeys.get(el);
+                    const data = visible ? describeLink(el) : null;
+                    const current = key ? registry.links.get(key) : null;
+                    if (current && !data) {
+                        removeLink(key);
+                    } else if (data) {
+                        if (!current) {
+                            const newKey = key || 'L' + registry.nextLinkKey++;
+                            registry.linkKeys.set(el, newKey);
+                            registry.links.set(newKey, {el: el, data: data, position: positionOf(el)});
+                            delta.links.added.push([newKey, data]);
+                            linksMoved = true;
+                        } else {
+                            current.position = positionOf(el);
+                            if (JSON.stringify(current.data) !== JSON.stringify(data)) {
+                                current.data = data;
+                                delta.links.changed.push([key, data]);
+                            }
+                        }
+                    }
+                }
+            }
+
+            if (elementsMoved) {
+                const sorted = [...registry.elements.entries()].sort(
+                    (a, b) => (a[1].slot - b[1].slot) || byDocumentOrder(a[1], b[1])
+                );
+                registry.elements = new Map(sorted);
+            }
+            if (linksMoved) {
+                const sorted = [...registry.links.entries()].sort((a, b) => byDocumentOrder(a[1], b[1]));
+                registry.links = new Map(sorted);
+            }
+        }
+
+        if (elementsMoved) delta.elements.order = [...registry.elements.keys()];
+        if (linksMoved) delta.links.order = [...registry.links.keys()];
+
+        registry.dirty.clear();
+        registry.fullRescan = false;
+        registry.checkRemoved = false;
+        registry.layoutChanged = false;
+        return delta;
+    };
+})();
+"""
+
+REGISTRY_COLLECT_SCRIPT = """
+(knownGeneration) => window.__foxmind && window.__foxmind.collect ? window.__foxmind.collect(knownGeneration) : null
+"""
+
+# Every visible candidate in the document with absolute (document) coordinates, so the viewport
+# can be sliced in Python for any scroll position. Elements inside fixed containers keep their
+# viewport coordinates since they do not move when the page scrolls. Sticky ones do move until they
+# stick, so they get document coordinates like the rest.
+FULL_SNAPSHOT_SCRIPT = """
+(selectors) => {
+""" + _HELPERS + """
+    const fixedCache = new Map();
+    const isFixed = (el) => {
+        if (!el || el === document.documentElement) return false;
+        if (fixedCache.has(el)) return fixedCache.get(el);
+        const position = window.getComputedStyle(el).position;
+        const fixed = position === 'fixed' || isFixed(el.parentElement);
+        fixedCache.set(el, fixed);
+        return fixed;
+    };
+
+    const box = (el) => {
+        const rect = el.getBoundingClientRect();
+        const fixed = isFixed(el);
+        return {
+            x: rect.x + (fixed ? 0 : window.scrollX),
+            y: rect.y + (fixed ? 0 : window.scrollY),
+            width: rect.width,
+            height: rect.height,
+            fixed: fixed
+        };
+    };
+
+    const interactive = [];
+    const emitted = new Set();
+    for (const selector of selectors) {
+        for (const el of document.querySelectorAll(selector)) {
+            if (emitted.has(el)) continue;
+            emitted.add(el);
+            if (!el.getAttribute('id') || !isVisible(el)) continue;
+            interactive.push({box: box(el), element: describe(el)});
+        }
+    }
+
+    const links = [];
+    for (const el of document.querySelectorAll('a[href]')) {
+        if (!isVisible(el)) continue;
+        const link = describeLink(el);
+        if (link) links.push({box: box(el), link: link});
+    }
+
+    if (window.__foxmind) window.__foxmind.snapshotStale = false;
+
+    const scroller = document.scrollingElement || document.body;
+    return {
+        url: location.href,
+        title: document.title,
+        scroll_x: window.scrollX,
+        scroll_y: window.scrollY,
+        viewport_width: window.innerWidth,
+        viewport_height: window.innerHeight,
+        document_height: scroller.scrollHeight,
+        interactive_elements: interactive,
+        links: links
+    };
+}
+"""
+
+# Tells Python (through an exposed function) the first time the DOM changes after a snapshot.
+SNAPSHOT_WATCH_SCRIPT = """
+(() => {
+    const fm = window.__foxmind = window.__foxmind || {};
+    fm.snapshotStale = false;
+    fm.onMutation = () => {
+        if (fm.snapshotStale) return;
+        fm.snapshotStale = true;
+        if (window.__foxmindSnapshotStale) window.__foxmindSnapshotStale();
+    };
+})();
+"""
+
+# Keeps `__foxmind.lastMutation` up to date on pages that do not run the registry script.
+MUTATION_CLOCK_SCRIPT = """
+(() => {
+    const fm = window.__foxmind = window.__foxmind || {};
+    if (fm.lastMutation !== undefined) return;
+    fm.lastMutation = performance.now();
+    new MutationObserver(() => { fm.lastMutation = performance.now(); })
+        .observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+})();
+"""
+
+# True once the DOM has not changed for `quietMs` (or when no mutation clock is installed).
+DOM_QUIET_SCRIPT = """
+(quietMs) => {
+    const fm = window.__foxmind;
+    if (!fm || fm.lastMutation === undefined) return true;
+    return performance.now() - fm.lastMutation >= quietMs;
+}
+"""
+
+# Navigation readiness: true once `target` is in the DOM, or once the document is interactive
+# and shows at least one visible link or interactive element.
+READY_SCRIPT = """
+({selectors, target}) => {
+""" + _HELPERS + """
+    if (target) return document.querySelector(target) !== null;
+    if (document.readyState === 'loading') return false;
+    for (const el of document.querySelectorAll('a[href],' + selectors.join(','))) {
+        if (isVisible(el)) return true;
+    }
+    return false;
+}
+"""
+
+# Describes a text field (the given element, or the focused one): a key to remember it by,
+# whether it looks like it needs real key events (autocomplete widgets), and its current value.
+FIELD_INFO_SCRIPT = """
+(el) => {
+    el = el || document.activeElement;
+    if (!el || el === document.body) return {key: null, needs_keys: false, value: ''};
+    const autocomplete = (el.getAttribute('aria-autocomplete') || 'none') !== 'none';
+    const popup = ['listbox', 'true', 'menu', 'grid', 'tree'].includes(el.getAttribute('aria-haspopup') || '');
+    return {
+        key: el.id || el.getAttribute('name') || el.getAttribute('aria-label') || el.tagName.toLowerCase(),
+        needs_keys: el.getAttribute('role') === 'combobox' || autocomplete || popup || el.hasAttribute('list'),
+        value: el.isContentEditable ? el.innerText : (el.value || '')
+    };
+}
+"""
+
+# Puts the focused field's value back to what FIELD_INFO_SCRIPT read before a failed insert, with
+# the caret at the end, so the key-by-key retry does not add to a partly applied insert.
+RESTORE_FIELD_SCRIPT = """
+(value) => {
+    const el = document.activeElement;
+    if (!el || el === document.body) return;
+    if (el.isContentEditable) el.innerText = value;
+    else el.value = value;
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+    if (el.isContentEditable) {
+        const range = document.createRange();
+        range.selectNodeContents(el);
+        range.collapse(false);
+        const selection = window.getSelection();
+        selection.removeAllRanges();
+        selection.addRange(range);
+    } else if (typeof el.setSelectionRange === 'function') {
+        try { el.setSelectionRange(value.length, value.length); } catch (e) {}  // Not every input type has a caret
+    }
+}
+"""
+
+# Results of a search engine's results page, in page order, as {title, url, snippet}. Takes one
+# of search.py's SEARCH_ENGINES entries; without a `result` container, the n-th link is paired
+# with the n-th snippet.
+SERP_RESULTS_SCRIPT = """
+(engine) => {
+    const clean = (el) => el ? (el.textContent || '').trim().split(/\\s+/).join(' ') : '';
+    const pick = (link, snippet) => ({title: clean(link), url: link.href, snippet: clean(snippet)});
+    if (!engine.result) {
+        const snippets = document.querySelectorAll(engine.snippet);
+        return Array.from(document.querySelectorAll(engine.link), (link, i) => pick(link, snippets[i]));
+    }
+    const results = [];
+    for (const container of document.querySelectorAll(engine.result)) {
+        if (engine.skip && container.matches(engine.skip)) continue;
+        const link = container.querySelector(engine.link);
+        if (link) results.push(pick(link, container.querySelector(engine.snippet)));
+    }
+    return results;
+}
+"""
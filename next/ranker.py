@@ -0,0 +1,98 @@
+from urllib.parse import urlparse
+from collections import Counter
+import math
+import re
+
+from serializer import structural_score
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_CAMEL_RE = re.compile(r"(?<=[a-z])(?=[A-Z])")
+_LINE_TAG_RE = re.compile(r"^<(\w+)")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "go", "how", "i", "in", "is", "it",
+    "of", "on", "or", "the", "this", "to", "what", "when", "where", "which", "who", "with", "about",
+}
+
+# Priors for natbot-style element lines ("<input id=3 Search/>"), in `structural_score` units
+LINE_TAG_PRIORS = {"input": 3.0, "textarea": 3.0, "select": 3.0, "button": 2.0, "link": 1.0, "img": 0.5, "text": 0.5}
+
+
+def tokenize(text):
+    """Lower-cased words, with camelCase and snake_case identifiers split into their parts."""
+    text = _CAMEL_RE.sub(" ", text or "")
+    return [word for word in _WORD_RE.findall(text.lower()) if word not in STOPWORDS]
+
+
+def _document(kind, item):
+    """The words BM25 sees for one element or link: its text, attributes and href path."""
+    if kind == "link":
+        return tokenize(f"{item['text']} {urlparse(item['href']).path}")
+    fields = [item.get(key) or "" for key in ("text", "id", "type", "tag", "className")]
+    fields.append(urlparse(item.get("href") or "").path)
+    return tokenize(" ".join(fields))
+
+
+class ElementRanker:
+    """
+    Cheap local relevance ranking of page elements against the task.
+
+    Score = BM25 of the task over each element's text and attributes (document frequencies come
+    from the page's own elements) + `prior_weight` x structural prior (search inputs, buttons,
+    ... see `serializer.structural_score`). Used to keep only the top-K elements in the prompt;
+    the caller keeps the full set for resolving the IDs the model answers with.
+    """
+    def __init__(self, k1=1.2, b=0.75, prior_weight=0.5):
+        self.k1 = k1
+        self.b = b
+        self.prior_weight = prior_weight
+
+    def bm25(self, query, documents):
+        """BM25 score of `query` (a list of words) against each document (a list of words)."""
+        if not documents:
+            return []
+        avg_length = sum(len(doc) for doc in documents) / len(documents) or 1
+        document_frequency = Counter(word for doc in documents for word in set(doc))
+        query_counts = Counter(query)
+        scores = []
+        for doc in documents:
+            term_counts = Counter(doc)
+            score = 0.0
+            for word, query_count in query_counts.items():
+                tf = term_counts.get(word)
+                if not tf:
+                    continue
+                n = document_frequency[word]
+                idf = math.log(1 + (len(documents) - n + 0.5) / (n + 0.5))
+                score += query_count * idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * len(doc) / avg_length))
+            scores.append(score)
+        return scores
+
+    def rank(self, task, page_state):
+        """[(score, kind, item)] for every element and link of `page_state`, best first (ties in page order)."""
+        candidates = [("element", item) for item in page_state["interactive_elements"]]
+        candidates += [("link", item) for item in page_state["links"]]
+        relevance = self.bm25(tokenize(task), [_document(kind, item) for kind, item in candidates])
+        scored = [
+            (bm25 + self.prior_weight * structural_score(kind, item), kind, item)
+            for bm25, (kind, item) in zip(relevance, candidates)
+        ]
+        return sorted(scored, key=lambda entry: -entry[0])
+
+    def score_fn(self, task, page_state):
+        """A `score(kind, item)` for `PageSerializer.serialize`, ranking this page against `task`."""
+        scores = {id(item): score for score, _, item in self.rank(task, page_state)}
+        return lambda kind, item: scores.get(id(item), 0.0)
+
+    def rank_lines(self, task, lines, top_k):
+        """
+        Top-K of natbot-style element lines ('<button id=5>Search</button>'), returned in page order.
+        """
+        priors = []
+        for line in lines:
+            match = _LINE_TAG_RE.match(line)
+            priors.append(LINE_TAG_PRIORS.get(match.group(1) if match else "", 1.0))
+        relevance = self.bm25(tokenize(task), [tokenize(re.sub(r"</?\w+|id=\d+|/?>", " ", line)) for line in lines])
+        order = sorted(range(len(lines)), key=lambda i: -(relevance[i] + self.prior_weight * priors[i]))
+        keep = set(order[:top_k])
+        return [line for i, line in enumerate(lines) if i in keep]
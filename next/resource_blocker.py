@@ -0,0 +1,132 @@
+from collections import Counter
+from urllib.parse import urlparse
+
+# Resource types each profile aborts. Stylesheets are never blocked: the crawlers decide
+# visibility from computed styles, so pages without CSS would report hidden elements.
+BLOCKING_PROFILES = {
+    "full": {"resource_types": set(), "trackers": False, "third_party": False},
+    "no-media": {"resource_types": {"image", "media", "font"}, "trackers": False, "third_party": False},
+    "text-only": {
+        "resource_types": {"image", "media", "font", "texttrack", "eventsource", "manifest", "other"},
+        "trackers": True,
+        "third_party": False,
+    },
+    "no-third-party": {"resource_types": set(), "trackers": True, "third_party": True},
+}
+
+# Ad and analytics hosts (matched on the domain and its subdomains)
+TRACKER_DOMAINS = {
+    "google-analytics.com", "googletagmanager.com", "googletagservices.com", "doubleclick.net",
+    "googlesyndication.com", "googleadservices.com", "adservice.google.com", "facebook.net",
+    "scorecardresearch.com", "hotjar.com", "segment.io", "segment.com", "amazon-adsystem.com",
+    "taboola.com", "outbrain.com", "criteo.com", "criteo.net", "adnxs.com", "quantserve.com",
+    "chartbeat.com", "nr-data.net", "clarity.ms", "bat.bing.com", "ads-twitter.com",
+    "moatads.com", "pubmatic.com", "rubiconproject.com", "adsrvr.org", "casalemedia.com",
+}
+
+# Typical transfer sizes, used to estimate the bytes a blocked request would have cost.
+# The real size is unknown because the request never goes out.
+TYPICAL_BYTES = {
+    "image": 45_000, "media": 500_000, "font": 35_000, "script": 25_000, "stylesheet": 15_000,
+    "document": 30_000, "xhr": 5_000, "fetch": 5_000, "texttrack": 5_000, "manifest": 2_000,
+}
+DEFAULT_BYTES = 5_000
+
+_SECOND_LEVEL = {"co", "com", "org", "net", "gov", "ac", "edu"}
+
+
+def site_of(host):
+    """Registrable part of a host name, e.g. 'news.bbc.co.uk' -> 'bbc.co.uk'."""
+    labels = (host or "").lower().strip(".").split(".")
+    if len(labels) >= 3 and len(labels[-1]) == 2 and labels[-2] in _SECOND_LEVEL:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+def _matches_domain(host, domains):
+    host = (host or "").lower()
+    return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+
+class ResourceBlocker:
+    """
+    Aborts page requests the agent does not need, according to a blocking profile
+    ('text-only', 'no-media', 'no-third-party' or 'full').
+
+    `overrides` maps site domains to the profile used while that site is the page being
+    browsed, e.g. {"youtube.com": "full"}. Main-frame navigations are never blocked.
+    """
+    def __init__(self, profile="text-only", overrides=None):
+        for name in [profile] + list((overrides or {}).values()):
+            if name not in BLOCKING_PROFILES:
+                raise ValueError(f"Unknown blocking profile '{name}'. Choose from: {', '.join(BLOCKING_PROFILES)}")
+        self.profile = profile
+        self.overrides = overrides or {}
+        self.first_party = None
+
+        self.allowed = 0
+        self.blocked = 0
+        self.blocked_by_type = Counter()
+        self.estimated_bytes_saved = 0
+
+    def _profile_for(self, site):
+        for domain, profile in self.overrides.items():
+            if site and _matches_domain(site, [domain]):
+                return BLOCKING_PROFILES[profile]
+        return BLOCKING_PROFILES[self.profile]
+
+    def should_block(self, url, resource_type, is_main_frame_navigation):
+        """Decides one request. Main-frame navigations also set the first-party site."""
+        host = urlparse(url).hostname
+        if is_main_frame_navigation:
+            self.first_party = site_of(host)
+            return False
+        if url.startswith("data:") or url.startswith("blob:"):
+            return False
+
+        profile = self._profile_for(self.first_party)
+        if resource_type in profile["resource_types"]:
+            return True
+        if profile["trackers"] and _matches_domain(host, TRACKER_DOMAINS):
+            return True
+        if profile["third_party"] and self.first_party and site_of(host) != self.first_party:
+            return True
+        return False
+
+    def _decide(self, request):
+        is_main_frame_navigation = request.is_navigation_request() and request.frame.parent_frame is None
+        block = self.should_block(request.url, request.resource_type, is_main_frame_navigation)
+        if block:
+            self.blocked += 1
+            self.blocked_by_type[request.resource_type] += 1
+            self.estimated_bytes_saved += TYPICAL_BYTES.get(request.resource_type, DEFAULT_BYTES)
+        else:
+            self.allowed += 1
+        return block
+
+    def attach(self, page):
+        """Installs the blocker on a sync Playwright page (or context)."""
+        def handle(route, request):
+            if self._decide(request):
+                route.abort()
+            else:
+                route.continue_()
+        page.route("**/*", handle)
+
+    async def attach_async(self, page):
+        """Installs the blocker on an async Playwright page (or context)."""
+        async def handle(route, request):
+            if self._decide(request):
+                await route.abort()
+            else:
+                await route.continue_()
+        await page.route("**/*", handle)
+
+    def stats(self):
+        return {
+            "profile": self.profile,
+            "allowed": self.allowed,
+            "blocked": self.blocked,
+            "blocked_by_type": dict(self.blocked_by_type),
+            "estimated_bytes_saved": self.estimated_bytes_saved,
+        }
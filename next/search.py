@@ -0,0 +1,95 @@
+from urllib.parse import urlparse, parse_qs, quote_plus
+import base64
+
+# Result pages that need no typing: the query goes straight into the URL. `result` is the CSS
+# selector of one result's container (results whose container matches `skip`, e.g. ads, are left
+# out), with `link` and `snippet` looked up inside it. Without `result`, the n-th `link` is paired
+# with the n-th `snippet` (DuckDuckGo Lite lays results out as table rows).
+SEARCH_ENGINES = {
+    "duckduckgo_html": {
+        "url": "https://html.duckduckgo.com/html/?q={query}",
+        "result": ".result",
+        "skip": ".result--ad",
+        "link": "a.result__a",
+        "snippet": ".result__snippet",
+    },
+    "duckduckgo_lite": {
+        "url": "https://lite.duckduckgo.com/lite/?q={query}",
+        "result": None,
+        "link": "a.result-link",
+        "snippet": ".result-snippet",
+    },
+    "bing": {
+        "url": "https://www.bing.com/search?q={query}",
+        "result": "li.b_algo",
+        "link": "h2 a",
+        "snippet": ".b_caption p",
+    },
+}
+DEFAULT_ENGINE = "duckduckgo_html"
+MAX_RESULTS = 10
+
+
+def search_url(query, engine=DEFAULT_ENGINE, engines=SEARCH_ENGINES):
+    """Results-page URL for `query` on `engine`."""
+    return engines[engine]["url"].format(query=quote_plus(query))
+
+
+def engine_for_url(url, engines=SEARCH_ENGINES):
+    """Name of the engine whose results page `url` is, or None."""
+    parsed = urlparse(url or "")
+    for name, engine in engines.items():
+        template = urlparse(engine["url"])
+        if parsed.netloc == template.netloc and parsed.path.rstrip("/") == template.path.rstrip("/"):
+            return name
+    return None
+
+
+def unwrap_redirect(url):
+    """The target of a search engine's click-tracking link; other URLs are returned unchanged."""
+    parsed = urlparse(url)
+    params = parse_qs(parsed.query)
+    if parsed.path == "/l/" and "uddg" in params:  # DuckDuckGo
+        return params["uddg"][0]
+    if parsed.netloc.endswith("bing.com") and parsed.path == "/ck/a" and params.get("u", [""])[0].startswith("a1"):
+        encoded = params["u"][0][2:]
+        try:
+            return base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode("utf-8")
+        except ValueError:
+            return url
+    return url
+
+
+def clean_results(raw, max_results=MAX_RESULTS):
+    """
+    Ranked results from `SERP_RESULTS_SCRIPT` output: tracking redirects unwrapped, non-web links
+    and repeated URLs dropped, at most `max_results`. Each is {rank, title, url, snippet}.
+    """
+    results, seen = [], set()
+    for item in raw:
+        url = unwrap_redirect(item["url"])
+        if not url.startswith(("http://", "https://")) or url in seen or not item["title"]:
+            continue
+        seen.add(url)
+        results.append({"rank": len(results) + 1, "title": item["title"], "url": url, "snippet": item["snippet"]})
+        if len(results) == max_results:
+            break
+    return results
+
+
+def render_results(query, results, snippet_chars=160):
+    """Compact listing for the prompt. Results are numbered R1, R2, ...; the model can navigate to 'R1'."""
+    if not results:
+        return f"Search results for '{query}': none found."
+    lines = [f"Search results for '{query}' (navigate to Rn to open one):"]
+    for result in results:
+        lines.append(f"R{result['rank']}. {result['title']} -> {result['url']}")
+        if result["snippet"]:
+            snippet = result["snippet"]
+            lines.append(f"    {snippet[:snippet_chars]}{'...' if len(snippet) > snippet_chars else ''}")
+    return "\n".join(lines)
+
+
+def result_aliases(results):
+    """{'R1': url, ...} for `PageSerializer.resolve`."""
+    return {f"R{result['rank']}": result["url"] for result in results}
@@ -0,0 +1,162 @@
+from urllib.parse import urlparse, urljoin
+import re
+
+# Rough stand-in for the model's tokenizer: short letter runs, digit groups and single symbols.
+# Close enough to Llama-style BPE counts on page text to budget prompts without loading one.
+# final/agent_helpers.py and extras/natbot_snapshot.py cannot import this and keep copies of the
+# regex; change them together so every budget uses the same estimate.
+_TOKEN_RE = re.compile(r"[A-Za-z]{1,6}|\d{1,3}|[^\sA-Za-z\d]")
+
+ALIAS_NOTE = "(Links shown as [Ln] are shortened; use Ln as the URL to open one.)"
+
+
+def render_element(element):
+    return f"[{element['tag'].upper()}] ID: {element['id']} | {element['text'][:50]}{'...' if len(element['text']) > 50 else ''}"
+
+def render_link(link):
+    return f"{link['text'][:40]}{'...' if len(link['text']) > 40 else ''} -> {link['href']}"
+
+
+def count_tokens(text):
+    """Estimated token count of `text`."""
+    return len(_TOKEN_RE.findall(text or ""))
+
+
+def structural_score(kind, item):
+    """
+    Task-independent priors: text inputs first, then buttons and other controls, then links.
+    Ties keep page order.
+    """
+    if kind == "link":
+        return 1.0
+    tag, input_type = item.get("tag", ""), (item.get("type") or "").lower()
+    if tag in ("input", "textarea", "select") and input_type not in ("submit", "button", "hidden", "checkbox", "radio"):
+        score = 3.0
+        if input_type == "search" or "search" in (item.get("id") or "").lower():
+            score += 1.0
+        return score
+    if tag == "button" or input_type in ("submit", "button"):
+        return 2.0
+    if tag == "form":
+        return 0.5
+    return 1.5
+
+
+def _absolute(base, href):
+    """Absolute form of an element's href attribute, which may be relative."""
+    try:
+        return urljoin(base, href)
+    except ValueError:
+        return href
+
+
+class PageSerializer:
+    """
+    Renders a `_get_page_state` result into at most `token_budget` (estimated) tokens.
+
+    Elements are ranked by `score(kind, item)` and packed whole, best first. Links whose href
+    repeats an earlier element or link are dropped. Same-site URLs are shown as paths, and URLs
+    still longer than `alias_min_length` are replaced by a short alias ('L1', 'L2', ...) plus the
+    end of their path as a hint; `resolve` maps an alias the model answers with back to the full URL.
+    `report` describes the last call: tokens emitted and dropped, items kept, dropped and deduped.
+    """
+    def __init__(self, token_budget=800, alias_min_length=50, score=structural_score):
+        self.token_budget = token_budget
+        self.alias_min_length = alias_min_length
+        self.score = score
+        self.aliases = {}
+        self.report = {}
+
+    def resolve(self, value):
+        """Full URL for an alias from the last serialization; anything else is returned unchanged."""
+        if isinstance(value, str):
+            return self.aliases.get(value.strip().strip("[]"), value)
+        return value
+
+    def _display_url(self, href, page_url):
+        parsed, page = urlparse(href), urlparse(page_url)
+        if parsed.netloc and parsed.netloc == page.netloc:
+            href = parsed.path + (f"?{parsed.query}" if parsed.query else "")
+        return href
+
+    def _alias_for(self, href, display, url_aliases):
+        if len(display) < self.alias_min_length:
+            return display, None
+        alias = url_aliases.get(href)
+        if alias is None:
+            alias = f"L{len(url_aliases) + 1}"
+        # Hint: the display form without its query, keeping the (usually distinctive) end of the path
+        hint = display.split("?")[0].split("#")[0]
+        if len(hint) > 32:
+            hint = "…" + hint[-31:]
+        return f"[{alias}] {hint}", alias
+
+    def serialize(self, page_state, score=None, top_k=None):
+        """Renders `page_state`; with `top_k`, at most that many of the best-ranked elements and links are considered."""
+        score = score or self.score
+        page_url = page_state["url"]
+
+        candidates = []
+        seen_hrefs = set()
+        deduped = 0
+        for element in page_state["interactive_elements"]:
+            candidates.append(("element", element))
+            if element.get("href"):
+                seen_hrefs.add(_absolute(page_url, element["href"]))
+        for link in page_state["links"]:
+            if link["href"] in seen_hrefs:
+                deduped += 1
+                continue
+            seen_hrefs.add(link["href"])
+            candidates.append(("link", link))
+
+        header = [f"Current Page: {page_url}", f"Title: {page_state['title']}"]
+        remaining = self.token_budget - count_tokens("\n".join(header)) - 2 * count_tokens("Interactive elements (00 of 00):")
+        ranked = sorted(candidates, key=lambda candidate: -score(*candidate))  # Stable: ties keep page order
+        ranked, cut = (ranked[:top_k], ranked[top_k:]) if top_k is not None else (ranked, [])
+
+        kept = {"element": [], "link": []}
+        url_aliases = {}
+        dropped = len(cut)
+        dropped_tokens = sum(count_tokens(render_element(item) if kind == "element" else render_link(item)) + 1 for kind, item in cut)
+        note_cost = count_tokens(ALIAS_NOTE)
+        for kind, item in ranked:
+            alias = None
+            if kind == "element":
+                line = render_element(item)
+            else:
+                display, alias = self._alias_for(item["href"], self._display_url(item["href"], page_url), url_aliases)
+                line = render_link(dict(item, href=display))
+            cost = count_tokens(line) + 1
+            if alias and not url_aliases:
+                cost += note_cost
+            if cost > remaining:
+                dropped += 1
+                dropped_tokens += cost
+                continue
+            remaining -= cost
+            if alias:
+                url_aliases[item["href"]] = alias
+            kept[kind].append(line)
+
+        elements_total = sum(1 for kind, _ in candidates if kind == "element")
+        links_total = len(candidates) - elements_total
+        result = header + [f"\nInteractive elements ({len(kept['element'])} of {elements_total}):"]
+        result += [f"{i:2d}. {line}" for i, line in enumerate(kept["element"], 1)]
+        result.append(f"\nLinks ({len(kept['link'])} of {links_total}):")
+        result += [f"{i:2d}. {line}" for i, line in enumerate(kept["link"], 1)]
+        if url_aliases:
+            result.append(ALIAS_NOTE)
+        text = "\n".join(result)
+
+        self.aliases = {alias: href for href, alias in url_aliases.items()}
+        self.report = {
+            "emitted_tokens": count_tokens(text),
+            "dropped_tokens": dropped_tokens,
+            "emitted": len(kept["element"]) + len(kept["link"]),
+            "dropped": dropped,
+            "deduped": deduped,
+            "aliased": len(url_aliases),
+        }
+        return text
+
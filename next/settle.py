@@ -0,0 +1,123 @@
+from playwright.sync_api import Error as PlaywrightError
+from termcolor import colored
+import asyncio
+import time
+
+from page_scripts import MUTATION_CLOCK_SCRIPT, DOM_QUIET_SCRIPT
+
+# Long-lived connections never "finish", so they would hold the network busy until the hard cap
+_IGNORED_RESOURCE_TYPES = {"websocket", "eventsource"}
+
+POLL_MS = 50
+
+
+class SettleDetector:
+    """
+    Waits until a page is quiet after an action, instead of sleeping for a fixed time.
+
+    The page counts as settled once the navigation (if any) has committed and reached
+    DOMContentLoaded, no request has been in flight for `network_idle_ms`, and the DOM has not
+    mutated for `quiet_ms`. `timeout_ms` is a hard cap. Every wait is recorded in `log`.
+
+    The DOM clock is `__foxmind.lastMutation`, kept by the registry script or, on pages without
+    it, by `MUTATION_CLOCK_SCRIPT` (call `install`).
+    """
+    def __init__(self, page, quiet_ms=300, network_idle_ms=250, timeout_ms=5000, verbose=True):
+        self.page = page
+        self.quiet_ms = quiet_ms
+        self.network_idle_ms = network_idle_ms
+        self.timeout_ms = timeout_ms
+        self.verbose = verbose
+        self.log = []
+
+        self._pending = set()
+        self._last_network_activity = time.perf_counter()
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_request_done)
+        page.on("requestfailed", self._on_request_done)
+
+    def install(self):
+        """Installs the mutation clock on a page that does not run the registry script."""
+        self.page.add_init_script(MUTATION_CLOCK_SCRIPT)
+
+    def _on_request(self, request):
+        if request.resource_type in _IGNORED_RESOURCE_TYPES:
+            return
+        self._pending.add(request)
+        self._last_network_activity = time.perf_counter()
+
+    def _on_request_done(self, request):
+        self._pending.discard(request)
+        self._last_network_activity = time.perf_counter()
+
+    def _network_quiet(self, network_idle_ms):
+        return not self._pending and (time.perf_counter() - self._last_network_activity) * 1000 >= network_idle_ms
+
+    def _record(self, action, start, timed_out, timeout_ms):
+        seconds = time.perf_counter() - start
+        self.log.append({"action": action, "seconds": seconds, "timed_out": timed_out, "pending": len(self._pending)})
+        if self.verbose:
+            note = f" (hit the {timeout_ms / 1000:.1f}s cap, {len(self._pending)} requests pending)" if timed_out else ""
+            print(colored(f"Settled after {action} in {seconds:.2f}s{note}", "grey"))
+        return seconds
+
+    def wait(self, action="action", quiet_ms=None, network_idle_ms=None, timeout_ms=None):
+        """Blocks until the page is quiet or the cap is hit. Returns the seconds it took."""
+        quiet_ms = self.quiet_ms if quiet_ms is None else quiet_ms
+        network_idle_ms = self.network_idle_ms if network_idle_ms is None else network_idle_ms
+        timeout_ms = self.timeout_ms if timeout_ms is None else timeout_ms
+        start = time.perf_counter()
+        deadline = start + timeout_ms / 1000
+
+        while True:
+            remaining_ms = (deadline - time.perf_counter()) * 1000
+            if remaining_ms <= 0:
+                return self._record(action, start, True, timeout_ms)
+            try:
+                self.page.wait_for_load_state("domcontentloaded", timeout=remaining_ms)
+                self.page.wait_for_function(DOM_QUIET_SCRIPT, arg=quiet_ms, polling=POLL_MS,
+                                            timeout=max(1, (deadline - time.perf_counter()) * 1000))
+            except PlaywrightError:
+                # Timed out, or the document was replaced mid-check by a navigation; re-check
+                continue
+            if self._network_quiet(network_idle_ms):
+                return self._record(action, start, False, timeout_ms)
+            self.page.wait_for_timeout(POLL_MS)  # Lets Playwright dispatch request events
+
+    def stats(self):
+        """Settle times over all recorded waits, in seconds."""
+        times = [entry["seconds"] for entry in self.log]
+        return {
+            "waits": len(times),
+            "total": sum(times),
+            "avg": sum(times) / len(times) if times else 0.0,
+            "max": max(times, default=0.0),
+            "timeouts": sum(entry["timed_out"] for entry in self.log),
+        }
+
+
+class AsyncSettleDetector(SettleDetector):
+    """`SettleDetector` for `playwright.async_api` pages."""
+    async def install(self):
+        await self.page.add_init_script(MUTATION_CLOCK_SCRIPT)
+
+    async def wait(self, action="action", quiet_ms=None, network_idle_ms=None, timeout_ms=None):
+        quiet_ms = self.quiet_ms if quiet_ms is None else quiet_ms
+        network_idle_ms = self.network_idle_ms if network_idle_ms is None else network_idle_ms
+        timeout_ms = self.timeout_ms if timeout_ms is None else timeout_ms
+        start = time.perf_counter()
+        deadline = start + timeout_ms / 1000
+
+        while True:
+            remaining_ms = (deadline - time.perf_counter()) * 1000
+            if remaining_ms <= 0:
+                return self._record(action, start, True, timeout_ms)
+            try:
+                await self.page.wait_for_load_state("domcontentloaded", timeout=remaining_ms)
+                await self.page.wait_for_function(DOM_QUIET_SCRIPT, arg=quiet_ms, polling=POLL_MS,
+                                                  timeout=max(1, (deadline - time.perf_counter()) * 1000))
+            except PlaywrightError:
+                continue
+            if self._network_quiet(network_idle_ms):
+                return self._record(action, start, False, timeout_ms)
+            await asyncio.sleep(POLL_MS / 1000)
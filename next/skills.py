@@ -0,0 +1,207 @@
+from urllib.parse import urlparse
+import json
+import time
+import os
+import re
+
+from resource_blocker import site_of
+
+# Fields that name what an action acts on; never turned into parameters
+FIXED_FIELDS = ("action", "element_id", "target", "input_mode", "precondition")
+MIN_PARAM_LENGTH = 3
+# Actions whose target (if any) is a URL or direction rather than an element on the page
+UNTARGETED_ACTIONS = ("search", "navigate", "scroll", "done", "complete", "analyze")
+# A skill that keeps failing (and never worked since) is forgotten
+MAX_FAILURES = 3
+
+_WORD_RE = re.compile(r"\{p\d+\}|[a-z0-9]+")
+
+
+def normalize_intent(text):
+    """Lowercased words of a task, with punctuation and spacing dropped. `{pN}` placeholders are kept."""
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def _template_regex(intent):
+    """Matches normalized task text against `intent`; a placeholder used twice must match the same words both times."""
+    parts, seen = [], set()
+    for word in intent.split(" "):
+        placeholder = re.fullmatch(r"\{p(\d+)\}", word)
+        if not placeholder:
+            parts.append(re.escape(word))
+        elif placeholder.group(1) in seen:
+            parts.append(f"(?P=p{placeholder.group(1)})")
+        else:
+            seen.add(placeholder.group(1))
+            parts.append(f"(?P<p{placeholder.group(1)}>.+?)")
+    return re.compile("^" + r"\s+".join(parts) + "$")
+
+
+def _is_alias(value):
+    """Whether a navigate value is a search-result alias ('R3'), which the replay's own search re-creates."""
+    return isinstance(value, str) and re.fullmatch(r"R\d+", value.strip().strip("[]")) is not None
+
+
+class SkillStore:
+    """
+    Recorded action sequences that completed a task, replayed before asking the model again.
+
+    A skill is keyed by the site it starts on and the task's normalized intent. Action values
+    that appear in the task text as whole words (a search query, say) become parameters, so
+    "search supercars on duckduckgo" is stored as "search {p0} on duckduckgo" and also serves
+    "search hypercars on duckduckgo". A navigate to a literal URL after a parameterized step
+    (a result picked for this query) would not fit other values, so such a sequence is stored for
+    its exact task only; navigates to search-result aliases ('R1') are fine, the replayed search
+    hands them out again. Every step keeps a precondition (its element is on the page, the URL is
+    on the site it was recorded on), so a replay stops at the first step the page no longer matches.
+    Pass `path` to keep skills in a JSON file across runs. `stats` reports the hit rate and the
+    model calls and seconds that replays saved.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.skills = {}  # "site|intent" -> skill
+        self.counters = {"lookups": 0, "hits": 0, "fallbacks": 0, "llm_calls_saved": 0, "seconds_saved": 0.0}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.skills = json.load(f)
+
+    @staticmethod
+    def _site(url):
+        return site_of(urlparse(url).hostname)
+
+    def record(self, start_url, task, steps, llm_calls=0, llm_seconds=0.0):
+        """
+        Stores the `steps` (action dicts, each with the URL it ran on under 'url') that completed
+        `task` starting from `start_url`, with the model calls and seconds it took to decide them.
+        """
+        if not steps:
+            return None
+        generalized, intent = self._generalize(steps, normalize_intent(task))
+        if self._pins_result(generalized):
+            generalized, intent = self._generalize(steps, normalize_intent(task), parameters=False)
+        for action, step in zip(generalized, steps):
+            element_id = action.get("element_id") or action.get("target")
+            action["precondition"] = {
+                "element_present": element_id if action["action"].lower() not in UNTARGETED_ACTIONS else None,
+                "url_contains": self._site(step.get("url", "")) or None,
+            }
+        key = f"{self._site(start_url)}|{intent}"
+        previous = self.skills.get(key, {})
+        self.skills[key] = {
+            "site": self._site(start_url),
+            "intent": intent,
+            "steps": generalized,
+            "llm_calls": llm_calls,
+            "llm_seconds": llm_seconds,
+            "replays": previous.get("replays", 0),
+            "failures": 0,
+            "recorded_at": time.time(),
+        }
+        return self.skills[key]
+
+    @staticmethod
+    def _generalize(steps, task_words, parameters=True):
+        """
+        The steps without their URLs and the intent for `task_words` (the normalized task). With
+        `parameters`, each value whose words appear as whole words in the task becomes a `{pN}`
+        placeholder in both.
+        """
+        candidates = []
+        for step in steps if parameters else []:
+            for key, value in step.items():
+                if key in FIXED_FIELDS or key == "url" or not isinstance(value, str):
+                    continue
+                words = normalize_intent(value)
+                # Whole words only: "car" is not a parameter of "find a supercar review"
+                if len(words) >= MIN_PARAM_LENGTH and f" {words} " in f" {task_words} " and words not in candidates:
+                    candidates.append(words)
+
+        intent, params = task_words, []
+        for words in sorted(candidates, key=len, reverse=True):  # Longest first
+            pattern = rf"(?<!\S){re.escape(words)}(?!\S)"
+            if re.search(pattern, intent):  # Not already inside a longer parameter
+                intent = re.sub(pattern, f"{{p{len(params)}}}", intent)
+                params.append(words)
+
+        generalized = []
+        for step in steps:
+            action = {key: value for key, value in step.items() if key != "url"}
+            for key, value in action.items():
+                if key not in FIXED_FIELDS and isinstance(value, str) and normalize_intent(value) in params:
+                    action[key] = f"{{p{params.index(normalize_intent(value))}}}"
+            generalized.append(action)
+        return generalized, intent
+
+    @staticmethod
+    def _pins_result(steps):
+        """
+        Whether a navigate to a literal URL follows a parameterized step: that URL was picked for
+        the recorded values (a search result, say) and would be wrong for others.
+        """
+        parameterized = False
+        for step in steps:
+            value = step.get("value")
+            if (parameterized and step["action"].lower() == "navigate" and not _is_alias(value)
+                    and not re.search(r"\{p\d+\}", str(value))):
+                return True
+            parameterized = parameterized or any(isinstance(v, str) and re.search(r"\{p\d+\}", v) for v in step.values())
+        return False
+
+    def match(self, url, task):
+        """(skill key, steps with the task's parameters filled in) for a skill that fits, else None."""
+        self.counters["lookups"] += 1
+        site, text = self._site(url), normalize_intent(task)
+        for key, skill in self.skills.items():
+            if skill["site"] != site:
+                continue
+            found = _template_regex(skill["intent"]).match(text)
+            if not found:
+                continue
+            # Parameter values are taken from the original task, not its normalized form
+            values = {name: self._original_span(task, value) for name, value in found.groupdict().items()}
+            return key, [self._fill(step, values) for step in skill["steps"]]
+        return None
+
+    @staticmethod
+    def _original_span(task, normalized):
+        """The part of `task` whose normalized form is `normalized` (keeps its case and punctuation)."""
+        words = normalized.split(" ")
+        pattern = r"[^a-z0-9]+".join(re.escape(word) for word in words)
+        found = re.search(pattern, task, re.IGNORECASE)
+        return found.group(0) if found else normalized
+
+    @staticmethod
+    def _fill(step, values):
+        filled = {}
+        for key, value in step.items():
+            if isinstance(value, str):
+                value = re.sub(r"\{(p\d+)\}", lambda m: values[m.group(1)], value)
+            filled[key] = value
+        return filled
+
+    def report(self, key, ok):
+        """Records how a replay of the skill `key` went."""
+        skill = self.skills.get(key)
+        if skill is None:
+            return
+        if ok:
+            skill["replays"] += 1
+            skill["failures"] = 0
+            self.counters["hits"] += 1
+            self.counters["llm_calls_saved"] += skill["llm_calls"]
+            self.counters["seconds_saved"] += skill["llm_seconds"]
+        else:
+            skill["failures"] += 1
+            self.counters["fallbacks"] += 1
+            if skill["failures"] >= MAX_FAILURES:
+                del self.skills[key]
+
+    def stats(self):
+        lookups = self.counters["lookups"]
+        return dict(self.counters, skills=len(self.skills), hit_rate=self.counters["hits"] / lookups if lookups else 0.0)
+
+    def save(self):
+        if not self.path:
+            return
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.skills, f, indent=2)
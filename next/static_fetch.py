@@ -0,0 +1,178 @@
+from collections import Counter
+from termcolor import colored
+import time
+import re
+
+import httpx
+from lxml import etree, html as lxml_html
+
+# Same blocks, in the same order, as webscraper's whole-page `get_text_blocks` walker
+BLOCK_TAGS = {"p", "li", "h1", "h2", "h3", "h4", "h5", "h6"}
+# Never rendered as text
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "head", "svg"}
+# Elements innerText sets on their own line; their text must not run into the neighbours'
+BREAK_TAGS = BLOCK_TAGS | {"br", "div", "ul", "ol", "dl", "dt", "dd", "table", "tr", "td", "th", "section",
+                           "article", "header", "footer", "blockquote", "pre", "figcaption"}
+
+# A page with less readable text than this is probably filled in by scripts
+MIN_TEXT_CHARS = 200
+# Empty mount points of client-rendered frameworks (React, Next.js, Nuxt, Vue, Angular, Svelte)
+_SHELL_XPATH = ("//*[@id='root' or @id='app' or @id='__next' or @id='__nuxt' or @id='svelte' "
+                "or @data-reactroot or @ng-app or @ng-version]")
+_NOSCRIPT_RE = re.compile(r"(enable|requires?|turn on|need)\s+javascript|javascript\s+(is\s+)?(required|disabled)", re.IGNORECASE)
+_HIDDEN_STYLE_RE = re.compile(r"display\s*:\s*none|visibility\s*:\s*hidden", re.IGNORECASE)
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:128.0) Gecko/20100101 Firefox/128.0",
+    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+}
+
+
+def _hidden(element):
+    return element.get("hidden") is not None or bool(_HIDDEN_STYLE_RE.search(element.get("style") or ""))
+
+
+def _text(block):
+    """Whitespace-collapsed text of `block`, with line breaks between nested block elements."""
+    parts = []
+    skipped = None
+    # Comments and processing instructions only come as their own event; their tails are text
+    for event, element in etree.iterwalk(block, events=("start", "end", "comment", "pi")):
+        if skipped is not None:
+            if event == "end" and element is skipped:
+                skipped = None
+                if element is not block:
+                    parts.append(element.tail or "")
+            continue
+        if event in ("comment", "pi"):
+            parts.append(element.tail or "")
+            continue
+        if event == "start":
+            if element is not block and (element.tag in SKIPPED_TAGS or _hidden(element)):
+                skipped = element
+                continue
+            if element.tag in BREAK_TAGS:
+                parts.append(" ")
+            parts.append(element.text or "")
+        else:
+            if element.tag in BREAK_TAGS:
+                parts.append(" ")
+            if element is not block:
+                parts.append(element.tail or "")
+    return " ".join("".join(parts).split())
+
+
+def extract_blocks(document):
+    """
+    Text of the block elements (paragraphs, list items, headings) of a parsed page, in document
+    order. Elements that are hidden by a `hidden` attribute or inline style, or sit inside one,
+    are skipped, like the browser walker's visibility check.
+    """
+    body = document.find("body")
+    if body is None:
+        body = document
+    blocks = []
+    hidden = None
+    for event, element in etree.iterwalk(body, events=("start", "end")):
+        if not isinstance(element.tag, str):
+            continue  # Comments and processing instructions
+        if event == "end":
+            if hidden is element:
+                hidden = None
+            continue
+        if hidden is not None:
+            continue
+        if element.tag in SKIPPED_TAGS or _hidden(element):
+            hidden = element
+            continue
+        if element.tag in BLOCK_TAGS:
+            text = _text(element)
+            if text:
+                blocks.append(text)
+    return blocks
+
+
+def needs_js(document, blocks):
+    """Why the page looks like it needs scripts to show its content, or None if it can be read as fetched."""
+    for noscript in document.iter("noscript"):
+        if _NOSCRIPT_RE.search(noscript.text_content()):
+            return "noscript warning"
+    for mount in document.xpath(_SHELL_XPATH):
+        if len(mount.text_content().strip()) < MIN_TEXT_CHARS:
+            return "framework shell"
+    if sum(len(block) for block in blocks) < MIN_TEXT_CHARS:
+        return "empty body"
+    return None
+
+
+class StaticFetcher:
+    """
+    Reads a page's text blocks over plain HTTP, without a browser.
+
+    Pages are fetched with one pooled `httpx.Client` (connections are kept alive across calls)
+    and parsed with lxml. `text_blocks(url)` returns the blocks, or None when the page needs a
+    browser: a non-HTML or failed response, or one `needs_js` flags (empty body, a client-rendered
+    framework shell, a noscript warning). `stats` counts static reads, browser fallbacks by
+    reason, and the average seconds of a static read.
+    """
+    def __init__(self, timeout=10.0, max_connections=10, headers=None, verbose=True):
+        self.client = httpx.Client(
+            headers=headers or DEFAULT_HEADERS,
+            timeout=timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self.verbose = verbose
+        self.reads = 0
+        self.read_seconds = 0.0
+        self.fallbacks = Counter()
+
+    def _fallback(self, url, reason):
+        self.fallbacks[reason] += 1
+        if self.verbose:
+            print(colored(f"Static fetch of {url} needs the browser ({reason})", "yellow"))
+        return None
+
+    def text_blocks(self, url):
+        start = time.perf_counter()
+        try:
+            response = self.client.get(url if "://" in url else "https://" + url)
+        except httpx.HTTPError as e:
+            return self._fallback(url, type(e).__name__)
+        if response.status_code >= 400:
+            return self._fallback(url, f"HTTP {response.status_code}")
+        content_type = response.headers.get("content-type", "")
+        if "html" not in content_type:
+            return self._fallback(url, f"content type {content_type.split(';')[0] or 'unknown'}")
+        try:
+            document = lxml_html.fromstring(response.content, base_url=str(response.url))
+        except (etree.ParserError, ValueError):
+            return self._fallback(url, "unparsable")
+
+        blocks = extract_blocks(document)
+        reason = needs_js(document, blocks)
+        if reason:
+            return self._fallback(url, reason)
+        seconds = time.perf_counter() - start
+        self.reads += 1
+        self.read_seconds += seconds
+        if self.verbose:
+            print(colored(f"Read {len(blocks)} blocks from {url} without a browser in {seconds * 1000:.0f} ms", "cyan"))
+        return blocks
+
+    def __call__(self, url):
+        return self.text_blocks(url)
+
+    def stats(self):
+        fallbacks = sum(self.fallbacks.values())
+        return {
+            "static_reads": self.reads,
+            "browser_fallbacks": fallbacks,
+            "fallback_reasons": dict(self.fallbacks),
+            "static_share": self.reads / (self.reads + fallbacks) if self.reads + fallbacks else 0.0,
+            "avg_static_seconds": self.read_seconds / self.reads if self.reads else None,
+        }
+
+    def close(self):
+        self.client.close()
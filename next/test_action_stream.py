@@ -0,0 +1,22 @@
+from action_schema import ACTION_SCHEMA, ActionParser
+from action_stream import ActionStreamParser
+
+
+def stream(text):
+    parser = ActionStreamParser()
+    for token in text:
+        if parser.feed(token) is not None:
+            break
+    return parser.action
+
+
+def test_stops_on_every_schema_action():
+    for name in ACTION_SCHEMA["properties"]["action"]["enum"]:
+        assert stream(f'{{"action": "{name}", "value": "x"}}') == {"action": name, "value": "x"}
+
+
+def test_does_not_stop_on_an_action_the_parser_rejects():
+    reply = '{"action": "get text from viewport"}'
+    assert stream(reply) is None
+    action, error = ActionParser().parse(reply)
+    assert action is None and error.startswith("schema")
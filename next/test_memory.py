@@ -0,0 +1,33 @@
+import pytest
+
+from memory import ConversationMemory
+
+
+def observation(i):
+    return {"role": "user", "content": f"Current Page: https://example.com/{i}\nTitle: Page {i}\n" + "element text " * 40}
+
+
+def transcript(turns):
+    messages = [{"role": "system", "content": "You browse the web."}]
+    for i in range(turns):
+        messages += [observation(i), {"role": "assistant", "content": '{"action": "scroll", "value": "down"}'}]
+    return messages + [observation(turns)]
+
+
+def test_keep_turns_zero_keeps_the_current_observation_verbatim():
+    messages = transcript(4)
+    memory = ConversationMemory(token_budget=150, keep_turns=0)
+    compacted = memory.compact(messages)
+    assert memory.prompt_tokens(messages) > 150
+    assert compacted[-1] == messages[-1]
+    assert all("page state omitted" in m["content"] for m in compacted[1:-1] if m["role"] == "user")
+
+
+def test_fits_the_budget_unchanged():
+    messages = transcript(1)
+    assert ConversationMemory(token_budget=10000, keep_turns=0).compact(messages) == messages
+
+
+def test_negative_keep_turns_is_rejected():
+    with pytest.raises(ValueError):
+        ConversationMemory(keep_turns=-1)
@@ -0,0 +1,77 @@
+from llm import LLMAgent
+from serializer import PageSerializer
+from skills import SkillStore
+
+START = "https://duckduckgo.com/"
+SERP = "https://html.duckduckgo.com/html/?q=supercars"
+
+
+def search_and_open(query, target):
+    return [
+        {"action": "search", "value": query, "url": START},
+        {"action": "navigate", "value": target, "url": SERP},
+        {"action": "done", "url": "https://en.wikipedia.org/wiki/Supercar"},
+    ]
+
+
+def test_substring_of_a_word_is_not_a_parameter():
+    store = SkillStore()
+    skill = store.record(START, "find a supercar review", [{"action": "search", "value": "car", "url": START}])
+    assert skill["intent"] == "find a supercar review"
+    assert skill["steps"][0]["value"] == "car"
+
+
+def test_whole_word_value_is_a_parameter():
+    store = SkillStore()
+    skill = store.record(START, "Find a supercar review", [{"action": "search", "value": "Supercar", "url": START}])
+    assert skill["intent"] == "find a {p0} review"
+    _, steps = store.match(START, "find a hypercar review")
+    assert steps[0]["value"] == "hypercar"
+
+
+def test_parameters_fill_by_name_not_position():
+    store = SkillStore()
+    store.record(START, "cars in red", [
+        {"action": "type", "element_id": "3", "text": "red", "url": START},
+        {"action": "type", "element_id": "4", "text": "cars", "url": START},
+    ])
+    _, steps = store.match(START, "bikes in blue")
+    assert [step["text"] for step in steps] == ["blue", "bikes"]
+
+
+def test_result_alias_replays_for_other_queries():
+    store = SkillStore()
+    store.record(START, "search supercars on duckduckgo", search_and_open("supercars", "R1"))
+    _, steps = store.match(START, "search hypercars on duckduckgo")
+    assert steps[0]["value"] == "hypercars"
+    assert steps[1]["value"] == "R1"  # Resolved against the replayed search's own results
+
+
+def test_literal_result_url_is_not_generalized():
+    store = SkillStore()
+    store.record(START, "search supercars on duckduckgo", search_and_open("supercars", "https://en.wikipedia.org/wiki/Supercar"))
+    assert store.match(START, "search hypercars on duckduckgo") is None
+    _, steps = store.match(START, "search supercars on duckduckgo")
+    assert steps[1]["value"] == "https://en.wikipedia.org/wiki/Supercar"
+
+
+class FakePage:
+    url = SERP
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.page = FakePage()
+        self.serializer = PageSerializer()
+        self.search_results = [{"rank": 1, "title": "Supercar", "url": "https://en.wikipedia.org/wiki/Supercar", "snippet": ""}]
+        self.serializer.aliases["R1"] = "https://en.wikipedia.org/wiki/Supercar"
+
+
+def test_navigates_to_search_results_are_recorded_as_aliases():
+    agent = LLMAgent.__new__(LLMAgent)
+    agent.browser = FakeBrowser()
+    assert agent._result_alias("R1") == "R1"
+    assert agent._result_alias("https://en.wikipedia.org/wiki/Supercar") == "R1"
+    assert agent._result_alias("https://example.com/") == "https://example.com/"
+    agent.browser.page.url = "https://en.wikipedia.org/wiki/Supercar"  # Off the results page
+    assert agent._result_alias("R1") == "https://en.wikipedia.org/wiki/Supercar"
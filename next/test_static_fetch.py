@@ -0,0 +1,33 @@
+from lxml import html as lxml_html
+
+from static_fetch import extract_blocks
+
+
+def blocks(markup):
+    return extract_blocks(lxml_html.fromstring(f"<html><body>{markup}</body></html>"))
+
+
+def test_comment_tails_are_kept():
+    assert blocks("<p>Price: 5<!-- -->0 USD, see <a>link</a> now</p>") == ["Price: 50 USD, see link now"]
+
+
+def test_comment_after_inline_element():
+    assert blocks("<p>See <a>link</a><!-- tracking --> now</p>") == ["See link now"]
+
+
+def test_processing_instruction_tails_are_kept():
+    assert blocks("<p>Before<?php echo 1; ?> after</p>") == ["Before after"]
+
+
+def test_comment_text_itself_is_not_extracted():
+    assert blocks("<p>Visible<!-- hidden note --></p>") == ["Visible"]
+
+
+def test_hidden_and_skipped_content():
+    markup = ('<p>Shown <span style="display: none">secret<!-- c --> tail</span>text<script>x()</script> end</p>'
+              '<div hidden><p>Not shown</p></div>')
+    assert blocks(markup) == ["Shown text end"]
+
+
+def test_line_breaks_separate_words():
+    assert blocks("<p>Para one<br>line two</p>") == ["Para one line two"]
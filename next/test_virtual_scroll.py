@@ -0,0 +1,64 @@
+from browser import Browser
+from page_scripts import FULL_SNAPSHOT_SCRIPT
+
+URL = "https://example.com/long"
+
+
+class FakePage:
+    """A 3000px page with one link per 800px viewport; tracks its real scroll position."""
+    url = URL
+
+    def __init__(self):
+        self.scroll_y = 0
+        self.snapshots = 0
+
+    def evaluate(self, script, arg=None):
+        if script == FULL_SNAPSHOT_SCRIPT:
+            self.snapshots += 1
+            return {
+                "url": URL, "title": "Long page", "scroll_x": 0, "scroll_y": self.scroll_y,
+                "viewport_width": 1200, "viewport_height": 800, "document_height": 3000,
+                "interactive_elements": [],
+                "links": [
+                    {"link": {"text": f"Link at {y}", "href": f"/{y}"}, "box": {"x": 10, "y": y, "width": 100, "height": 20, "fixed": False}}
+                    for y in (100, 900, 1700)
+                ],
+            }
+        if "scrollTo" in script:
+            self.scroll_y = arg[1]
+            return None
+        raise AssertionError("unexpected script")
+
+
+def make_browser():
+    browser = Browser.__new__(Browser)
+    browser.page = FakePage()
+    browser.virtual_scroll = True
+    browser.verbose = False
+    browser._snapshot = None
+    browser._snapshot_url = None
+    browser._virtual_scroll_pos = (0, 0)
+    browser._page_scroll_pos = (0, 0)
+    return browser
+
+
+def test_scroll_after_a_mutation_is_kept():
+    browser = make_browser()
+    assert "Link at 100" in browser.crawl()
+
+    browser._invalidate_snapshot()  # A DOM mutation
+    browser.scroll("down")
+    state = browser.crawl()
+    assert "Link at 900" in state and "Link at 100" not in state
+
+    browser._sync_scroll()  # Before an action, the real page follows the virtual window
+    assert browser.page.scroll_y == 800
+
+
+def test_scroll_without_a_mutation_does_not_resnapshot():
+    browser = make_browser()
+    browser.crawl()
+    browser.scroll("down")
+    browser.scroll("down")
+    assert "Link at 1700" in browser.crawl()
+    assert browser.page.snapshots == 1
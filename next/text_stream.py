@@ -0,0 +1,43 @@
+from playwright.sync_api import Error as PlaywrightError
+
+from page_scripts import TEXT_STREAM_OPEN_SCRIPT, TEXT_STREAM_NEXT_SCRIPT, TEXT_STREAM_CLOSE_SCRIPT
+
+CHUNK_BLOCKS = 50
+CHUNK_CHARS = 20_000
+
+
+def stream_text_blocks(page, viewport_only=False, chunk_blocks=CHUNK_BLOCKS, chunk_chars=CHUNK_CHARS):
+    """
+    Yields the text blocks of a sync Playwright page in DOM order, fetching them in chunks of at
+    most `chunk_blocks` blocks / about `chunk_chars` characters. The walk's cursor stays in the page,
+    so breaking out of the loop stops it; the rest of the page is never read.
+    """
+    stream_id = page.evaluate(TEXT_STREAM_OPEN_SCRIPT, viewport_only)
+    try:
+        while True:
+            chunk = page.evaluate(TEXT_STREAM_NEXT_SCRIPT, {"id": stream_id, "maxBlocks": chunk_blocks, "maxChars": chunk_chars})
+            yield from chunk["blocks"]
+            if chunk["done"]:
+                return
+    finally:
+        try:
+            page.evaluate(TEXT_STREAM_CLOSE_SCRIPT, stream_id)
+        except PlaywrightError:
+            pass  # Page closed or navigated away; the cursor went with it
+
+
+async def stream_text_blocks_async(page, viewport_only=False, chunk_blocks=CHUNK_BLOCKS, chunk_chars=CHUNK_CHARS):
+    """`stream_text_blocks` for an async Playwright page (an async generator)."""
+    stream_id = await page.evaluate(TEXT_STREAM_OPEN_SCRIPT, viewport_only)
+    try:
+        while True:
+            chunk = await page.evaluate(TEXT_STREAM_NEXT_SCRIPT, {"id": stream_id, "maxBlocks": chunk_blocks, "maxChars": chunk_chars})
+            for block in chunk["blocks"]:
+                yield block
+            if chunk["done"]:
+                return
+    finally:
+        try:
+            await page.evaluate(TEXT_STREAM_CLOSE_SCRIPT, stream_id)
+        except PlaywrightError:
+            pass
@@ -1,19 +1,79 @@
 from playwright.sync_api import sync_playwright
+from termcolor import colored
+import argparse
+import asyncio
+import atexit
 import time
 
-
-
-def get_text_from_whole_page(url):
-    with sync_playwright() as p:
-        browser = p.firefox.launch(headless=False)
-        page = browser.new_page()
-        page.goto(url, wait_until="networkidle")
-
+from resource_blocker import ResourceBlocker
+from navigation import AdaptiveNavigator
+from text_stream import stream_text_blocks, stream_text_blocks_async, CHUNK_BLOCKS, CHUNK_CHARS
+from static_fetch import StaticFetcher
+from async_browser import launch_browser, close_browser
+from page_scripts import VIEWPORT_TEXT_SCRIPT
+
+VIEWPORT = {"width": 1280, "height": 720}
+
+# Shared across calls so later visits to a domain start with the readiness wait that worked there
+_navigator = AdaptiveNavigator(verbose=False)
+# Plain pages are read over pooled HTTP; the browser is launched only for pages that need scripts
+_static_fetcher = None
+# One Firefox for every call below, launched on first use and closed at exit
+_playwright = None
+_browser = None
+
+
+def static_text_blocks(url):
+    """The page's text blocks read without a browser, or None if it needs one (see static_fetch.py)."""
+    global _static_fetcher
+    if _static_fetcher is None:
+        _static_fetcher = StaticFetcher(verbose=False)
+    return _static_fetcher.text_blocks(url)
+
+
+def _shared_browser():
+    global _playwright, _browser
+    if _browser is None or not _browser.is_connected():
+        if _playwright is None:
+            _playwright = sync_playwright().start()
+            atexit.register(close_shared_browser)
+        _browser = _playwright.firefox.launch(headless=True)
+    return _browser
+
+
+def close_shared_browser():
+    """Closes the browser the module-level functions share."""
+    global _playwright, _browser
+    if _browser is not None:
+        _browser.close()
+        _browser = None
+    if _playwright is not None:
+        _playwright.stop()
+        _playwright = None
+
+
+def _open_page(url, block_profile, block_overrides, target_selector):
+    """A page at `url` in a fresh context of the shared browser. Close its context when done."""
+    context = _shared_browser().new_context(viewport=VIEWPORT)
+    if block_profile:
+        ResourceBlocker(block_profile, block_overrides).attach(context)
+    page = context.new_page()
+    _navigator.goto(page, url, target_selector)
+    return context, page
+
+
+def get_text_from_whole_page(url, block_profile="text-only", block_overrides=None, target_selector=None, static=True):
+    if static and target_selector is None:
+        blocks = static_text_blocks(url)
+        if blocks is not None:
+            return blocks
+    context, page = _open_page(url, block_profile, block_overrides, target_selector)
+    try:
         # Define which block tags to extract
         block_tags = ['p', 'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']
 
         # Query DOM and extract readable blocks in order
-        blocks = page.evaluate(f"""
+        return page.evaluate(f"""
             () => {{
                 const tags = {block_tags};
                 const elements = Array.from(document.querySelectorAll(tags.join(',')));
@@ -22,111 +82,177 @@ def get_text_from_whole_page(url):
                                .filter(text => text.length > 0);
             }}
         """)
-        
-        browser.close()
-        return blocks
+    finally:
+        context.close()
     
 
-def get_text_blocks(url):
+def iter_text_blocks(url, block_profile="text-only", block_overrides=None, target_selector=None,
+                     chunk_blocks=CHUNK_BLOCKS, chunk_chars=CHUNK_CHARS):
+    """
+    Yields the text blocks of a given URL IN THE ORDER AS THEY APPEAR on the page,
+    pulled from the page in bounded chunks. Stop iterating to stop reading the page;
+    the page closes when the generator does.
+    """
+    context, page = _open_page(url, block_profile, block_overrides, target_selector)
+    try:
+        yield from stream_text_blocks(page, chunk_blocks=chunk_blocks, chunk_chars=chunk_chars)
+    finally:
+        context.close()
+
+
+def get_text_blocks(url, block_profile="text-only", block_overrides=None, target_selector=None, static=True):
     """
     Returns a list of text blocks from a given URL 
     IN THE ORDER AS THEY APPEAR On the page.
+    With `static`, plain pages are read without a browser.
     """
-    with sync_playwright() as p:
-        browser = p.chromium.launch()
-        page = browser.new_page()
-        page.goto(url, wait_until="networkidle")
+    if static and target_selector is None:
+        blocks = static_text_blocks(url)
+        if blocks is not None:
+            return blocks
+    return list(iter_text_blocks(url, block_profile, block_overrides, target_selector))
 
-        # Traverse the body in DOM order and get readable blocks
-        script = """
-        () => {
-            const isVisible = (el) => {
-                const style = window.getComputedStyle(el);
-                return style && style.display !== 'none' && style.visibility !== 'hidden';
-            };
+def get_viewport_text_blocks(url, block_profile="text-only", block_overrides=None, target_selector=None):
+    context, page = _open_page(url, block_profile, block_overrides, target_selector)
+    try:
+        return page.evaluate(VIEWPORT_TEXT_SCRIPT)
+    finally:
+        context.close()
 
-            const blockTags = new Set(['P', 'LI', 'H1', 'H2', 'H3', 'H4', 'H5', 'H6']);
-            const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_ELEMENT, null, false);
 
-            const results = [];
-
-            while (walker.nextNode()) {
-                const el = walker.currentNode;
+class Scraper:
+    """
+    Reads many pages with one browser.
 
-                if (!blockTags.has(el.tagName)) continue;
-                if (!isVisible(el)) continue;
+    One Firefox process is launched (on the first page that needs it) for the scraper's lifetime; each concurrent worker gets its
+    own context and page, which are reused for the next URL instead of being reopened. With
+    `static`, pages that do not need scripts are read over HTTP first (see static_fetch.py).
 
-                const text = el.innerText.trim();
-                if (text.length > 0) {
-                    results.push(text);
-                }
-            }
+        async with Scraper() as scraper:
+            results = await scraper.scrape(urls, concurrency=8)
 
-            return results;
-        }
-        """
-
-        blocks = page.evaluate(script)
-        browser.close()
-        return blocks
-
-def get_viewport_text_blocks(url):
-    with sync_playwright() as p:
-        browser = p.chromium.launch()
-        page = browser.new_page(viewport={"width": 1280, "height": 720})
-        page.goto(url, wait_until="networkidle")
-
-        script = """
-        () => {
-            const isVisible = (el) => {
-                const style = window.getComputedStyle(el);
-                return (
-                    style &&
-                    style.display !== 'none' &&
-                    style.visibility !== 'hidden' &&
-                    el.offsetParent !== null
-                );
-            };
-
-            const isInViewport = (el) => {
-                const rect = el.getBoundingClientRect();
-                return (
-                    rect.top >= 0 &&
-                    rect.top < window.innerHeight &&
-                    rect.bottom > 0
-                );
-            };
-
-            const blockTags = new Set(['P', 'LI', 'H1', 'H2', 'H3', 'H4', 'H5', 'H6']);
-            const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_ELEMENT, null, false);
-            const results = [];
-
-            while (walker.nextNode()) {
-                const el = walker.currentNode;
-
-                if (!blockTags.has(el.tagName)) continue;
-                if (!isVisible(el)) continue;
-                if (!isInViewport(el)) continue;
-
-                const text = el.innerText.trim();
-                if (text.length > 0) {
-                    results.push(text);
-                }
-            }
-
-            return results;
+    Each result is {url, blocks, source ('static' or 'browser'), seconds, error}.
+    """
+    def __init__(self, headless=True, block_profile="text-only", block_overrides=None, static=True,
+                 navigation_history=None, verbose=True):
+        self.headless = headless
+        self.blocker = ResourceBlocker(block_profile, block_overrides) if block_profile else None
+        self.fetcher = StaticFetcher(verbose=False) if static else None
+        self.navigator = AdaptiveNavigator(navigation_history, verbose=False)
+        self.verbose = verbose
+        self.playwright = None
+        self.browser = None
+        self._idle = []  # (context, page) ready for the next URL
+        self._contexts = []
+        self._launching = asyncio.Lock()
+
+    async def start(self):
+        """Launches the browser, unless it is running. Called on the first page that needs one."""
+        async with self._launching:
+            if self.browser is None:
+                self.playwright, self.browser = await launch_browser(headless=self.headless)
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _acquire(self):
+        if self._idle:
+            return self._idle.pop()
+        context = await self.browser.new_context(viewport=VIEWPORT)
+        if self.blocker:
+            await self.blocker.attach_async(context)
+        page = await context.new_page()
+        self._contexts.append(context)
+        return context, page
+
+    async def _discard(self, tab):
+        self._contexts.remove(tab[0])
+        try:
+            await tab[0].close()
+        except Exception:
+            pass  # Already gone with a crashed page
+
+    async def text_blocks(self, url, viewport_only=False, target_selector=None):
+        """(blocks, source) for one URL, read over HTTP when possible, else in a reused browser page."""
+        if self.fetcher is not None and not viewport_only and target_selector is None:
+            blocks = await asyncio.to_thread(self.fetcher.text_blocks, url)
+            if blocks is not None:
+                return blocks, "static"
+        await self.start()
+        tab = await self._acquire()
+        try:
+            await self.navigator.goto_async(tab[1], url if "://" in url else "https://" + url, target_selector)
+            blocks = [block async for block in stream_text_blocks_async(tab[1], viewport_only)]
+        except BaseException:
+            await self._discard(tab)  # Its page may be mid-navigation; start the next URL on a fresh one
+            raise
+        self._idle.append(tab)
+        return blocks, "browser"
+
+    async def _timed(self, url, semaphore, viewport_only, target_selector):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                blocks, source = await self.text_blocks(url, viewport_only, target_selector)
+                error = None
+            except Exception as e:
+                blocks, source, error = [], None, f"{type(e).__name__}: {e}"
+            result = {"url": url, "blocks": blocks, "source": source, "seconds": time.perf_counter() - start, "error": error}
+        if self.verbose:
+            status = colored(error, "red") if error else f"{len(blocks)} blocks ({source})"
+            print(colored(f"{result['seconds']:6.2f}s", "grey"), url, status)
+        return result
+
+    async def scrape(self, urls, concurrency=4, viewport_only=False, target_selector=None):
+        """Text blocks of every URL, at most `concurrency` at a time. Results keep the order of `urls`."""
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(self._timed(url, semaphore, viewport_only, target_selector) for url in urls))
+
+    def stats(self):
+        return {
+            "pages": len(self._contexts),
+            "static": self.fetcher.stats() if self.fetcher else None,
+            "blocked": self.blocker.stats() if self.blocker else None,
         }
-        """
 
-        blocks = page.evaluate(script)
-        browser.close()
-        return blocks
+    async def close(self):
+        for context in self._contexts:
+            await context.close()
+        self._contexts, self._idle = [], []
+        if self.browser is not None:
+            await close_browser(self.playwright, self.browser)
+            self.browser = None
+        if self.fetcher is not None:
+            self.fetcher.close()
+
+
+def scrape(urls, concurrency=4, viewport_only=False, **kwargs):
+    """Synchronous `Scraper.scrape` with a scraper of its own (`kwargs` go to `Scraper`)."""
+    async def run():
+        async with Scraper(**kwargs) as scraper:
+            return await scraper.scrape(urls, concurrency, viewport_only)
+    return asyncio.run(run())
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract the text blocks of several pages with one browser")
+    parser.add_argument("urls", nargs="*", default=["https://en.wikipedia.org/wiki/Python_(programming_language)"])
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--viewport", action="store_true", help="Only blocks in the first viewport")
+    parser.add_argument("--no-static", action="store_true", help="Always use the browser")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = scrape(args.urls, args.concurrency, args.viewport, static=not args.no_static)
+    print(colored(f"{len(results)} pages in {time.perf_counter() - start:.2f}s", "green"))
 
     with open("output.txt", "w", encoding="utf-8") as f:
-        f.write("\n".join(get_viewport_text_blocks('https://en.wikipedia.org/wiki/Python_(programming_language)')))
+        for result in results:
+            f.write(f"=== {result['url']} ===\n" + "\n".join(result["blocks"]) + "\n\n")
 
 
 